@@ -0,0 +1,189 @@
+"""
+네트워크 없이 그래프를 실행하기 위한 결정적(deterministic) 대역(stand-in)들.
+
+- FakeChatModel: ChatGoogleGenerativeAI 대신 프롬프트 종류(triage/정보 수집/계수 추출/요약/답변)에 따라 정해진 답을 합니다.
+- FakeEmbeddings: UpstageEmbeddings 대신 문자 bigram hashing 벡터를 만듭니다. (tools.embed_queries의 client 호출 형식도 흉내 냅니다.)
+- FakeMongoDB: entries/treatments 컬렉션의 find_one/find를 흉내 냅니다.
+
+모든 대역은 latency(초)만큼 잠들어 원격 호출을 흉내 내고, 그 시간을 injected_latency()에 더합니다.
+"""
+import hashlib
+import math
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# 현재 턴에서 대역들이 잠든 시간의 합. 그래프 노드는 다른 thread에서 실행되지만,
+# langgraph가 context를 복사해서 넘기므로 같은 list 객체에 누적됩니다.
+_injected: ContextVar[Optional[list]] = ContextVar("bench_injected", default=None)
+
+
+@contextmanager
+def injected_latency():
+    """with 블록 안에서 대역들이 잠든 시간의 합을 [seconds] 형태로 반환합니다."""
+    total = [0.0]
+    token = _injected.set(total)
+    try:
+        yield total
+    finally:
+        _injected.reset(token)
+
+
+def _sleep(seconds: float) -> None:
+    if seconds <= 0:
+        return
+    time.sleep(seconds)
+    total = _injected.get()
+    if total is not None:
+        total[0] += seconds
+
+
+def _text(message) -> str:
+    return message.content if isinstance(message.content, str) else str(message.content)
+
+
+class FakeChatModel(BaseChatModel):
+    """프롬프트의 system 메시지로 노드를 구분해, 실제 대화 흐름을 따라가는 답을 합니다."""
+
+    model: str = "fake-gemini"
+    latency: float = 0.0
+    foods: tuple = ()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        _sleep(self.latency)
+
+        system = _text(messages[0]) if messages else ""
+        if "분류하여" in system:
+            message = AIMessage(content=self._triage(messages))
+        elif "정보 수집" in system:
+            message = self._information(messages)
+        elif "보정 계수를 추출" in system:
+            message = AIMessage(content='{"exercise_factor": 0.8, "stress_factor": 1.0, "ill_factor": 1.0}')
+        elif "대화 기록을 정리" in system:
+            message = AIMessage(content="사용자는 식사 인슐린을 문의했고, 운동/스트레스/질병 여부를 답했습니다.")
+        else:
+            message = AIMessage(content="계산 결과 **권장 인슐린 용량**을 안내드립니다. 식후 2시간 뒤에는 꼭 혈당을 확인해 보세요!")
+
+        prompt_chars = sum(len(_text(m)) for m in messages)
+        message.usage_metadata = {
+            "input_tokens": prompt_chars // 2,
+            "output_tokens": len(message.content) // 2 + 1,
+            "total_tokens": prompt_chars // 2 + len(message.content) // 2 + 1,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    @staticmethod
+    def _triage(messages) -> str:
+        text = _text(messages[-1])
+        if re.search(r"혈당|교정", text):
+            return "correction"
+        if re.search(r"먹|마실|식사", text):
+            return "meal"
+        return "query"
+
+    def _information(self, messages) -> AIMessage:
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            return AIMessage(content="영양 정보를 확인했어요. 최근 이틀 간 운동하셨나요?")
+
+        question = next((_text(m) for m in reversed(messages[:-1]) if isinstance(m, AIMessage) and m.content), "")
+        text = _text(last) if isinstance(last, HumanMessage) else ""
+
+        foods = [food for food in self.foods if food in text]
+        if foods and not re.search(r"운동|스트레스|질병", question):
+            return AIMessage(content="", tool_calls=[
+                {"name": "nutrition_retriever_tool", "args": {"query": food}, "id": f"call_{i}_{food}"}
+                for i, food in enumerate(foods)
+            ])
+        if "운동" in question:
+            return AIMessage(content="현재 스트레스 강도는 상/중/하 중 어느 정도인가요?")
+        if "스트레스" in question:
+            return AIMessage(content="혹시 몸살이나 감기 같은 질병이 있으신가요?")
+        if "질병" in question or "드실 양" in question:
+            return AIMessage(content="정보 수집이 완료되었습니다.")
+        return AIMessage(content="최근 이틀 간 운동하셨나요?")
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    문자 bigram을 hashing한 결정적 벡터. 같은 글자가 많이 겹치는 음식 이름끼리 가깝습니다.
+    tools.embed_queries()가 client.create(input=..., model=...)를 직접 호출하므로 같은 형식을 제공합니다.
+    """
+
+    def __init__(self, dim: int = 128, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+        self.client = SimpleNamespace(create=self._create)
+        self.async_client = SimpleNamespace(create=self._acreate)
+
+    @property
+    def _invocation_params(self) -> dict:
+        return {"model": "fake-embedding"}
+
+    def _vector(self, text: str) -> list:
+        compact = re.sub(r"\s+", "", text)
+        vector = [0.0] * self.dim
+        for i in range(max(len(compact) - 1, 1)):
+            digest = hashlib.md5(compact[i:i + 2].encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dim] += 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: list) -> list:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        _sleep(self.latency)
+        return self._vector(text)
+
+    def _create(self, input: list, **params):
+        _sleep(self.latency)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=self._vector(text)) for text in input])
+
+    async def _acreate(self, input: list, **params):
+        return self._create(input, **params)
+
+
+class FakeCollection:
+
+    def __init__(self, docs: list, latency: float = 0.0):
+        self.docs = docs
+        self.latency = latency
+
+    def find_one(self, *args, **kwargs):
+        _sleep(self.latency)
+        return self.docs[0] if self.docs else None
+
+    def find(self, *args, **kwargs):
+        _sleep(self.latency)
+        return list(self.docs)
+
+
+class FakeMongoDB:
+    """get_health_data()가 사용하는 entries(혈당)/treatments(주사, 탄수화물 기록) 컬렉션."""
+
+    def __init__(self, blood_sugar: int = 150, latency: float = 0.0):
+        created_at = (datetime.now(timezone.utc) - timedelta(minutes=90)).isoformat().replace("+00:00", "Z")
+        self.collections = {
+            "entries": FakeCollection([{"sgv": blood_sugar}], latency),
+            "treatments": FakeCollection([{"_id": 1, "insulin": 2.0, "carbs": 30, "created_at": created_at}], latency),
+        }
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        return self.collections[name]
@@ -0,0 +1,219 @@
+"""
+그래프 전체 오프라인 벤치마크.
+
+workflow.py의 그래프를 네트워크 없이(fakes.py의 LLM/임베딩/MongoDB 대역) 대본대로 실행하여
+1. 턴 당 그래프 오버헤드 (전체 시간 - 대역이 잠든 시간)
+2. N개 thread 동시 실행 시 처리량(turns/s)
+3. 대화가 쌓일 때 checkpointer의 메모리/저장소 증가량
+을 보고합니다. 대본은 data/graph_conversations.json (식사/교정/질문 흐름)입니다.
+
+사용법 (backend 디렉토리에서):
+    python -m agent.benchmarks.graph_bench
+    python -m agent.benchmarks.graph_bench --llm-latency 0.8 --embedding-latency 0.2 --mongo-latency 0.05
+    python -m agent.benchmarks.graph_bench --threads 1,4,16 --checkpointer memory --output result.json
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage
+
+from .fakes import FakeChatModel, FakeEmbeddings, FakeMongoDB, injected_latency
+from ..lazy import reset_all
+from ..retrieval.embedding_cache import EmbeddingCache
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), 'data', 'graph_conversations.json')
+FOOD_DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'food_data', 'refined_food_data_fixed_weight.jsonl')
+
+
+def load_conversations() -> list:
+    with open(DATA_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_vector_store(embeddings: FakeEmbeddings):
+    """음식 데이터 전체를 대역 임베딩으로 메모리 vector store에 넣습니다. (Chroma 대신)"""
+    from langchain_core.vectorstores import InMemoryVectorStore
+
+    with open(FOOD_DATA_PATH, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    store = InMemoryVectorStore(embedding=embeddings)
+    store.add_documents([Document(page_content=row['식품명'], metadata=row) for row in rows])
+    return store
+
+
+def build_checkpointer(kind: str, path: str):
+    if kind == "memory":
+        from langgraph.checkpoint.memory import MemorySaver
+        return MemorySaver()
+
+    from ..checkpointer import build_checkpointer as build
+    return build(path)
+
+
+def install_fakes(conversations: list, args, checkpoint_path: str):
+    """Lazy.override()로 실제 client 대신 대역을 주입하고, 대역을 사용하는 그래프를 컴파일합니다."""
+    from .. import tools, utils, workflow
+    from ..nodes import nodes
+
+    foods = tuple(sorted({food for conversation in conversations for food in conversation["foods"]}, key=len, reverse=True))
+    llm = FakeChatModel(latency=args.llm_latency, foods=foods)
+    embeddings = FakeEmbeddings(latency=args.embedding_latency)
+
+    nodes.get_llm.override(llm)
+    nodes.get_extraction_llm.override(llm)
+    tools.get_query_embeddings.override(embeddings)
+    tools.get_embedding_cache.override(EmbeddingCache(path=os.path.join(os.path.dirname(checkpoint_path), "bench_embeddings.sqlite")))
+    tools.get_vector_store.override(build_vector_store(embeddings))
+    utils.get_db.override(FakeMongoDB(latency=args.mongo_latency))
+
+    checkpointer = build_checkpointer(args.checkpointer, checkpoint_path)
+    workflow.get_app.override(workflow.workflow.compile(checkpointer=checkpointer))
+
+    # 대역에 의존하는 chain들이 대역으로 다시 만들어지도록 초기화합니다.
+    reset_all(keep_overrides=True)
+    return workflow.get_app()
+
+
+def run_conversation(app, conversation: dict) -> list:
+    """대본 하나를 새 thread_id로 끝까지 실행합니다. 턴마다 (전체 시간, 대역 시간)을 반환합니다."""
+    config = {"configurable": {"thread_id": f"bench-{uuid.uuid4()}"}}
+    timings = []
+    for text in conversation["turns"]:
+        with injected_latency() as injected:
+            start = time.perf_counter()
+            app.invoke({"messages": [HumanMessage(content=text)]}, config)
+            elapsed = time.perf_counter() - start
+        timings.append((elapsed, injected[0]))
+    return timings
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    index = min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def measure_overhead(app, conversations: list, repeat: int) -> dict:
+    """flow 별로 턴 당 그래프 오버헤드(ms)를 측정합니다."""
+    overheads = {}
+    for _ in range(repeat):
+        for conversation in conversations:
+            for elapsed, injected in run_conversation(app, conversation):
+                overheads.setdefault(conversation["flow"], []).append((elapsed - injected) * 1000)
+
+    return {
+        flow: {
+            "turns": len(values),
+            "mean_ms": round(statistics.mean(values), 3),
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+        }
+        for flow, values in overheads.items()
+    }
+
+
+def measure_throughput(app, conversations: list, threads: int, per_thread: int) -> dict:
+    """threads개의 thread가 각자 per_thread번씩 모든 대본을 실행할 때의 처리량을 측정합니다."""
+
+    def worker(_):
+        return sum(len(run_conversation(app, conversation)) for _ in range(per_thread) for conversation in conversations)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        turns = sum(executor.map(worker, range(threads)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "threads": threads,
+        "turns": turns,
+        "seconds": round(elapsed, 3),
+        "turns_per_s": round(turns / elapsed, 2),
+    }
+
+
+def _storage_bytes(path: str) -> int:
+    return sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+
+
+def measure_memory(app, conversations: list, count: int, checkpoint_path: str) -> dict:
+    """대본을 count번 더 실행하는 동안 늘어난 Python heap과 checkpoint 저장소 크기를 측정합니다."""
+    gc.collect()
+    tracemalloc.start()
+    before_heap = tracemalloc.get_traced_memory()[0]
+    before_storage = _storage_bytes(checkpoint_path)
+
+    for i in range(count):
+        run_conversation(app, conversations[i % len(conversations)])
+
+    gc.collect()
+    after_heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    after_storage = _storage_bytes(checkpoint_path)
+
+    return {
+        "conversations": count,
+        "heap_growth_kb": round((after_heap - before_heap) / 1024, 1),
+        "heap_growth_per_conversation_kb": round((after_heap - before_heap) / 1024 / count, 2),
+        "storage_growth_kb": round((after_storage - before_storage) / 1024, 1),
+    }
+
+
+def run(args) -> dict:
+    conversations = load_conversations()
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoint_path = os.path.join(tmp, "bench_checkpoints.sqlite")
+        app = install_fakes(conversations, args, checkpoint_path)
+
+        # 첫 실행의 lazy 초기화/import 비용은 제외합니다.
+        for conversation in conversations:
+            run_conversation(app, conversation)
+
+        return {
+            "config": {
+                "llm_latency_s": args.llm_latency,
+                "embedding_latency_s": args.embedding_latency,
+                "mongo_latency_s": args.mongo_latency,
+                "checkpointer": args.checkpointer,
+            },
+            "overhead_per_turn": measure_overhead(app, conversations, args.repeat),
+            "throughput": [
+                measure_throughput(app, conversations, threads, args.per_thread)
+                for threads in args.threads
+            ],
+            "memory": measure_memory(app, conversations, args.memory_conversations, checkpoint_path),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="LLM 호출 1회에 주입할 지연(초)")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="임베딩 요청 1회에 주입할 지연(초)")
+    parser.add_argument("--mongo-latency", type=float, default=0.0, help="MongoDB 조회 1회에 주입할 지연(초)")
+    parser.add_argument("--checkpointer", default="sqlite", choices=["sqlite", "memory"])
+    parser.add_argument("--repeat", type=int, default=5, help="오버헤드 측정 시 대본 전체를 반복할 횟수")
+    parser.add_argument("--threads", type=lambda s: [int(n) for n in s.split(",")], default=[1, 4, 8])
+    parser.add_argument("--per-thread", type=int, default=2, help="처리량 측정 시 thread 당 대본 전체 반복 횟수")
+    parser.add_argument("--memory-conversations", type=int, default=50)
+    parser.add_argument("--output", help="결과를 저장할 json 파일 경로")
+    args = parser.parse_args()
+
+    result = run(args)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+영양 성분 검색(retriever) 품질/지연 벤치마크.
+
+라벨이 달린 검색어(data/retrieval_queries.jsonl: 오타, 띄어쓰기, 초성, 요리/원재료, 여러 단어 식사)를
+여러 검색기로 검색하여 검색기마다
+1. recall@1, recall@3 (상위 k개 안에 정답 식품명이 있는 비율)
+2. MRR (상위 HYBRID_CANDIDATES개 안에서 첫 정답 순위의 역수 평균)
+3. 검색어 당 지연 p50/p99 (ms)
+를 전체와 category 별로 보고합니다. 결과를 --output json 파일로 저장해 변경 전후를 비교합니다.
+
+기본값은 네트워크 없이 fakes.py의 임베딩 대역과, 대역 벡터로 만든 임시 mmap vector store를 사용합니다.
+(--live: 실제 Upstage 임베딩과 설정된 vector store를 사용합니다.)
+
+검색기:
+    nutrition_retriever  tools.search_nutrition (이름 색인 -> BM25 -> 오타 색인 -> 벡터 검색, 실제 도구 경로)
+    local                벡터 검색 없이 로컬 색인만 (hybrid._local)
+    lexical              BM25만
+    vector               벡터 검색만
+
+사용법 (backend 디렉토리에서):
+    python -m agent.benchmarks.retrieval_bench
+    python -m agent.benchmarks.retrieval_bench --embedding-latency 0.15 --repeat 5 --output retrieval.json
+    python -m agent.benchmarks.retrieval_bench --retrievers nutrition_retriever,vector --live
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from .fakes import FakeEmbeddings
+from .graph_bench import percentile
+from ..lazy import reset_all
+from ..retrieval.embedding_cache import EmbeddingCache
+from ..settings import FOOD_DATA_PATH, HYBRID_CANDIDATES
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), 'data', 'retrieval_queries.jsonl')
+
+
+def load_queries() -> list:
+    with open(DATA_PATH, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def install_fakes(args, tmp: str) -> None:
+    """Lazy.override()로 임베딩 client와 vector store를 대역으로 바꿉니다."""
+    from .. import tools
+    from ..retrieval.mmap_store import MmapVectorStore
+
+    embeddings = FakeEmbeddings(latency=args.embedding_latency)
+
+    with open(FOOD_DATA_PATH, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    vector_store = MmapVectorStore.from_texts(
+        [row['식품명'] for row in rows], embeddings, metadatas=rows, path=os.path.join(tmp, "bench_vectors.bin"),
+    )
+
+    tools.get_query_embeddings.override(embeddings)
+    # 같은 검색어를 반복 측정하므로, 캐시 적중으로 지연이 줄지 않도록 캐시를 끕니다.
+    tools.get_embedding_cache.override(EmbeddingCache(path=None, memory_size=0))
+    tools.get_vector_store.override(vector_store)
+    reset_all(keep_overrides=True)
+
+
+def retrievers() -> dict:
+    """검색기 이름 -> (검색어 -> Document 목록) 함수"""
+    from .. import tools
+    from ..retrieval.hybrid import _document, _local, get_lexical_index
+
+    def lexical(query: str) -> list:
+        index = get_lexical_index()
+        return [_document(index, doc_id) for doc_id, _ in index.search(query, k=HYBRID_CANDIDATES)]
+
+    return {
+        "nutrition_retriever": lambda query: tools.search_nutrition([query])[0],
+        "local": lambda query: _local([query])[0][0],
+        "lexical": lexical,
+        "vector": lambda query: tools.vector_search([query])[0],
+    }
+
+
+def first_relevant_rank(documents: list, relevant: list):
+    for rank, document in enumerate(documents, start=1):
+        if document.metadata.get('식품명', document.page_content) in relevant:
+            return rank
+    return None
+
+
+def score(ranks: list) -> dict:
+    return {
+        "queries": len(ranks),
+        "recall@1": round(sum(rank is not None and rank <= 1 for rank in ranks) / len(ranks), 3),
+        "recall@3": round(sum(rank is not None and rank <= 3 for rank in ranks) / len(ranks), 3),
+        "mrr": round(sum(1 / rank for rank in ranks if rank) / len(ranks), 3),
+    }
+
+
+def evaluate(search, queries: list, repeat: int) -> dict:
+    ranks, latencies, misses = [], [], []
+    by_category = {}
+
+    for item in queries:
+        elapsed = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            documents = search(item["query"])
+            elapsed.append((time.perf_counter() - start) * 1000)
+        latencies.extend(elapsed)
+
+        rank = first_relevant_rank(documents, item["relevant"])
+        ranks.append(rank)
+        by_category.setdefault(item["category"], []).append(rank)
+        if rank != 1:
+            top = documents[0].metadata.get('식품명', documents[0].page_content) if documents else None
+            misses.append({"query": item["query"], "expected": item["relevant"][0], "top1": top, "rank": rank})
+
+    return {
+        **score(ranks),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "by_category": {category: score(values) for category, values in sorted(by_category.items())},
+        "misses": misses,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    queries = load_queries()
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.live:
+            install_fakes(args, tmp)
+
+        available = retrievers()
+        names = args.retrievers or list(available)
+
+        # 첫 호출의 lazy 초기화(색인 생성 등) 비용은 제외합니다.
+        for name in names:
+            available[name](queries[0]["query"])
+
+        results = {name: evaluate(available[name], queries, args.repeat) for name in names}
+
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "config": {
+            "backend": "live" if args.live else "fake",
+            "embedding_latency_s": None if args.live else args.embedding_latency,
+            "repeat": args.repeat,
+            "queries": len(queries),
+        },
+        "retrievers": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--retrievers", type=lambda s: s.split(","), help="쉼표로 구분한 검색기 이름 (기본: 전체)")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="임베딩 요청 1회에 주입할 지연(초)")
+    parser.add_argument("--repeat", type=int, default=3, help="지연 측정 시 검색어 당 반복 횟수")
+    parser.add_argument("--live", action="store_true", help="실제 임베딩 client와 vector store를 사용합니다.")
+    parser.add_argument("--output", help="결과를 저장할 json 파일 경로")
+    args = parser.parse_args()
+
+    result = run(args)
+    summary = {
+        name: {key: value for key, value in metrics.items() if key not in ("by_category", "misses")}
+        for name, metrics in result["retrievers"].items()
+    }
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
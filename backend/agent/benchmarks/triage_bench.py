@@ -0,0 +1,93 @@
+"""
+Triage 로컬 분류기 벤치마크.
+
+라벨이 달린 발화(data/triage_utterances.jsonl)에 대해 로컬 분류기의 적중률(hit rate),
+적중한 발화의 정확도, 그리고 절약된 LLM 호출 시간을 보고합니다.
+
+사용법 (backend 디렉토리에서):
+    python -m agent.benchmarks.triage_bench --train            # train split으로 모델 재학습
+    python -m agent.benchmarks.triage_bench                    # test split 평가
+    python -m agent.benchmarks.triage_bench --live             # 미적중 발화는 실제 LLM으로 분류하고 지연을 측정
+"""
+import argparse
+import json
+import os
+import time
+
+from ..nodes.triage import TriageModel, classify
+from ..settings import TRIAGE_CONFIDENCE_THRESHOLD
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), 'data', 'triage_utterances.jsonl')
+
+
+def load_utterances(split: str = "test") -> list:
+    with open(DATA_PATH, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [row for row in rows if split == "all" or row["split"] == split]
+
+
+def measure_llm_latency(texts: list) -> float:
+    """triage_agent를 실제로 호출하여 평균 지연(초)을 측정합니다."""
+    from langchain_core.messages import HumanMessage
+    from ..nodes.nodes import get_triage_agent
+
+    elapsed = []
+    for text in texts:
+        start = time.perf_counter()
+        get_triage_agent().invoke({"messages": [HumanMessage(content=text)]})
+        elapsed.append(time.perf_counter() - start)
+    return sum(elapsed) / len(elapsed)
+
+
+def run(split: str, threshold: float, llm_latency: float, live: bool) -> dict:
+    rows = load_utterances(split)
+    model = TriageModel.load()
+
+    hits, correct, local_elapsed = 0, 0, 0.0
+    misses = []
+    for row in rows:
+        start = time.perf_counter()
+        label, confidence = classify(row["text"], model=model)
+        local_elapsed += time.perf_counter() - start
+
+        if confidence >= threshold:
+            hits += 1
+            correct += label == row["label"]
+        else:
+            misses.append(row["text"])
+
+    if live and misses:
+        llm_latency = measure_llm_latency(misses)
+
+    return {
+        "split": split,
+        "utterances": len(rows),
+        "threshold": threshold,
+        "hit_rate": round(hits / len(rows), 3),
+        "hit_accuracy": round(correct / hits, 3) if hits else None,
+        "local_latency_ms": round(local_elapsed / len(rows) * 1000, 3),
+        "llm_latency_s": round(llm_latency, 3),
+        "latency_saved_s": round(hits * llm_latency - local_elapsed, 3),
+        "latency_saved_per_turn_s": round((hits * llm_latency - local_elapsed) / len(rows), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--split", default="test", choices=["train", "test", "all"])
+    parser.add_argument("--threshold", type=float, default=TRIAGE_CONFIDENCE_THRESHOLD)
+    parser.add_argument("--llm-latency", type=float, default=1.5, help="LLM triage 호출 1회의 지연(초) 가정값")
+    parser.add_argument("--live", action="store_true", help="미적중 발화로 실제 LLM 지연을 측정합니다.")
+    parser.add_argument("--train", action="store_true", help="train split으로 모델을 학습하여 저장합니다.")
+    args = parser.parse_args()
+
+    if args.train:
+        model = TriageModel.train((row["text"], row["label"]) for row in load_utterances("train"))
+        model.save()
+        print("triage 모델을 저장했습니다.")
+
+    print(json.dumps(run(args.split, args.threshold, args.llm_latency, args.live), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
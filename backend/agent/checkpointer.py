@@ -0,0 +1,328 @@
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver, ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple,
+    copy_checkpoint, get_checkpoint_id,
+)
+
+from .settings import (
+    CHECKPOINT_DB_URI, CHECKPOINT_POOL_SIZE, CHECKPOINT_CACHE_SIZE,
+    CHECKPOINT_KEEP_LAST,
+)
+
+## LangGraph Checkpointer
+# * gunicorn worker 전체가 하나의 저장소(Postgres, 개발 환경은 SQLite)를 공유하도록 합니다.
+# * 원본 saver를 감싸서 아래 기능을 추가합니다.
+#   1. checkpoint_id 단위의 bounded LRU read-through 캐시
+#   2. thread_id 당 최근 N개만 남기는 압축(compaction)
+#   3. 오래된 대화를 지우는 TTL eviction
+# * 2, 3은 요청 처리 중(put)에는 실행하지 않고 chat 앱의 prune_checkpoints 명령에서 주기적으로 호출합니다.
+
+
+# dialect 별 SQL
+_SQL = {
+    "postgres": {
+        "latest": """
+            SELECT checkpoint_id FROM checkpoints
+            WHERE thread_id = %s AND checkpoint_ns = %s
+            ORDER BY checkpoint_id DESC LIMIT 1
+        """,
+        "threads": "SELECT DISTINCT thread_id FROM checkpoints",
+        "oversized": """
+            SELECT thread_id, checkpoint_ns FROM checkpoints
+            GROUP BY thread_id, checkpoint_ns HAVING COUNT(*) > %s
+        """,
+        "compact": [
+            """
+            DELETE FROM checkpoints
+            WHERE thread_id = %(thread_id)s AND checkpoint_ns = %(ns)s
+              AND checkpoint_id NOT IN (
+                SELECT checkpoint_id FROM checkpoints
+                WHERE thread_id = %(thread_id)s AND checkpoint_ns = %(ns)s
+                ORDER BY checkpoint_id DESC LIMIT %(keep)s
+              )
+            """,
+            """
+            DELETE FROM checkpoint_writes w
+            WHERE w.thread_id = %(thread_id)s AND w.checkpoint_ns = %(ns)s
+              AND NOT EXISTS (
+                SELECT 1 FROM checkpoints c
+                WHERE c.thread_id = w.thread_id AND c.checkpoint_ns = w.checkpoint_ns
+                  AND c.checkpoint_id = w.checkpoint_id
+              )
+            """,
+            # 남은 checkpoint 어디에서도 참조하지 않는 채널 값(blob)도 함께 정리합니다.
+            """
+            DELETE FROM checkpoint_blobs b
+            WHERE b.thread_id = %(thread_id)s AND b.checkpoint_ns = %(ns)s
+              AND NOT EXISTS (
+                SELECT 1 FROM checkpoints c
+                WHERE c.thread_id = b.thread_id AND c.checkpoint_ns = b.checkpoint_ns
+                  AND c.checkpoint -> 'channel_versions' ->> b.channel = b.version
+              )
+            """,
+        ],
+    },
+    "sqlite": {
+        "latest": """
+            SELECT checkpoint_id FROM checkpoints
+            WHERE thread_id = ? AND checkpoint_ns = ?
+            ORDER BY checkpoint_id DESC LIMIT 1
+        """,
+        "threads": "SELECT DISTINCT thread_id FROM checkpoints",
+        "oversized": """
+            SELECT thread_id, checkpoint_ns FROM checkpoints
+            GROUP BY thread_id, checkpoint_ns HAVING COUNT(*) > ?
+        """,
+        "compact": [
+            """
+            DELETE FROM checkpoints
+            WHERE thread_id = :thread_id AND checkpoint_ns = :ns
+              AND checkpoint_id NOT IN (
+                SELECT checkpoint_id FROM checkpoints
+                WHERE thread_id = :thread_id AND checkpoint_ns = :ns
+                ORDER BY checkpoint_id DESC LIMIT :keep
+              )
+            """,
+            """
+            DELETE FROM writes
+            WHERE thread_id = :thread_id AND checkpoint_ns = :ns
+              AND checkpoint_id NOT IN (
+                SELECT checkpoint_id FROM checkpoints
+                WHERE thread_id = :thread_id AND checkpoint_ns = :ns
+              )
+            """,
+        ],
+    },
+}
+
+
+class CachedCheckpointSaver(BaseCheckpointSaver):
+    """
+    Postgres/SQLite saver를 감싸는 checkpointer.
+
+    캐시는 checkpoint_id를 key로 사용합니다. checkpoint는 한 번 저장되면 바뀌지 않으므로
+    다른 worker가 같은 대화를 이어가도 오래된 state를 돌려주지 않습니다.
+    최신 checkpoint 조회는 PK 인덱스로 id만 확인한 뒤 캐시를 사용합니다.
+    """
+
+    def __init__(self, saver: BaseCheckpointSaver, dialect: str, maxsize: int = CHECKPOINT_CACHE_SIZE):
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+        self.dialect = dialect
+        self.maxsize = maxsize
+        self._cache: "OrderedDict[tuple, CheckpointTuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def config_specs(self):
+        return self.saver.config_specs
+
+    # --- 캐시 ---
+    def _cache_get(self, key: tuple) -> Optional[CheckpointTuple]:
+        with self._lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+        if value is None:
+            return None
+        # 그래프 실행 중 checkpoint의 dict가 수정되므로 복사본을 돌려줍니다.
+        return value._replace(
+            checkpoint=copy_checkpoint(value.checkpoint),
+            metadata=dict(value.metadata),
+            pending_writes=list(value.pending_writes) if value.pending_writes is not None else None,
+        )
+
+    def _cache_set(self, key: tuple, value: CheckpointTuple) -> None:
+        with self._lock:
+            self._cache[key] = value._replace(checkpoint=copy_checkpoint(value.checkpoint))
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def _cache_drop(self, thread_id: str, checkpoint_id: Optional[str] = None) -> None:
+        with self._lock:
+            for key in [k for k in self._cache if k[0] == thread_id and checkpoint_id in (None, k[2])]:
+                del self._cache[key]
+
+    # --- SQL 실행 ---
+    def _execute(self, query: str, params: Any, fetch: bool = False) -> list:
+        if self.dialect == "postgres":
+            with self.saver._cursor() as cur:
+                cur.execute(query, params)
+                return [tuple(row.values()) for row in cur.fetchall()] if fetch else []
+        else:
+            with self.saver.cursor() as cur:
+                cur.execute(query, params)
+                return cur.fetchall() if fetch else []
+
+    def _latest_checkpoint_id(self, thread_id: str, checkpoint_ns: str) -> Optional[str]:
+        rows = self._execute(_SQL[self.dialect]["latest"], (thread_id, checkpoint_ns), fetch=True)
+        return rows[0][0] if rows else None
+
+    # --- BaseCheckpointSaver 구현 ---
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+
+        if checkpoint_id is None:
+            checkpoint_id = self._latest_checkpoint_id(thread_id, checkpoint_ns)
+            if checkpoint_id is None:
+                return None
+
+        key = (thread_id, checkpoint_ns, checkpoint_id)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        value = self.saver.get_tuple({
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+            }
+        })
+        if value is not None:
+            self._cache_set(key, value)
+        return value
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        return self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        # 압축(compaction)은 prune_checkpoints에서 실행하므로 저장만 합니다.
+        return self.saver.put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self.saver.put_writes(config, writes, task_id, task_path)
+        # pending_writes가 바뀌었으므로 해당 checkpoint의 캐시는 무효화합니다.
+        self._cache_drop(str(config["configurable"]["thread_id"]), get_checkpoint_id(config))
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.saver.delete_thread(thread_id)
+        self._cache_drop(str(thread_id))
+
+    def get_next_version(self, current: Optional[str], channel) -> str:
+        return self.saver.get_next_version(current, channel)
+
+    # 비동기 버전은 동기 메서드를 thread pool에서 실행합니다.
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.put_writes, config, writes, task_id, task_path
+        )
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.delete_thread, thread_id)
+
+    # --- 유지 보수 ---
+    def compact(self, thread_id: str, checkpoint_ns: str = "", keep: int = CHECKPOINT_KEEP_LAST) -> None:
+        """thread_id의 최근 checkpoint `keep`개만 남기고 나머지를 삭제합니다."""
+        params = {"thread_id": thread_id, "ns": checkpoint_ns, "keep": max(keep, 2)}
+        for query in _SQL[self.dialect]["compact"]:
+            self._execute(query, params)
+        self._cache_drop(thread_id)
+
+    def compact_all(self, keep: int = CHECKPOINT_KEEP_LAST) -> int:
+        """checkpoint가 `keep`개보다 많은 대화만 골라 압축하고, 압축한 대화 수를 반환합니다."""
+        keep = max(keep, 2)
+        rows = self._execute(_SQL[self.dialect]["oversized"], (keep,), fetch=True)
+        for thread_id, checkpoint_ns in rows:
+            self.compact(thread_id, checkpoint_ns, keep)
+        return len(rows)
+
+    def stored_thread_ids(self) -> set:
+        """checkpoint가 남아 있는 thread_id 목록. (이미 삭제한 대화를 다시 처리하지 않도록 사용합니다.)"""
+        return {row[0] for row in self._execute(_SQL[self.dialect]["threads"], (), fetch=True)}
+
+    def evict_threads(self, thread_ids) -> int:
+        """종료된 대화들의 state를 모두 삭제하고, 삭제한 대화 수를 반환합니다."""
+        count = 0
+        for thread_id in thread_ids:
+            self.delete_thread(str(thread_id))
+            count += 1
+        return count
+
+    def setup(self) -> None:
+        """저장소의 테이블을 생성합니다. (Postgres는 배포 시 한 번 실행해야 합니다.)"""
+        self.saver.setup()
+
+
+def build_checkpointer(uri: str = CHECKPOINT_DB_URI) -> CachedCheckpointSaver:
+    """설정된 저장소에 연결된 checkpointer를 생성합니다."""
+
+    if uri.startswith(("postgres://", "postgresql://")):
+        from psycopg.rows import dict_row
+        from psycopg_pool import ConnectionPool
+        from langgraph.checkpoint.postgres import PostgresSaver
+
+        pool = ConnectionPool(
+            conninfo=uri,
+            max_size=CHECKPOINT_POOL_SIZE,
+            kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+            open=True,
+        )
+        return CachedCheckpointSaver(PostgresSaver(pool), dialect="postgres")
+
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    conn = sqlite3.connect(uri, check_same_thread=False)
+    return CachedCheckpointSaver(SqliteSaver(conn), dialect="sqlite")
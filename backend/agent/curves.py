@@ -0,0 +1,94 @@
+from datetime import datetime
+from typing import Callable, Union
+
+import numpy as np
+
+from .settings import (
+    INSULIN_CURVE, INSULIN_ACTION_MINUTES, INSULIN_HALF_LIFE_MINUTES, INSULIN_BIEXPONENTIAL_MINUTES,
+    CARB_CURVE, DIGEST_SPEED, CARB_ABSORPTION_MINUTES,
+)
+
+## IOB(체내 잔존 인슐린)/COB(체내 잔존 탄수화물) 곡선
+# * 주사/식사 기록 n개와 시각 g개의 조합 전체를 (g, n) 행렬 한 번으로 계산합니다.
+#   (예: 앞으로 6시간을 5분 간격으로 -> 73개 시각의 IOB/COB를 한 번에)
+# * 곡선은 (경과 분, 양) -> 남은 양 함수이며, 이름으로 골라 씁니다. (settings.INSULIN_CURVE, CARB_CURVE)
+#   인슐린
+#   - linear: 작용 시간 동안 일정하게 줄어듭니다. (기존 IOB_calculator)
+#   - exponential: 반감기마다 절반이 됩니다.
+#   - biexponential: 흡수(빠른 시정수)와 소멸(느린 시정수)의 두 지수 함수의 차이인 작용 곡선의 적분입니다.
+#     작용이 0에서 시작하여 약 1시간 뒤 최고점을 지나 천천히 줄어드는 속효성 인슐린의 모양입니다.
+#   탄수화물
+#   - linear: 시간당 DIGEST_SPEED g씩 흡수됩니다. (기존 COB_calculator)
+#   - triangle: 흡수 속도가 CARB_ABSORPTION_MINUTES의 절반까지 늘었다가 줄어드는 삼각형 모양으로 흡수됩니다.
+# * 기록 시각보다 이전 시각에서는(아직 주사/식사 전) 0입니다.
+
+Curve = Callable[..., np.ndarray]
+
+
+# 1. 인슐린 곡선
+def linear_insulin(minutes: np.ndarray, doses: np.ndarray, duration: float = INSULIN_ACTION_MINUTES) -> np.ndarray:
+    return doses * np.clip(1 - minutes / duration, 0, 1)
+
+
+def exponential_insulin(minutes: np.ndarray, doses: np.ndarray, half_life: float = INSULIN_HALF_LIFE_MINUTES) -> np.ndarray:
+    return doses * 0.5 ** (minutes / half_life)
+
+
+def biexponential_insulin(
+    minutes: np.ndarray, doses: np.ndarray, time_constants: tuple = INSULIN_BIEXPONENTIAL_MINUTES,
+) -> np.ndarray:
+    fast, slow = sorted(time_constants)
+    return doses * (slow * np.exp(-minutes / slow) - fast * np.exp(-minutes / fast)) / (slow - fast)
+
+
+# 2. 탄수화물 곡선
+def linear_carbs(minutes: np.ndarray, carbs: np.ndarray, speed: float = DIGEST_SPEED) -> np.ndarray:
+    return np.maximum(0, carbs - (speed / 60) * minutes)
+
+
+def triangle_carbs(minutes: np.ndarray, carbs: np.ndarray, duration: float = CARB_ABSORPTION_MINUTES) -> np.ndarray:
+    x = np.clip(minutes / duration, 0, 1)
+    absorbed = np.where(x < 0.5, 2 * x ** 2, 1 - 2 * (1 - x) ** 2)
+    return carbs * (1 - absorbed)
+
+
+INSULIN_CURVES = {
+    "linear": linear_insulin,
+    "exponential": exponential_insulin,
+    "biexponential": biexponential_insulin,
+}
+CARB_CURVES = {
+    "linear": linear_carbs,
+    "triangle": triangle_carbs,
+}
+
+
+# 3. 계산
+def time_grid(start: Union[datetime, float], hours: float = 6, step_minutes: float = 5) -> np.ndarray:
+    """start부터 hours 시간 뒤까지 step_minutes 간격의 utc timestamp(초) 배열 (양 끝 포함)"""
+    start = start.timestamp() if isinstance(start, datetime) else float(start)
+    return start + np.arange(0, hours * 60 + step_minutes / 2, step_minutes) * 60
+
+
+def on_board(times, amounts, at, curve: Curve, **params) -> np.ndarray:
+    """
+    Args:
+        times: 기록 시각 utc timestamp(초) 배열 (n,)
+        amounts: 기록의 양(인슐린 단위, 탄수화물 g) 배열 (n,). NaN은 0으로 봅니다.
+        at: 계산할 시각 utc timestamp(초) 배열 (g,)
+    Returns:
+        시각마다 남은 양의 합 (g,)
+    """
+    times = np.asarray(times, dtype=np.float64)
+    amounts = np.nan_to_num(np.asarray(amounts, dtype=np.float64))
+    minutes = (np.asarray(at, dtype=np.float64)[:, None] - times[None, :]) / 60
+    remaining = curve(np.maximum(minutes, 0), amounts[None, :], **params)
+    return np.where(minutes >= 0, remaining, 0).sum(axis=1)
+
+
+def iob(times, doses, at, curve: str = INSULIN_CURVE, **params) -> np.ndarray:
+    return on_board(times, doses, at, INSULIN_CURVES[curve], **params)
+
+
+def cob(times, carbs, at, curve: str = CARB_CURVE, **params) -> np.ndarray:
+    return on_board(times, carbs, at, CARB_CURVES[curve], **params)
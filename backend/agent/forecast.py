@@ -0,0 +1,169 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+from . import curves
+from .health import KST, HealthSnapshotCache, get_health_cache
+from .lazy import lazy
+from .settings import (
+    CF, ISR, FORECAST_HOURS, FORECAST_STEP_MINUTES, TREND_MINUTES, TREND_DECAY_MINUTES, FORECAST_MAX_AGE,
+)
+
+## 혈당 예측
+# * 최근 CGM 추세와 IOB/COB 곡선(curves.py), 개인 profile(CF, ISR)로 앞으로 FORECAST_HOURS 시간의 혈당을 예측합니다.
+# * 작업순서:
+#   1. trend(): 최근 TREND_MINUTES 분 안의 CGM 기록에 직선을 맞춰 기울기(mg/dL/분)를 구합니다.
+#   2. forecast(): 시각 t의 혈당 = 현재 혈당
+#                                  + 추세 (TREND_DECAY_MINUTES 시정수로 줄어듦)
+#                                  - CF * (현재 IOB - t의 IOB)             (그동안 작용한 인슐린)
+#                                  + CF / ISR * (현재 COB - t의 COB)       (그동안 흡수된 탄수화물)
+#      추세에는 이미 작용 중인 인슐린/탄수화물의 효과도 섞여 있으므로, 추세는 짧게만 이어지게 합니다.
+#   3. ForecastCache: health.py의 snapshot에서 계산하므로 DB를 조회하지 않습니다.
+#      새 CGM/주사 기록이 들어와 snapshot의 version이 바뀌거나, FORECAST_MAX_AGE가 지나면 다시 계산합니다.
+# * factor_prompt(추출 모델)와 /chat/forecast/ API에서 사용합니다.
+
+# CGM이 표시하는 혈당 범위(mg/dL)
+LOW, HIGH = 39, 400
+
+
+# 1. 추세
+def trend(entries: list, now: float) -> float:
+    """utils.fetch_recent_entries() 형식의 기록으로 기울기(mg/dL/분)를 구합니다. 기록이 두 개보다 적으면 0입니다."""
+    points = np.array([
+        (entry["timestamp"], entry["sgv"]) for entry in entries
+        if entry["timestamp"] and entry["sgv"] is not None and now - entry["timestamp"] <= TREND_MINUTES * 60
+    ], dtype=np.float64).reshape(-1, 2)
+    if len(points) < 2 or np.ptp(points[:, 0]) == 0:
+        return 0.0
+    minutes = (points[:, 0] - points[:, 0].max()) / 60
+    return float(np.polyfit(minutes, points[:, 1], 1)[0])
+
+
+# 2. 예측
+@dataclass
+class Forecast:
+    generated_at: datetime
+    blood_sugar: Optional[float]
+    trend: float             # mg/dL/분
+    minutes: np.ndarray      # generated_at부터의 경과 분
+    glucose: np.ndarray      # mg/dL (현재 혈당이 없으면 NaN)
+    iob: np.ndarray
+    cob: np.ndarray
+
+    def at(self, minutes: float) -> float:
+        return float(np.interp(minutes, self.minutes, self.glucose))
+
+    def to_dict(self) -> dict:
+        return {
+            "generated_at": self.generated_at.astimezone(KST).isoformat(timespec="seconds"),
+            "blood_sugar": self.blood_sugar,
+            "trend_per_5min": round(self.trend * 5, 1),
+            "points": [
+                {
+                    "minutes": int(minutes),
+                    "glucose": None if np.isnan(glucose) else round(float(glucose)),
+                    "iob": round(float(iob), 2),
+                    "cob": round(float(cob), 1),
+                }
+                for minutes, glucose, iob, cob in zip(self.minutes, self.glucose, self.iob, self.cob)
+            ],
+        }
+
+    def summary(self) -> str:
+        """LLM에게 전달할 한 줄 요약"""
+        if self.blood_sugar is None:
+            return "혈당 기록이 없어 예측할 수 없습니다."
+        horizons = [minutes for minutes in (30, 60, 120, 240) if minutes <= self.minutes[-1]]
+        lowest = int(np.argmin(self.glucose))
+        parts = [f"{_duration(minutes)} 뒤 {self.at(minutes):.0f}" for minutes in horizons]
+        return (
+            f"현재 {self.blood_sugar:.0f} mg/dL (5분당 {self.trend * 5:+.1f}), " + ", ".join(parts)
+            + f" mg/dL, 최저 {self.glucose[lowest]:.0f} mg/dL ({_duration(self.minutes[lowest])} 뒤)"
+        )
+
+
+def _duration(minutes: float) -> str:
+    hours, minutes = divmod(int(minutes), 60)
+    if hours and minutes:
+        return f"{hours}시간 {minutes}분"
+    return f"{hours}시간" if hours else f"{minutes}분"
+
+
+def forecast(
+    health: HealthSnapshotCache, now: datetime = None, hours: float = FORECAST_HOURS, step_minutes: float = FORECAST_STEP_MINUTES,
+) -> Forecast:
+    now = now or datetime.now(timezone.utc)
+    grid = curves.time_grid(now, hours, step_minutes)
+    minutes = (grid - grid[0]) / 60
+
+    iob = health.treatments.iob_curve(grid)
+    cob = health.treatments.cob_curve(grid)
+    blood_sugar = health.blood_sugar
+    slope = trend(health.entries, grid[0])
+
+    if blood_sugar is None:
+        glucose = np.full(len(grid), np.nan)
+    else:
+        momentum = slope * TREND_DECAY_MINUTES * (1 - np.exp(-minutes / TREND_DECAY_MINUTES))
+        insulin_effect = -CF * (iob[0] - iob)
+        carb_effect = CF / ISR * (cob[0] - cob)
+        glucose = np.clip(blood_sugar + momentum + insulin_effect + carb_effect, LOW, HIGH)
+
+    return Forecast(now, blood_sugar, slope, minutes, glucose, iob, cob)
+
+
+# 3. 캐시
+class ForecastCache:
+
+    def __init__(self, health: HealthSnapshotCache = None, max_age: float = FORECAST_MAX_AGE):
+        self.health = health
+        self.max_age = max_age
+        self._forecast: Optional[Forecast] = None
+        self._key = None
+        self._computed_at = 0.0
+        self._lock = threading.Lock()
+
+    def _health(self) -> HealthSnapshotCache:
+        return get_health_cache() if self.health is None else self.health
+
+    def cached(self) -> Optional[Forecast]:
+        """snapshot이 최신이고 그 뒤로 새 기록이 없으면 저장된 예측을 반환합니다."""
+        health = self._health()
+        if not health.fresh() or self._key != (id(health), health.version):
+            return None
+        if time.monotonic() - self._computed_at > self.max_age:
+            return None
+        return self._forecast
+
+    def get(self) -> Forecast:
+        health = self._health()
+        health.ensure_fresh()
+        result = self.cached()
+        if result is None:
+            with self._lock:
+                result = self.cached()
+                if result is None:
+                    key = (id(health), health.version)
+                    result = forecast(health)
+                    self._forecast, self._key, self._computed_at = result, key, time.monotonic()
+        return result
+
+
+get_forecast_cache = lazy(ForecastCache)
+
+
+def current_forecast() -> Forecast:
+    return get_forecast_cache().get()
+
+
+async def acurrent_forecast() -> Forecast:
+    """current_forecast()의 비동기 버전입니다. 다시 계산해야 할 때만 thread pool에서 실행합니다."""
+    result = get_forecast_cache().cached()
+    if result is None:
+        return await asyncio.to_thread(current_forecast)
+    return result
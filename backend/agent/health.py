@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+from .lazy import lazy
+from .metrics import HEALTH_SNAPSHOT_REFRESHES
+from .settings import (
+    HEALTH_SNAPSHOT_FULL_REFRESH, HEALTH_SNAPSHOT_MAX_AGE, HEALTH_SNAPSHOT_MODE, HEALTH_SNAPSHOT_POLL_INTERVAL,
+    TREND_MINUTES,
+)
+from .treatments import TreatmentBuffer
+from .utils import (
+    get_db, context_data, fetch_recent_entries, fetch_treatments, parse_treatment,
+)
+
+## 혈당/주사 기록 snapshot 캐시
+# * factor_node가 인슐린 계산 중에 MongoDB를 조회하지 않도록, 최근 기록을 백그라운드에서 미리 가져와 둡니다.
+# * 작업순서:
+#   1. snapshot은 최근 CGM 기록과, 주사/식사 기록의 ring buffer(treatments.py), 마지막으로 확인한 시점입니다.
+#      IOB/COB는 읽을 때 현재 시각으로 계산하므로 snapshot이 조금 오래되어도 값이 어긋나지 않습니다.
+#      새 기록이 들어올 때마다 version이 바뀌므로, 이 값으로 만든 결과(forecast.py)는 version으로 무효화합니다.
+#   2. 백그라운드 thread가 snapshot을 갱신합니다.
+#      - poll: HEALTH_SNAPSHOT_POLL_INTERVAL 마다 마지막으로 본 기록 이후의 CGM 기록(date)과 주사/식사 기록(created_at)만 조회합니다.
+#        새 기록만 조회하면 Nightscout에서 수정/삭제된 기록이나 늦게 올라온 과거 기록을 놓치므로,
+#        HEALTH_SNAPSHOT_FULL_REFRESH 마다는 최근 5시간의 기록 전체를 다시 읽어 buffer를 바꿉니다.
+#        기록이나 최근 혈당이 바뀐 경우에만 version을 올립니다.
+#        조회에 실패하면 warning을 남기고, 연속 실패 횟수에 따라 간격을 두 배씩(최대 MAX_POLL_BACKOFF) 늘립니다.
+#      - watch: entries/treatments의 change stream을 구독합니다. 새 주사/식사 기록은 조회 없이 buffer에 추가하고,
+#        기록이 수정/삭제되면 전체를 다시 조회합니다. stream이 살아 있는 동안 변경이 없으면 snapshot은 최신입니다.
+#        change stream을 쓸 수 없으면(standalone 서버 등) poll로 바꿉니다.
+#   3. current_context_data(): snapshot이 HEALTH_SNAPSHOT_MAX_AGE보다 오래되었거나 없으면 그때만 직접 조회합니다.
+#      (동시에 들어온 요청은 한 번의 조회를 함께 기다립니다.)
+# * 이 앱은 Nightscout DB 하나(utils.get_db)를 읽으므로 snapshot도 프로세스 당 하나입니다.
+#   MongoClient처럼 fork 이후 재사용할 수 없으므로 worker마다 만듭니다. (lazy)
+
+KST = timezone(timedelta(hours=9))
+# 조회가 연속으로 실패할 때 poll 간격의 최댓값(초)
+MAX_POLL_BACKOFF = 300
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def _counted(trigger: str):
+    try:
+        yield
+    except Exception:
+        HEALTH_SNAPSHOT_REFRESHES.labels(trigger=trigger, result="error").inc()
+        raise
+    HEALTH_SNAPSHOT_REFRESHES.labels(trigger=trigger, result="ok").inc()
+
+
+def _is_treatment(document: dict) -> bool:
+    """utils.treatments_filter()와 같은 조건 (시각은 buffer가 거릅니다.)"""
+    if not document.get('created_at'):
+        return False
+    return any(isinstance(document.get(key), (int, float)) and document[key] > 0 for key in ('insulin', 'carbs'))
+
+
+class HealthSnapshotCache:
+
+    def __init__(
+        self,
+        db=None,
+        max_age: float = HEALTH_SNAPSHOT_MAX_AGE,
+        mode: str = HEALTH_SNAPSHOT_MODE,
+        poll_interval: float = HEALTH_SNAPSHOT_POLL_INTERVAL,
+        full_refresh: float = HEALTH_SNAPSHOT_FULL_REFRESH,
+    ):
+        self.db = db
+        self.max_age = max_age
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.full_refresh = full_refresh
+        self.treatments = TreatmentBuffer()
+        self.entries = []  # utils.fetch_recent_entries() 형식, 새 기록부터
+        self.version = 0
+        self._checked_at: Optional[float] = None  # time.monotonic()
+        self._reloaded_at: Optional[float] = None  # 마지막으로 전체를 다시 읽은 시각 (time.monotonic())
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _db(self):
+        return get_db() if self.db is None else self.db
+
+    # 1. 갱신
+    def refresh(self, trigger: str = "request") -> None:
+        """최근 혈당과 최근 5시간의 기록 전체를 다시 조회합니다."""
+        self._reload(trigger)
+        self.version += 1
+
+    def update(self, trigger: str = "poll") -> None:
+        """
+        마지막으로 본 기록 이후의 새 기록만 조회합니다. HEALTH_SNAPSHOT_FULL_REFRESH가 지났으면 전체를 다시 읽습니다.
+        기록이나 최근 혈당이 바뀐 경우에만 version을 올립니다.
+        """
+        if self._checked_at is None:
+            return self.refresh(trigger)
+        if time.monotonic() - self._reloaded_at >= self.full_refresh:
+            changed = self._reload(trigger)
+        else:
+            changed = self._load_new(trigger)
+        if changed:
+            self.version += 1
+        self.treatments.expire(datetime.now(timezone.utc))
+
+    def _reload(self, trigger: str) -> bool:
+        """전체를 다시 조회하여 바꿉니다. 수정/삭제된 기록도 반영됩니다."""
+        db = self._db()
+        with _counted(trigger):
+            treatments = fetch_treatments(db)
+            entries = fetch_recent_entries(TREND_MINUTES + 1, db)
+        changed = self.treatments.reset(treatments)
+        changed = changed or entries[:1] != self.entries[:1]
+        self.entries = entries
+        self._checked_at = self._reloaded_at = time.monotonic()
+        return changed
+
+    def _load_new(self, trigger: str) -> bool:
+        """가장 최근 기록의 created_at/date 이후에 생긴 기록만 조회하여 추가합니다."""
+        db = self._db()
+        times = self.treatments.records()[0]
+        since = datetime.fromtimestamp(times.max(), timezone.utc) if len(times) else None
+        latest = self.entries[0]["timestamp"] if self.entries else None
+        with _counted(trigger):
+            treatments = fetch_treatments(db, since=since)
+            if latest is None:
+                entries = fetch_recent_entries(TREND_MINUTES + 1, db)
+            else:
+                entries = fetch_recent_entries(TREND_MINUTES + 1, db, after=latest) + self.entries
+        # since와 같은 시각의 기록은 다시 조회되지만, buffer가 이미 있는 기록은 무시합니다.
+        added = self.treatments.extend(treatments)
+        entries = entries[:TREND_MINUTES + 1]
+        changed = bool(added) or entries[:1] != self.entries[:1]
+        self.entries = entries
+        self._checked_at = time.monotonic()
+        return changed
+
+    @property
+    def blood_sugar(self):
+        return self.entries[0]["sgv"] if self.entries else None
+
+    def fresh(self) -> bool:
+        return self._checked_at is not None and time.monotonic() - self._checked_at <= self.max_age
+
+    # 2. 백그라운드 갱신
+    def start(self) -> None:
+        if self.mode == "off" or (self._thread and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            target = self._watch if self.mode == "watch" else self._poll
+            self._thread = threading.Thread(target=target, name="health-snapshot", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _poll(self) -> None:
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                self.update(trigger="poll")
+                failures = 0
+            except Exception as error:
+                # 다음 주기에 다시 시도합니다. (그동안 요청은 직접 조회합니다.)
+                failures += 1
+                logger.warning("혈당/주사 기록 snapshot 갱신 실패 (%d회 연속): %r", failures, error)
+            self._stop.wait(self._poll_delay(failures))
+
+    def _poll_delay(self, failures: int) -> float:
+        if not failures:
+            return self.poll_interval
+        return max(min(self.poll_interval * 2 ** failures, MAX_POLL_BACKOFF), self.poll_interval)
+
+    def _watch(self) -> None:
+        pipeline = [{"$match": {"ns.coll": {"$in": ["entries", "treatments"]}}}]
+        try:
+            with self._db().watch(pipeline, max_await_time_ms=int(self.poll_interval * 1000)) as stream:
+                self.refresh(trigger="watch")
+                while not self._stop.is_set() and stream.alive:
+                    change = stream.try_next()
+                    if change is not None:
+                        self._apply(change)
+                    # 변경이 없으면(또는 반영했으면) 가지고 있는 기록이 최신입니다.
+                    self._checked_at = time.monotonic()
+        except Exception as error:
+            logger.warning("change stream을 사용할 수 없어 주기 조회로 바꿉니다: %r", error)
+        # change stream을 쓸 수 없거나 끊어졌으면, 그동안 놓친 변경이 있을 수 있으므로 전체를 다시 읽은 뒤 주기 조회로 바꿉니다.
+        self._checked_at = None
+        self._poll()
+
+    def _apply(self, change: dict) -> None:
+        with _counted("watch"):
+            if change["ns"]["coll"] == "entries":
+                self.entries = fetch_recent_entries(TREND_MINUTES + 1, self._db())
+            elif change["operationType"] == "insert":
+                document = change["fullDocument"]
+                if _is_treatment(document):
+                    self.treatments.extend([parse_treatment(document)])
+            else:
+                # 수정/삭제된 기록은 buffer에서 찾을 수 없으므로 전체를 다시 읽습니다.
+                self.treatments.reset(fetch_treatments(self._db()))
+        self.version += 1
+        self.treatments.expire(datetime.now(timezone.utc))
+
+    # 3. 조회
+    def ensure_fresh(self) -> None:
+        """snapshot이 HEALTH_SNAPSHOT_MAX_AGE보다 오래되었으면 직접 갱신합니다."""
+        self.start()
+        if not self.fresh():
+            with self._lock:
+                if not self.fresh():
+                    self.update(trigger="request")
+
+    def context_data(self, now: datetime = None) -> dict:
+        """utils.prepare_context_data()와 같은 형식. IOB/COB는 buffer에서 now 기준으로 계산합니다."""
+        now = now or datetime.now(timezone.utc)
+        return context_data(
+            now.astimezone(KST).isoformat(), self.blood_sugar, self.treatments.iob(now), self.treatments.cob(now),
+        )
+
+
+get_health_cache = lazy(HealthSnapshotCache)
+
+
+def current_context_data() -> dict:
+    cache = get_health_cache()
+    cache.ensure_fresh()
+    return cache.context_data()
+
+
+async def acurrent_context_data() -> dict:
+    """current_context_data()의 비동기 버전입니다. 직접 조회해야 할 때만 thread pool에서 실행합니다."""
+    cache = get_health_cache()
+    cache.start()
+    if not cache.fresh():
+        return await asyncio.to_thread(current_context_data)
+    return cache.context_data()
@@ -0,0 +1,76 @@
+import os
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+## 지연 초기화(lazy initialization) 도우미
+# * 모듈을 import하는 것만으로는 네트워크 연결이나 무거운 객체 생성이 일어나지 않도록 합니다.
+# * 처음 호출될 때 객체를 만들고, 이후에는 만들어 둔 객체를 재사용합니다.
+# * gunicorn --preload 환경을 위해 두 가지 종류를 구분합니다.
+#   1. per_process (기본): 네트워크 client 등. fork된 worker에서는 부모의 객체를 버리고 새로 만듭니다.
+#   2. shared=True: 읽기 전용 데이터. master에서 만든 객체를 fork 후에도 그대로 공유합니다.
+
+T = TypeVar("T")
+
+_registry: list = []
+
+
+class Lazy(Generic[T]):
+
+    def __init__(self, factory: Callable[[], T], shared: bool = False):
+        self.factory = factory
+        self.shared = shared
+        self._value: Optional[T] = None
+        self._pid: Optional[int] = None
+        self._overridden = False
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _stale(self) -> bool:
+        if self._overridden:
+            return False
+        return self._pid is None or (not self.shared and self._pid != os.getpid())
+
+    def __call__(self) -> T:
+        if self._stale():
+            with self._lock:
+                if self._stale():
+                    self._value = self.factory()
+                    self._pid = os.getpid()
+        return self._value
+
+    @property
+    def loaded(self) -> bool:
+        return self._pid is not None
+
+    def override(self, value: T) -> None:
+        """벤치마크나 테스트에서 실제 객체 대신 사용할 값을 주입합니다."""
+        with self._lock:
+            self._value = value
+            self._pid = os.getpid()
+            self._overridden = True
+
+    def reset(self) -> None:
+        with self._lock:
+            self._value = None
+            self._pid = None
+            self._overridden = False
+
+
+def lazy(factory: Callable[[], T] = None, *, shared: bool = False):
+    """
+    함수를 Lazy 객체로 감싸는 decorator.
+
+        @lazy
+        def get_client():
+            return SomeClient()
+    """
+    if factory is None:
+        return lambda f: Lazy(f, shared=shared)
+    return Lazy(factory, shared=shared)
+
+
+def reset_all(keep_overrides: bool = True) -> None:
+    """주입된 값을 제외한 모든 Lazy 객체를 초기화합니다. (주입한 값에 의존하는 객체를 다시 만들 때 사용)"""
+    for item in _registry:
+        if not (keep_overrides and item._overridden):
+            item.reset()
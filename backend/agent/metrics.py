@@ -0,0 +1,239 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess
+from pymongo import monitoring
+
+from .settings import METRICS_SAMPLE_RATE
+
+## 에이전트 계측(instrumentation)
+# * Prometheus 지표(/metrics)와, 대화 한 턴의 단계별 소요 시간(TurnMetrics)을 함께 기록합니다.
+# * 작업순서:
+#   1. ai_connector가 턴마다 TurnMetrics를 만들고 그래프 실행 config의 callbacks에 handler를 넣습니다.
+#   2. handler가 노드(on_chain_*)와 LLM 호출(on_chat_model_start/on_llm_end)의 시간과 token 수를 기록합니다.
+#   3. 콜백이 없는 벡터 검색과 MongoDB 조회는 record()/timed()와 MongoCommandListener로 기록합니다.
+#      현재 턴은 contextvar로 찾으므로, 턴 밖에서 실행되면 Prometheus 지표에만 반영됩니다.
+# * gunicorn worker가 여러 개라면 PROMETHEUS_MULTIPROC_DIR을 설정해야 합니다. (gunicorn.conf.py 참고)
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+NODE_SECONDS = Histogram(
+    "agent_node_seconds", "그래프 노드 실행 시간", ["node"], buckets=LATENCY_BUCKETS,
+)
+LLM_SECONDS = Histogram(
+    "agent_llm_seconds", "LLM 호출 시간", ["model", "node"], buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "agent_llm_tokens", "LLM 호출에 사용된 token 수", ["model", "node", "kind"],
+)
+RETRIEVER_SECONDS = Histogram(
+    "agent_retriever_seconds", "임베딩/벡터 검색 시간", ["op"], buckets=LATENCY_BUCKETS,
+)
+RETRIEVER_PATH = Counter(
+    "agent_retriever_path", "검색어를 처리한 경로 (name/lexical: 임베딩 생략, fuzzy/hybrid: 벡터 검색 포함)", ["path"],
+)
+NAME_INDEX_LOOKUPS = Counter(
+    "agent_name_index_lookups", "음식 이름 색인 조회 결과 (exact: 바로 반환, candidate: 벡터 검색과 합침, miss)", ["result"],
+)
+EMBEDDING_CACHE_LOOKUPS = Counter(
+    "agent_embedding_cache_lookups", "검색어 임베딩 캐시 조회 결과 (memory/disk: hit, miss, error: SQLite 오류)", ["tier"],
+)
+MONGO_SECONDS = Histogram(
+    "agent_mongo_seconds", "MongoDB 명령 실행 시간", ["command", "collection"], buckets=LATENCY_BUCKETS,
+)
+HEALTH_SNAPSHOT_REFRESHES = Counter(
+    "agent_health_snapshot_refreshes", "혈당/주사 기록 snapshot 갱신 (poll/watch: 백그라운드, request: 요청 중 직접 조회)", ["trigger", "result"],
+)
+TURN_SECONDS = Histogram(
+    "agent_turn_seconds", "대화 한 턴(그래프 실행 전체)의 처리 시간", buckets=LATENCY_BUCKETS,
+)
+
+def generate_metrics() -> bytes:
+    """Prometheus text format으로 지표를 반환합니다. multiprocess 모드라면 모든 worker의 지표를 합칩니다."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+_current_turn: ContextVar[Optional["TurnMetrics"]] = ContextVar("agent_current_turn", default=None)
+
+
+class TurnMetrics:
+    """대화 한 턴 동안의 단계별 소요 시간과 token 수. ChatMessage.metrics에 저장됩니다."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = None
+        self.nodes = {}
+        self.llm = {}
+        self.retriever = {}
+        self.mongo = {}
+        self.handler = MetricsCallbackHandler(self)
+        self._lock = threading.Lock()
+
+    def add(self, group: dict, key: str, seconds: float, **counts) -> None:
+        with self._lock:
+            entry = group.setdefault(key, {"calls": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            for name, value in counts.items():
+                entry[name] = entry.get(name, 0) + value
+
+    @contextmanager
+    def activate(self):
+        """이 턴 안에서 실행되는 record()가 이 객체에 기록되도록 합니다. 끝나면 전체 소요 시간을 기록합니다."""
+        token = _current_turn.set(self)
+        try:
+            yield self
+        finally:
+            try:
+                _current_turn.reset(token)
+            except ValueError:
+                # 스트리밍 응답이 다른 context에서 닫힌 경우 (async generator의 aclose)
+                pass
+            self.total = time.perf_counter() - self.started
+            TURN_SECONDS.observe(self.total)
+
+    def to_dict(self) -> dict:
+        def rounded(group):
+            return {key: {**entry, "seconds": round(entry["seconds"], 3)} for key, entry in group.items()}
+
+        return {
+            "total": round(self.total if self.total is not None else time.perf_counter() - self.started, 3),
+            "nodes": rounded(self.nodes),
+            "llm": rounded(self.llm),
+            "retriever": rounded(self.retriever),
+            "mongo": rounded(self.mongo),
+        }
+
+    def sampled(self) -> Optional[dict]:
+        """METRICS_SAMPLE_RATE 비율로만 단계별 기록을 반환합니다. (나머지는 None)"""
+        if random.random() < METRICS_SAMPLE_RATE:
+            return self.to_dict()
+        return None
+
+
+def current_turn() -> Optional[TurnMetrics]:
+    return _current_turn.get()
+
+
+def record(kind: str, op: str, seconds: float, collection: str = "") -> None:
+    """콜백으로 잡히지 않는 외부 호출(retriever, mongo)의 소요 시간을 기록합니다."""
+    turn = _current_turn.get()
+    if kind == "retriever":
+        RETRIEVER_SECONDS.labels(op=op).observe(seconds)
+        if turn:
+            turn.add(turn.retriever, op, seconds)
+    elif kind == "mongo":
+        MONGO_SECONDS.labels(command=op, collection=collection).observe(seconds)
+        if turn:
+            turn.add(turn.mongo, f"{collection}.{op}" if collection else op, seconds)
+    else:
+        raise ValueError(f"unknown metric kind: {kind}")
+
+
+@contextmanager
+def timed(kind: str, op: str):
+    """with timed("retriever", "embed"): ... 형태로 블록의 소요 시간을 기록합니다."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, op, time.perf_counter() - start)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """그래프 노드와 LLM 호출의 시작/종료 콜백으로 소요 시간과 token 수를 기록합니다."""
+
+    # 비동기 실행 중에도 executor로 넘기지 않고 바로 호출되도록 합니다. (기록만 하므로 빠릅니다.)
+    run_inline = True
+
+    def __init__(self, turn: TurnMetrics):
+        self.turn = turn
+        self._runs = {}
+
+    # 1. 그래프 노드
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # 노드 안에서 실행되는 chain도 같은 metadata를 가지므로, 이름이 노드 이름과 같은 run만 노드로 봅니다.
+        # (__start__ 같은 그래프 내부 노드는 제외합니다.)
+        if node and kwargs.get("name") == node and not node.startswith("__"):
+            self._runs[run_id] = ("node", node, None, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish_node(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish_node(run_id)
+
+    def _finish_node(self, run_id):
+        run = self._runs.pop(run_id, None)
+        if not run or run[0] != "node":
+            return
+        _, node, _, start = run
+        seconds = time.perf_counter() - start
+        NODE_SECONDS.labels(node=node).observe(seconds)
+        self.turn.add(self.turn.nodes, node, seconds)
+
+    # 2. LLM 호출
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        model = metadata.get("ls_model_name") or "unknown"
+        self._runs[run_id] = ("llm", model, metadata.get("langgraph_node", ""), time.perf_counter())
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self.on_chat_model_start(serialized, prompts, run_id=run_id, metadata=metadata, **kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if not run:
+            return
+        _, model, node, start = run
+        seconds = time.perf_counter() - start
+
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+
+        LLM_SECONDS.labels(model=model, node=node).observe(seconds)
+        LLM_TOKENS.labels(model=model, node=node, kind="prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(model=model, node=node, kind="completion").inc(completion_tokens)
+        self.turn.add(
+            self.turn.llm, f"{node}:{model}" if node else model, seconds,
+            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._runs.pop(run_id, None)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """pymongo의 모든 명령(find, aggregate 등)의 실행 시간을 기록합니다. (utils.get_db에서 등록)"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        record("mongo", event.command_name, event.duration_micros / 1e6, collection=collection)
@@ -0,0 +1,102 @@
+from datetime import datetime, timezone, timedelta
+
+import pymongo
+from pymongo import IndexModel
+
+from .utils import get_db, treatments_filter, ENTRY_PROJECTION, TREATMENT_PROJECTION, ENTRY_SORT, TREATMENT_SORT
+
+## Nightscout 조회용 색인 관리
+# * get_health_data()의 두 조회가 Nightscout DB에 우연히 있는 색인에 기대지 않도록, 필요한 색인을 직접 만들고 확인합니다.
+# * 작업순서:
+#   1. ensure_indexes(): INDEXES에 정의된 색인을 만듭니다.
+#      같은 필드(방향이 모두 같거나 모두 반대)의 색인이 이미 있으면 그대로 사용합니다. (Nightscout가 만든 색인 등)
+#   2. explain_queries(): get_health_data()와 같은 조건/projection/정렬로 explain을 실행하여 실행 계획의 stage 목록을 반환합니다.
+#   3. verify_indexes(): 실행 계획에 COLLSCAN이 있는 조회의 목록을 반환합니다. (비어 있으면 정상)
+#      관리 명령(python manage.py mongo_indexes --check)과 chat/tests.py에서 사용합니다.
+
+INDEXES = {
+    # 최근 혈당 1건: date 내림차순
+    "entries": [
+        IndexModel([("date", pymongo.DESCENDING)], name="simon_date_desc"),
+    ],
+    # 최근 주사/식사 기록: created_at 범위 + insulin/carbs 조건.
+    # insulin, carbs까지 색인에 넣어 TREATMENT_PROJECTION의 조회가 문서를 읽지 않게 하고(covered query),
+    # created_at이 있는 문서만 색인하여 (partial) created_at이 없는 기기 상태 기록 등은 색인에서 뺍니다.
+    "treatments": [
+        IndexModel(
+            [("created_at", pymongo.DESCENDING), ("insulin", pymongo.ASCENDING), ("carbs", pymongo.ASCENDING)],
+            name="simon_created_at_insulin_carbs",
+            partialFilterExpression={"created_at": {"$exists": True}},
+        ),
+    ],
+}
+
+
+def _equivalent(keys: list, existing: list) -> bool:
+    """두 색인의 필드가 같고, 방향이 모두 같거나 모두 반대이면 같은 조회에 쓸 수 있습니다."""
+    if [field for field, _ in keys] != [field for field, _ in existing]:
+        return False
+    directions = [(direction, other) for (_, direction), (_, other) in zip(keys, existing)]
+    if not all(isinstance(other, (int, float)) for _, other in directions):
+        return False  # text, hashed, 2dsphere 색인
+    return all(a == b for a, b in directions) or all(a == -b for a, b in directions)
+
+
+# 1. 색인 생성
+def ensure_indexes(db=None) -> dict:
+    """
+    필요한 색인을 만듭니다.
+    Returns:
+        {collection: [새로 만든 색인 이름, ...]}
+    """
+    db = get_db() if db is None else db
+    created = {}
+    for collection, models in INDEXES.items():
+        existing = db[collection].index_information()
+        missing = []
+        for model in models:
+            document = model.document
+            keys = list(document["key"].items())
+            if any(
+                _equivalent(keys, info["key"]) and info.get("partialFilterExpression") == document.get("partialFilterExpression")
+                for info in existing.values()
+            ):
+                continue
+            missing.append(model)
+        created[collection] = db[collection].create_indexes(missing) if missing else []
+    return created
+
+
+# 2. 실행 계획 확인
+def _stages(plan: dict) -> list:
+    """explain의 winningPlan을 따라가며 stage 이름을 모두 모읍니다. (SORT -> FETCH -> IXSCAN 등)"""
+    stages = [plan["stage"]] if "stage" in plan else []
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages.extend(_stages(plan[key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_stages(child))
+    return stages
+
+
+def explain_queries(db=None) -> dict:
+    """
+    get_health_data()의 조회마다 winning plan의 stage 목록을 반환합니다.
+    예) {"entries": ["LIMIT", "PROJECTION_SIMPLE", "FETCH", "IXSCAN"], "treatments": [...]}
+    """
+    db = get_db() if db is None else db
+    five_hours_ago = datetime.now(timezone.utc) - timedelta(hours=5)
+    cursors = {
+        "entries": db["entries"].find({}, ENTRY_PROJECTION).sort(ENTRY_SORT).limit(1),
+        "treatments": db["treatments"].find(treatments_filter(five_hours_ago), TREATMENT_PROJECTION).sort(TREATMENT_SORT),
+    }
+    return {
+        collection: _stages(cursor.explain()["queryPlanner"]["winningPlan"])
+        for collection, cursor in cursors.items()
+    }
+
+
+# 3. 검증
+def verify_indexes(db=None) -> list:
+    """실행 계획이 COLLSCAN으로 떨어지는 collection 목록을 반환합니다."""
+    return [collection for collection, stages in explain_queries(db).items() if "COLLSCAN" in stages]
@@ -0,0 +1,119 @@
+from dataclasses import dataclass, field
+from typing import Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+
+from ..settings import CONTEXT_KEEP_TURNS, SUMMARY_TRIGGER_TOKENS, TOOL_RESULT_CONDENSE_CHARS
+
+## 대화 컨텍스트 관리
+# * LLM에 보낼 메시지를 노드 별 token 예산 안으로 줄입니다.
+# * 작업순서:
+#   1. 아직 요약되지 않은 메시지를 턴(HumanMessage부터 다음 HumanMessage 전까지) 단위로 나눕니다.
+#   2. 마지막 턴을 제외한 턴의 ToolMessage(영양 성분 검색 결과 등)는 앞부분만 남깁니다.
+#   3. 최신 턴부터 예산이 허락하는 만큼 원문 그대로 남깁니다.
+#   4. 예산 밖으로 밀려났거나, 최근 N턴 밖에 쌓인 양이 충분하면 요약 대상으로 넘깁니다.
+#      요약은 state['summary']에 누적되어 다음 턴부터는 다시 계산하지 않습니다.
+
+# 메시지 하나에 붙는 역할/구분자 token 수 (근사값)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """tiktoken(cl100k_base)으로 token 수를 셉니다. Gemini tokenizer의 근사값입니다."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # 인코딩 파일을 받을 수 없는 환경에서는 글자 수 기반으로 추정합니다.
+            _encoding = False
+    if _encoding is False:
+        return len(text) // 2 + 1
+    return len(_encoding.encode(text))
+
+
+def count_message_tokens(messages: Sequence[BaseMessage]) -> int:
+    total = 0
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        total += count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            total += count_tokens(str(tool_call.get("args", "")))
+    return total
+
+
+def condense_tool_results(messages: Sequence[BaseMessage], max_chars: int = TOOL_RESULT_CONDENSE_CHARS) -> list:
+    """지난 턴의 긴 ToolMessage를 앞부분만 남긴 복사본으로 바꿉니다. (tool_call_id는 유지)"""
+    condensed = []
+    for message in messages:
+        if isinstance(message, ToolMessage) and len(message.content) > max_chars:
+            message = message.model_copy(update={"content": message.content[:max_chars].rstrip() + " …(생략)"})
+        condensed.append(message)
+    return condensed
+
+
+def split_turns(messages: Sequence[BaseMessage], start: int = 0) -> list:
+    """messages[start:]를 턴 단위로 나눕니다. 각 턴은 (시작 index, 메시지 목록)입니다."""
+    starts = [i for i in range(start, len(messages)) if isinstance(messages[i], HumanMessage)]
+    if not starts or starts[0] != start:
+        starts.insert(0, start)
+    ends = starts[1:] + [len(messages)]
+    return [(a, list(messages[a:b])) for a, b in zip(starts, ends) if a < b]
+
+
+@dataclass
+class ContextPlan:
+    # LLM에 원문으로 보낼 메시지
+    window: list
+    # 요약에 새로 접어 넣어야 할 메시지 (없으면 요약 호출 생략)
+    to_summarize: list = field(default_factory=list)
+    # 요약이 끝난 뒤의 state['summarized_until'] 값
+    summarized_until: int = 0
+
+
+def plan_context(
+    messages: Sequence[BaseMessage],
+    budget: int,
+    summary: str = "",
+    summarized_until: int = 0,
+    keep_turns: int = CONTEXT_KEEP_TURNS,
+) -> ContextPlan:
+    """노드 하나의 token 예산에 맞춰 보낼 메시지와 요약할 메시지를 결정합니다."""
+
+    turns = split_turns(messages, summarized_until)
+    if not turns:
+        return ContextPlan(window=[], summarized_until=summarized_until)
+
+    # 마지막 턴을 제외한 턴의 도구 결과는 줄여서 보냅니다.
+    turns = [(i, condense_tool_results(turn)) for i, turn in turns[:-1]] + [turns[-1]]
+
+    # 최신 턴부터 예산 안에서 선택합니다. 마지막 턴은 항상 포함합니다.
+    remaining = budget - (count_tokens(summary) if summary else 0)
+    first_kept = len(turns)
+    for k in range(len(turns) - 1, -1, -1):
+        cost = count_message_tokens(turns[k][1])
+        if k < len(turns) - 1 and cost > remaining:
+            break
+        remaining -= cost
+        first_kept = k
+
+    # 예산 밖으로 밀려난 턴은 반드시, 최근 N턴 밖의 턴은 충분히 쌓였을 때 요약합니다.
+    outside = max(len(turns) - keep_turns, 0)
+    fold = first_kept
+    if outside > first_kept:
+        outside_tokens = sum(count_message_tokens(turn) for _, turn in turns[first_kept:outside])
+        if outside_tokens >= SUMMARY_TRIGGER_TOKENS:
+            fold = outside
+
+    window = [message for _, turn in turns[fold:] for message in turn]
+    if fold == 0:
+        return ContextPlan(window=window, summarized_until=summarized_until)
+
+    return ContextPlan(
+        window=window,
+        to_summarize=[message for _, turn in turns[:fold] for message in turn],
+        summarized_until=turns[fold][0],
+    )
@@ -0,0 +1,335 @@
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Sequence
+
+import numpy as np
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from ..retrieval.lexical import compact, segments
+from ..retrieval.nutrition_table import get_nutrition_table
+from ..settings import MORNING_HOURS, MORNING_FACTOR, STRESS_FACTORS, TARGET
+
+## 보정 계수 계산 엔진(factor_node)
+# * LLM 없이 계산할 수 있는 계수는 모두 규칙으로 채웁니다.
+# * 작업순서:
+#   1. morning_factor: 현재 시각(한국 시간)이 아침 시간대인지로 결정합니다.
+#   2. blood_sugar, iob: prepare_context_data()의 값을 그대로 사용합니다.
+#   3. carbs: 이번 작업 사이클의 영양 성분 검색 결과(ToolMessage.artifact)의 음식마다, 사용자가 말한 양
+#      ("두 줄", "10피스", "200g")으로 탄수화물량을 계산합니다. (영양 성분 표의 배열 연산, retrieval/nutrition_table.py)
+#      규칙으로 양을 찾지 못한 음식은 추출 모델이 채우고, 그래도 모르면 1인분으로 가정하지 않고 사용자에게 묻습니다.
+#   4. exercise/stress/ill_factor: 대화(질문-답변 쌍)에서 명시적으로 답한 경우만 규칙으로 채웁니다.
+#      "운동은 안 했는데 감기 걸려서 아파요"처럼 여러 내용이 섞인 답변은 구절(는데/지만/어서)로 나누어 판단하고,
+#      부정은 짧고 직접적인 답변("아니요", "운동은 안 했어요")일 때만 1.0으로 확정합니다.
+#      남은 계수는 missing으로 반환하여, 노드에서 작은 추출 모델로 한 번만 채웁니다.
+
+KST = timezone(timedelta(hours=9))
+
+# LLM 추출이 필요할 수 있는 (대화 내용에 따라 달라지는) 계수
+FUZZY_FIELDS = ("exercise_factor", "stress_factor", "ill_factor")
+# 추출 모델이 범위를 벗어난 값을 주더라도 이 범위 안으로 잘라서 사용합니다.
+FACTOR_RANGES = {
+    "exercise_factor": (0.5, 1.0),
+    "stress_factor": (1.0, 1.3),
+    "ill_factor": (1.0, 1.3),
+}
+
+# 질문 또는 답변이 어떤 계수에 대한 것인지 판단하는 규칙
+TOPICS = {
+    "exercise_factor": re.compile(r"운동|산책|헬스|걷|달리|뛰|러닝|조깅|수영|자전거|등산"),
+    "stress_factor": re.compile(r"스트레스"),
+    "ill_factor": re.compile(r"질병|아프|아픈|아파|몸살|감기|열이|컨디션|병원|몸\s?상태"),
+}
+
+# 부정 답변 ("아니요", "안 했어요", "없어요" 등)
+NEGATIVE_ANSWER = re.compile(r"^\s*(아니|아뇨|아녀|없|안\s?했|안\s?해|안\s?함|전혀|딱히\s?없|no\b)", re.IGNORECASE)
+NEGATIVE_STATEMENT = re.compile(r"(안\s?했|안\s?해|안\s?함|안\s?할|없[어었습음고다]|없이|않[았아을고]|안\s?아프|안\s?아파)")
+# 부정 문장으로 확정할 수 있는 구절의 최대 길이(공백 제외). 긴 문장은 추출 모델에 맡깁니다.
+NEGATIVE_STATEMENT_LENGTH = 16
+# 답변을 구절로 나누는 표현 (문장 부호, 접속 표현, 연결 어미)
+CLAUSE_BREAK = re.compile(r"[.,!?\n]|그리고|하고\s|이고\s|고\s|[는은인근]데|지만|[어아해]서")
+
+# 먹는 양 ("두 줄", "10피스", "200g", "반 공기", "한 공기 반")
+KOREAN_NUMBERS = {
+    "반": 0.5, "한": 1, "하나": 1, "두": 2, "둘": 2, "세": 3, "셋": 3, "석": 3, "네": 4, "넷": 4,
+    "다섯": 5, "여섯": 6, "일곱": 7, "여덟": 8, "아홉": 9, "열": 10,
+}
+# 양의 종류 -> 단위 (NutritionTable.carbs의 인자 이름)
+AMOUNT_UNITS = {
+    "grams": r"g|그램|ml|mL|밀리",
+    "pieces": r"개|피스|조각|알|쪽|송이|장",
+    "servings": r"인분|그릇|공기|접시|줄|잔|컵|봉지|팩|캔|병",
+}
+AMOUNT = re.compile(
+    r"(?<![가-힣\d.])(\d+(?:\.\d+)?|" + "|".join(sorted(KOREAN_NUMBERS, key=len, reverse=True)) + r")\s*("
+    + "|".join(AMOUNT_UNITS.values()) + r")(\s*반)?"
+)
+# 여러 음식을 나열한 문장을 음식 별 구절로 나누는 표현
+FOOD_BREAK = re.compile(r"[,.!?\n]|그리고|이랑\s?|랑\s|하고\s|와\s|과\s")
+
+# 스트레스 강도 (상/중/하 또는 이를 풀어 쓴 표현)
+STRESS_LEVELS = [
+    ("상", re.compile(r"(?:^|[^가-힣])상(?:$|[^가-힣]|이에요|이요|입니다)|높|심하|심해|심한|많이\s?받")),
+    ("중", re.compile(r"(?:^|[^가-힣])중(?:$|[^가-힣]|이에요|이요|입니다)|보통|중간|약간|조금")),
+    ("하", re.compile(r"(?:^|[^가-힣])하(?:$|[^가-힣]|예요|요|입니다)|낮|적[어은게]|없|안\s?받")),
+]
+
+
+def morning_factor(time: Optional[str] = None) -> float:
+    """
+    아침 시간대면 MORNING_FACTOR, 아니면 1.0을 반환합니다.
+    time은 prepare_context_data()의 "HH시 MM분" 형식이며, 없으면 현재 시각을 사용합니다.
+    """
+    match = re.match(r"\s*(\d{1,2})\s*시", time or "")
+    hour = int(match.group(1)) if match else datetime.now(KST).hour
+    start, end = MORNING_HOURS
+    return MORNING_FACTOR if start <= hour < end else 1.0
+
+
+def parse_amount(text: str) -> Optional[dict]:
+    """'두 줄', '10피스', '200g', '반 공기' 같은 표현을 {"servings"|"grams"|"pieces": 값}으로 바꿉니다."""
+    match = AMOUNT.search(text)
+    if not match:
+        return None
+    number, unit, half = match.groups()
+    value = float(number) if number[0].isdigit() else float(KOREAN_NUMBERS[number])
+    if half:
+        value += 0.5
+    kind = next(kind for kind, units in AMOUNT_UNITS.items() if re.fullmatch(units, unit))
+    return {kind: value}
+
+
+def meal_foods(messages: Sequence[BaseMessage]) -> list:
+    """
+    영양 성분 검색 결과(ToolMessage.artifact)의 첫 번째(가장 유사한) 음식 목록을 반환합니다.
+    [{"query": 검색어, "metadata": 음식의 메타데이터}] 같은 음식이 여러 번 검색된 경우 한 번만 넣습니다.
+    """
+    queries, foods = {}, {}
+    for message in messages:
+        if isinstance(message, AIMessage):
+            for tool_call in message.tool_calls or []:
+                args = tool_call.get('args') or {}
+                queries[tool_call.get('id')] = list(args.get('queries') or [args.get('query', '')])
+            continue
+        if not isinstance(message, ToolMessage) or not message.artifact:
+            continue
+        # batch 도구의 artifact는 음식 별 후보 목록의 목록입니다.
+        candidates_list = message.artifact if isinstance(message.artifact[0], list) else [message.artifact]
+        names = queries.get(message.tool_call_id) or []
+        for i, candidates in enumerate(candidates_list):
+            if candidates:
+                name = candidates[0].get('식품명')
+                foods.setdefault(name, {"query": names[i] if i < len(names) and names[i] else name, "metadata": candidates[0]})
+    return list(foods.values())
+
+
+def _food_keys(food: dict) -> set:
+    """대화에서 음식을 가리키는 표현 (검색어, 식품명의 첫 segment)"""
+    keys = {compact(food["query"])}
+    name = segments(food["metadata"].get('식품명', ''))
+    if name and len(name[0]) >= 2:
+        keys.add(name[0])
+    return {key for key in keys if key}
+
+
+def _mentions(text: str, keys: set) -> bool:
+    text = re.sub(r"\s+", "", text.lower())
+    return any(key in text for key in keys)
+
+
+def stated_amounts(messages: Sequence[BaseMessage], foods: Sequence[dict]) -> list:
+    """
+    음식마다 사용자가 말한 양({"servings"|"grams"|"pieces": 값})을 찾습니다. 찾지 못하면 None입니다.
+    - 한 구절에 음식 하나와 양이 함께 있는 경우 ("김밥 두 줄이랑 라면 하나")
+    - 바로 앞의 질문이 음식 하나의 양을 물었을 때의 답변 ("김밥은 몇 줄 드시나요?" - "두 줄이요")
+    나중에 말한 양이 앞에서 말한 양을 대신합니다.
+    """
+    keys = [_food_keys(food) for food in foods]
+    amounts = [None] * len(foods)
+    question = ""
+    for message in messages:
+        if isinstance(message, AIMessage):
+            question = message.content if isinstance(message.content, str) else ""
+            continue
+        if not isinstance(message, HumanMessage) or not isinstance(message.content, str):
+            continue
+
+        answer = message.content
+        named = [i for i, food_keys in enumerate(keys) if _mentions(answer, food_keys)]
+        for part in FOOD_BREAK.split(answer):
+            amount = parse_amount(part)
+            mentioned = [i for i, food_keys in enumerate(keys) if _mentions(part, food_keys)]
+            if amount and len(mentioned) == 1:
+                amounts[mentioned[0]] = amount
+
+        asked = [i for i, food_keys in enumerate(keys) if _mentions(question, food_keys)]
+        amount = parse_amount(answer)
+        if amount and not named and len(asked) == 1:
+            amounts[asked[0]] = amount
+        question = ""
+    return amounts
+
+
+@dataclass
+class Meal:
+    """이번 작업 사이클의 음식과 먹는 양. carbs는 양을 아는 음식만 더한 값입니다."""
+    foods: list                                    # meal_foods()
+    amounts: list                                  # 음식마다 {"servings"|"grams"|"pieces": 값} 또는 None
+    carbs: float = 0.0
+    unknown: list = field(default_factory=list)    # 양을 알 수 없는 음식의 index
+
+    @classmethod
+    def from_messages(cls, messages: Sequence[BaseMessage]) -> "Meal":
+        foods = meal_foods(messages)
+        meal = cls(foods, stated_amounts(messages, foods))
+        meal.calculate()
+        return meal
+
+    def calculate(self) -> None:
+        """양의 종류(g/인분/개)마다 한 번의 배열 연산으로 탄수화물량을 계산합니다."""
+        self.carbs, self.unknown = 0.0, []
+        if not self.foods:
+            return
+        # 표에 없는 음식(원본과 다른 벡터DB 등)이 있으면 메타데이터에서 계산합니다.
+        table, food_ids = get_nutrition_table().lookup([food["metadata"] for food in self.foods])
+        for i, amount in enumerate(self.amounts):
+            # 개수로 말했지만 개당 무게를 모르는 음식도 다시 묻습니다. (1개를 1인분으로 계산하지 않도록)
+            if not amount or ("pieces" in amount and np.isnan(table.table[food_ids[i]]["piece_g"])):
+                self.unknown.append(i)
+
+        total = 0.0
+        for kind in AMOUNT_UNITS:
+            index = [i for i, amount in enumerate(self.amounts) if i not in self.unknown and kind in amount]
+            if index:
+                total += float(np.nansum(table.carbs(food_ids[index], **{kind: [self.amounts[i][kind] for i in index]})))
+        self.carbs = round(total, 1)
+
+    def apply(self, extracted: Sequence[dict]) -> None:
+        """추출 모델이 찾은 양([{"food", "servings", "grams", "pieces"}])을 양을 모르는 음식에 채웁니다."""
+        for item in extracted:
+            kind = next((kind for kind in AMOUNT_UNITS if item.get(kind)), None)
+            if kind is None or not item.get("food"):
+                continue
+            for i in self.unknown:
+                food = self.foods[i]
+                if item["food"] in (food["query"], food["metadata"].get('식품명')) or _mentions(item["food"], _food_keys(food)):
+                    self.amounts[i] = {kind: float(item[kind])}
+        self.calculate()
+
+    def _line(self, i: int) -> str:
+        food = self.foods[i]
+        metadata = food["metadata"]
+        return f"- {food['query']} ({metadata.get('식품명')}, 1인분 {metadata.get('1인분용량') or metadata.get('기준량')})"
+
+    def describe_unknown(self) -> str:
+        """추출 모델에게 전달할, 양을 찾아야 하는 음식 목록"""
+        return "\n".join(self._line(i) for i in self.unknown) or "없음"
+
+    def question(self) -> str:
+        """양을 알 수 없는 음식의 양을 묻는 메시지"""
+        lines = []
+        for i in self.unknown:
+            pieces = self.amounts[i] and "pieces" in self.amounts[i]
+            hint = "개당 무게 정보가 없어요. 몇 인분 또는 몇 g인지" if pieces else "몇 인분, 몇 g, 또는 몇 개인지"
+            lines.append(f"{self._line(i)}: {hint}")
+        return "정확한 탄수화물 계산을 위해 드실 양을 알려 주세요.\n" + "\n".join(lines)
+
+
+def _stress_level(text: str) -> Optional[str]:
+    for level, pattern in STRESS_LEVELS:
+        if pattern.search(text):
+            return level
+    return None
+
+
+def _clauses(text: str, topic: re.Pattern) -> list:
+    """문장 부호/접속 표현/연결 어미로 나눈 뒤 topic 키워드가 들어 있는 부분만 반환합니다."""
+    return [part for part in CLAUSE_BREAK.split(text) if topic.search(part)]
+
+
+def _negative(clause: str) -> bool:
+    """짧고 직접적인 부정 답변이면 True ("아니요", "운동은 안 했어요")"""
+    if NEGATIVE_ANSWER.search(clause):
+        return True
+    return len(re.sub(r"\s+", "", clause)) <= NEGATIVE_STATEMENT_LENGTH and bool(NEGATIVE_STATEMENT.search(clause))
+
+
+def rule_factors(messages: Sequence[BaseMessage]) -> dict:
+    """
+    대화에서 명시적으로 답한 운동/스트레스/질병 계수를 찾습니다. 찾은 계수만 반환합니다.
+    - 운동, 질병: 하지 않았다/없다고 답한 경우만 1.0으로 확정합니다. (했다면 강도에 따라 달라지므로 추출 모델에 맡깁니다.)
+      한 답변에서 그 계수에 대한 구절이 모두 부정일 때만 확정합니다.
+    - 스트레스: 상/중/하로 답한 경우 STRESS_FACTORS 값을 사용합니다.
+    """
+    found = {}
+    question = ""
+    for message in messages:
+        if isinstance(message, AIMessage):
+            question = message.content if isinstance(message.content, str) else ""
+            continue
+        if not isinstance(message, HumanMessage) or not isinstance(message.content, str):
+            continue
+
+        answer = message.content
+        for field, topic in TOPICS.items():
+            # 1. 사용자가 직접 언급한 경우 ("운동은 안 했어요", "스트레스는 중간 정도예요")
+            clauses = _clauses(answer, topic)
+            # 2. 바로 앞의 질문에 대한 짧은 답변인 경우 ("운동하셨나요?" - "아니요")
+            if not clauses and topic.search(question) and not any(
+                other.search(answer) for name, other in TOPICS.items() if name != field
+            ):
+                clauses = [answer]
+
+            if field == "stress_factor":
+                for clause in clauses:
+                    level = _stress_level(clause.replace("스트레스", ""))
+                    if level:
+                        found[field] = STRESS_FACTORS[level]
+            elif clauses and all(_negative(clause) for clause in clauses):
+                found[field] = 1.0
+            elif clauses:
+                # 했다/아프다고 했거나 확실하지 않은 경우 추출 대상으로 돌립니다.
+                found.pop(field, None)
+
+        question = ""
+    return found
+
+
+def deterministic_factors(messages: Sequence[BaseMessage], context_data: dict) -> tuple:
+    """
+    이번 작업 사이클의 메시지와 혈당 데이터로 계산할 수 있는 계수를 모두 채웁니다.
+
+    Returns:
+        (factors, missing, meal): factors는 Factor_schema 형식의 dict, missing은 추출 모델로 채워야 할 계수 이름 목록,
+        meal은 음식과 먹는 양입니다. (meal.unknown이 있으면 추출 모델로 양을 찾아야 합니다.)
+    """
+    meal = Meal.from_messages(messages)
+    blood_sugar = context_data.get('blood_sugar')
+    factors = {
+        "carbs": meal.carbs,
+        "blood_sugar": float(blood_sugar) if blood_sugar is not None else float(TARGET),
+        "iob": float(context_data.get('iob') or 0.0),
+        "morning_factor": morning_factor(context_data.get('time')),
+    }
+
+    stated = rule_factors(messages)
+    factors.update(stated)
+
+    missing = [field for field in FUZZY_FIELDS if field not in stated]
+    return factors, missing, meal
+
+
+def merge_extracted(factors: dict, missing: Sequence[str], extracted: dict, meal: Optional[Meal] = None) -> dict:
+    """
+    추출 모델의 결과 중 missing에 해당하는 계수만 범위 안으로 잘라서 factors에 합칩니다.
+    meal이 있으면 추출한 먹는 양을 채워 carbs를 다시 계산합니다.
+    """
+    merged = dict(factors)
+    if meal is not None and meal.unknown:
+        meal.apply(extracted.get("amounts") or [])
+        merged["carbs"] = meal.carbs
+    for field in missing:
+        low, high = FACTOR_RANGES[field]
+        value = extracted.get(field)
+        merged[field] = min(max(float(value), low), high) if value is not None else 1.0
+    return merged
@@ -1,6 +1,5 @@
 from typing import TypedDict, Sequence, Annotated, Optional, Literal
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage, SystemMessage
 from langchain_core.output_parsers import StrOutputParser
 from langgraph.graph.message import add_messages
 
@@ -11,13 +10,20 @@ from langgraph.graph.message import add_messages
 #  2. 모델 생성(필요시 bind_tools까지)
 #  3. (필요시) PydanticOutputParser 구성
 #  4. (1), (2), (3)을 묶는 chain 생성
-#  5. chain을 실행하는 함수 생성
-
-from .prompts import triage_prompt, information_prompt, factor_prompt, answering_prompt
-from .prompts import factor_parser
-from ..utils import prepare_context_data
-from ..tools import nutrition_retriever_tool, insulin_calculation
-from ..settings import LLM_MODEL_NAME, THINKING_MODEL_NAME, TEMPERATURE
+#  5. chain을 실행하는 함수 생성(동기 버전과 a로 시작하는 비동기 버전)
+
+from .prompts import triage_prompt, information_prompt, factor_prompt, answering_prompt, summary_prompt
+from .prompts import factor_parser, Factor_schema
+from .triage import classify
+from .context import plan_context
+from .factors import deterministic_factors, merge_extracted
+from ..health import current_context_data, acurrent_context_data
+from ..forecast import current_forecast, acurrent_forecast
+from ..tools import nutrition_retriever_tool, nutrition_batch_retriever_tool, insulin_calculation
+from ..tools import search_nutrition, asearch_nutrition, nutrition_facts, compact_nutrition, format_nutrition, format_nutrition_batch, format_fact
+from ..settings import LLM_MODEL_NAME, THINKING_MODEL_NAME, EXTRACTION_MODEL_NAME, TEMPERATURE, TRIAGE_CONFIDENCE_THRESHOLD
+from ..settings import CONTEXT_TOKEN_BUDGETS, NUTRITION_FACTS_CONTEXT_LIMIT
+from ..lazy import lazy
 
 
 # 노드 전체가 공유할 데이터의 스키마인 state 설정
@@ -28,6 +34,9 @@ class AgentState(TypedDict):
     # 대화 모드
     dialogue_mode: Optional[str]
 
+    # 현재 작업 사이클(triage부터 cleanup까지)이 시작된 메시지의 index
+    cycle_start: Optional[int]
+
     # 각종 보정 계수들
     factors: Optional[dict]
 
@@ -40,16 +49,66 @@ class AgentState(TypedDict):
     # 음식 영양 성분
     nutrition_facts: Optional[dict]
 
+    # 오래된 대화의 누적 요약과, 요약에 반영된 메시지 수(messages[:summarized_until])
+    summary: Optional[str]
+    summarized_until: Optional[int]
+
 
 # 모델 생성
-llm = ChatGoogleGenerativeAI(
-    model=LLM_MODEL_NAME,
-    temperature=TEMPERATURE
-)
+# 모델과 chain은 처음 사용할 때 프로세스마다 한 번 생성합니다. (gRPC client는 fork 이후 재사용할 수 없습니다.)
+@lazy
+def get_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model=LLM_MODEL_NAME,
+        temperature=TEMPERATURE
+    )
+
+# 0. 대화 컨텍스트 관리를 위한 파츠
+# 오래된 대화를 기존 요약에 합치는 에이전트
+get_summary_agent = lazy(lambda: summary_prompt | get_llm() | StrOutputParser())
+
+# 노드의 token 예산에 맞는 메시지 목록과, 요약이 갱신되었다면 그 state 업데이트를 반환합니다.
+def prepare_context(state: AgentState, node: str) -> tuple:
+    summary = state.get('summary') or ""
+    plan = plan_context(state['messages'], CONTEXT_TOKEN_BUDGETS[node], summary, state.get('summarized_until') or 0)
+
+    update = {}
+    if plan.to_summarize:
+        summary = get_summary_agent().invoke({"summary": summary or "없음", "messages": plan.to_summarize})
+        update = {"summary": summary, "summarized_until": plan.summarized_until}
+
+    return _with_context(plan.window, summary, state.get('nutrition_facts')), update
+
+async def aprepare_context(state: AgentState, node: str) -> tuple:
+    summary = state.get('summary') or ""
+    plan = plan_context(state['messages'], CONTEXT_TOKEN_BUDGETS[node], summary, state.get('summarized_until') or 0)
+
+    update = {}
+    if plan.to_summarize:
+        summary = await get_summary_agent().ainvoke({"summary": summary or "없음", "messages": plan.to_summarize})
+        update = {"summary": summary, "summarized_until": plan.summarized_until}
+
+    return _with_context(plan.window, summary, state.get('nutrition_facts')), update
+
+def _with_context(messages: list, summary: str, facts: Optional[dict] = None) -> list:
+    context = []
+    if summary:
+        context.append(SystemMessage(content=f"이전 대화 요약:\n{summary}"))
+
+    # 도구 결과가 대화 창 밖으로 밀려난 음식은 한 줄씩 다시 알려 줍니다. (최근 검색한 음식부터)
+    shown = "\n".join(message.content for message in messages if isinstance(message, ToolMessage))
+    missing = [fact for food, fact in (facts or {}).items() if food not in shown][-NUTRITION_FACTS_CONTEXT_LIMIT:]
+    if missing:
+        lines = "\n".join(f"- {format_fact(fact)}" for fact in missing)
+        context.append(SystemMessage(content=f"앞에서 확인한 음식 영양 정보:\n{lines}"))
+
+    return context + messages
+
 
 # 1. 분류 노드 생성을 위한 파츠(triage_node)
 # triage 에이전트 생성
-triage_agent = triage_prompt | llm
+get_triage_agent = lazy(lambda: triage_prompt | get_llm())
 
 # triage 에이전트 생성 함수 생성(=노드)
 def call_triage_agent(state: AgentState):
@@ -57,11 +116,35 @@ def call_triage_agent(state: AgentState):
     
     last_message = state['messages'][-1]
 
-    output = triage_agent.invoke(
+    cycle_start = len(state['messages']) - 1
+
+    # 로컬 분류기의 확신이 높으면 LLM을 호출하지 않습니다.
+    label, confidence = classify(last_message.content)
+    if confidence >= TRIAGE_CONFIDENCE_THRESHOLD:
+        return {"dialogue_mode": label, "cycle_start": cycle_start}
+
+    output = get_triage_agent().invoke(
+        {"messages": [last_message]}
+        )
+
+    return {"dialogue_mode": output.content, "cycle_start": cycle_start}
+
+async def acall_triage_agent(state: AgentState):
+    """call_triage_agent의 비동기 버전입니다."""
+
+    last_message = state['messages'][-1]
+
+    cycle_start = len(state['messages']) - 1
+
+    label, confidence = classify(last_message.content)
+    if confidence >= TRIAGE_CONFIDENCE_THRESHOLD:
+        return {"dialogue_mode": label, "cycle_start": cycle_start}
+
+    output = await get_triage_agent().ainvoke(
         {"messages": [last_message]}
         )
 
-    return {"dialogue_mode": output.content}
+    return {"dialogue_mode": output.content, "cycle_start": cycle_start}
 
 # 대화 mode에 따라 분기를 설정하는 함수
 # workflow.py에서 conditional_edge에 사용됩니다.
@@ -87,15 +170,32 @@ def entry_point_routing(state:AgentState) -> str:
     
 
 # 2. 정보 수집 노드를 위한 파츠(information_node)
-information_agent = information_prompt | llm.bind_tools([nutrition_retriever_tool])
+get_information_agent = lazy(lambda: information_prompt | get_llm().bind_tools([nutrition_retriever_tool, nutrition_batch_retriever_tool]))
 
 # call_information_agent 함수 생성
 def call_information_agent(state:AgentState):
 
-    output = information_agent.invoke({
-        "messages": state['messages']
+    messages, context_update = prepare_context(state, "information_node")
+
+    output = get_information_agent().invoke({
+        "messages": messages
+    })
+
+    return {**_information_update(output), **context_update}
+
+async def acall_information_agent(state:AgentState):
+
+    messages, context_update = await aprepare_context(state, "information_node")
+
+    output = await get_information_agent().ainvoke({
+        "messages": messages
     })
 
+    return {**_information_update(output), **context_update}
+
+# information_agent의 출력을 state 업데이트로 변환하는 함수
+def _information_update(output: AIMessage) -> dict:
+
     if "완료" in output.content:
         return {"information_state": "complete", "messages": [output]}
     
@@ -120,53 +220,88 @@ def continue_information_gathering(state:AgentState) -> str:
         
     
 # 3. 계수 설정 노드를 위한 파츠(factor_node)
+# 탄수화물량, 혈당, IOB, 아침 계수는 factors.py의 규칙으로 계산하고,
+# 대화에서 찾지 못한 운동/스트레스/질병 계수만 작은 추출 모델로 채웁니다.
+@lazy
+def get_extraction_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model=EXTRACTION_MODEL_NAME,
+        temperature=0
+    )
+
 # factor_agent 객체를 생성합니다.
-factor_agent = (
+get_factor_agent = lazy(lambda: (
     factor_prompt 
-    | llm
+    | get_extraction_llm()
     | factor_parser
-)
+))
 
 # factor_agent 호출 함수를 생성합니다.
 def call_factor_agent(state:AgentState):
-    """state의 모든 대화 기록을 제공하여 필요한 보정 계수들을 생성하는 함수입니다."""
+    """이번 작업 사이클의 대화와 혈당 데이터로 필요한 보정 계수들을 생성하는 함수입니다."""
 
-    # 1. 컨텍스트 데이터 준비
-    context_data = prepare_context_data()
+    # 1. 컨텍스트 데이터 준비 (백그라운드에서 갱신되는 snapshot을 사용하고, 오래되었을 때만 DB를 조회합니다.)
+    context_data = current_context_data()
 
-    # 2. 메시지 필터링
-    all_messages = state.get('messages') # .get()을 사용해 더 안전하게 접근
+    # 2. 규칙으로 계산할 수 있는 계수와 먹는 양 채우기
+    messages = _cycle_messages(state)
+    factors, missing, meal = deterministic_factors(messages, context_data)
 
-    # all_messages가 None인지 확인
-    if all_messages is None:
-        # 임시로 빈 리스트를 할당하여 오류를 피하게 할 수 있습니다.
-        all_messages = [] 
+    # 3. 대화에서 찾지 못한 계수나 먹는 양이 있을 때만 추출 모델 호출
+    if missing or meal.unknown:
+        output = get_factor_agent().invoke({
+            "messages": _factor_dialogue(messages), "forecast": current_forecast().summary(), "foods": meal.describe_unknown(),
+        })
+        factors = merge_extracted(factors, missing, output.dict(), meal)
 
-    messages_for_llm = [
-        msg for msg in all_messages
-        if not (isinstance(msg, AIMessage) and msg.content.strip().lower() == "complete")
-    ]
+    # 4. 최종 반환값 확인
+    return _factor_update(factors, meal)
 
-    # 3. LLM 입력 데이터 구성
-    input_data = {
-        "messages": messages_for_llm,
-        "time": context_data.get('time'),
-        "blood_sugar": context_data.get('blood_sugar'),
-        "iob": context_data.get('iob')
-    }
+async def acall_factor_agent(state:AgentState):
+    """call_factor_agent의 비동기 버전입니다. snapshot이 오래되어 MongoDB를 조회할 때는 thread pool에서 실행합니다."""
 
-    # 4. LLM 호출 및 결과 확인
-    try:
-        output = factor_agent.invoke(input_data)
-    except Exception as e:
-        raise e # 오류를 다시 발생시켜서 실행을 중단합니다.
+    context_data = await acurrent_context_data()
 
-    # 5. 최종 반환값 확인
-    result = {"factors": output.dict()}
-    return result
+    messages = _cycle_messages(state)
+    factors, missing, meal = deterministic_factors(messages, context_data)
+
+    if missing or meal.unknown:
+        forecast = await acurrent_forecast()
+        output = await get_factor_agent().ainvoke({
+            "messages": _factor_dialogue(messages), "forecast": forecast.summary(), "foods": meal.describe_unknown(),
+        })
+        factors = merge_extracted(factors, missing, output.dict(), meal)
+
+    return _factor_update(factors, meal)
+
+# 먹는 양을 알 수 없는 음식이 있으면 1인분으로 가정하지 않고 사용자에게 묻습니다.
+# 답변은 다음 턴에 information_node를 거쳐 다시 factor_node에서 읽습니다.
+def _factor_update(factors:dict, meal) -> dict:
+    if meal.unknown:
+        return {"messages": [AIMessage(content=meal.question())], "factors": None, "information_state": "ongoing"}
+    return {"factors": Factor_schema(**factors).dict()}
+
+# 계수가 준비되었으면 인슐린 계산으로, 먹는 양을 물었으면 사용자의 답변을 기다립니다.
+# workflow.py에서 conditional_edge에 사용됩니다.
+def factors_ready(state:AgentState) -> str:
+    return "complete" if state.get('factors') else "ask"
+
+# 이번 작업 사이클(triage_node 이후)의 메시지를 반환하는 함수
+def _cycle_messages(state:AgentState) -> list:
+    all_messages = state.get('messages') or []
+    return list(all_messages[state.get('cycle_start') or 0:])
+
+# 추출 모델에는 도구 호출 과정을 뺀 사용자/AI 대화만 전달합니다.
+def _factor_dialogue(messages:list) -> list:
+    return [
+        msg for msg in messages
+        if isinstance(msg, HumanMessage)
+        or (isinstance(msg, AIMessage) and not msg.tool_calls and msg.content and msg.content.strip().lower() != "complete")
+    ]
 
 # 4. 최종 답변 생성 노드를 위한 파츠(answer_node)
-answering_agent = answering_prompt | llm
+get_answering_agent = lazy(lambda: answering_prompt | get_llm())
 
 # 에이전트 호출 함수
 def call_answering_agent(state:AgentState) -> dict:
@@ -175,45 +310,109 @@ def call_answering_agent(state:AgentState) -> dict:
     사용자에게 보여줄 최종 답변을 생성합니다.
     """
     print("--- 최종 답변 생성 중 ---")
-    
+
+    # token 예산에 맞춰 대화 기록을 줄입니다.
+    messages, context_update = prepare_context(state, "answer_node")
+
+    # Answering Agent를 호출하여 최종 답변을 생성합니다.
+    final_answer = get_answering_agent().invoke(_answering_input(state, messages))
+
+    # 생성된 답변을 대화 기록에 추가합니다.
+    return {"messages": [final_answer], **context_update}
+
+async def acall_answering_agent(state:AgentState) -> dict:
+    """call_answering_agent의 비동기 버전입니다."""
+    messages, context_update = await aprepare_context(state, "answer_node")
+
+    final_answer = await get_answering_agent().ainvoke(_answering_input(state, messages))
+
+    return {"messages": [final_answer], **context_update}
+
+# answering_agent에 전달할 입력 데이터를 구성하는 함수
+def _answering_input(state:AgentState, messages:list) -> dict:
+
     # 상태에서 필요한 모든 정보를 추출합니다.
     factors = state.get('factors', {})
     calculation_result = state.get('calculation_result', "계산 결과를 찾을 수 없습니다.")
     
     # LLM에게 전달할 입력 데이터를 구성합니다.
     # 딕셔너리인 factors를 문자열로 변환하여 LLM이 쉽게 읽도록 합니다.
-    input_data = {
-        "messages": state['messages'],
+    return {
+        "messages": messages,
         "factors": str(factors),
         "calculation_result": calculation_result
     }
 
-    # Answering Agent를 호출하여 최종 답변을 생성합니다.
-    final_answer = answering_agent.invoke(input_data)
-
-    # 생성된 답변을 대화 기록에 추가합니다.
-    return {"messages": [final_answer]}
-
 
 # 5. 영양 성분 검색 노드를 위한 파츠
+# 한 메시지의 모든 tool_call(단일/batch 도구)의 검색어를 모아 한 번에 검색하고, tool_call 마다 ToolMessage를 하나씩 반환합니다.
 def call_nutirion_agent(state:AgentState):
 
+    tool_calls = _nutrition_tool_calls(state)
+
+    results = search_nutrition(_nutrition_queries(tool_calls))
+
+    return _nutrition_update(state, tool_calls, results)
+
+async def acall_nutirion_agent(state:AgentState):
+
+    tool_calls = _nutrition_tool_calls(state)
+
+    results = await asearch_nutrition(_nutrition_queries(tool_calls))
+
+    return _nutrition_update(state, tool_calls, results)
+
+def _nutrition_tool_calls(state:AgentState) -> list:
+
     last_message = state['messages'][-1]
 
     # AIMessage이고 tool_calls가 있는지 확인
     if not isinstance(last_message, AIMessage) or not hasattr(last_message, 'tool_calls') or not last_message.tool_calls:
         raise ValueError("Expected AIMessage with tool_calls")
 
-    tool_args = last_message.tool_calls[0]['args']
-
-    result = nutrition_retriever_tool.invoke(tool_args)
-
-    return {
-        "messages": 
-        [ToolMessage(
-            content=str(result), 
-            tool_call_id=last_message.tool_calls[0]['id'])
-        ]}
+    return last_message.tool_calls
+
+def _tool_call_queries(tool_call:dict) -> list:
+    if tool_call['name'] == nutrition_batch_retriever_tool.name:
+        return list(tool_call['args'].get('queries') or [])
+    return [tool_call['args'].get('query', '')]
+
+def _nutrition_queries(tool_calls:list) -> list:
+    return [query for tool_call in tool_calls for query in _tool_call_queries(tool_call)]
+
+def _nutrition_update(state:AgentState, tool_calls:list, results:list) -> dict:
+    # state['nutrition_facts']: 이 대화에서 검색된 음식 이름 -> 1인분 영양 정보 (tools.nutrition_facts)
+    # 이미 보낸 음식은 도구 결과에서 한 줄로 줄이고, 이후 노드는 대화 기록 대신 이 값을 읽을 수 있습니다.
+    known = dict(state.get('nutrition_facts') or {})
+    messages = _nutrition_tool_messages(tool_calls, results, known)
+    return {"messages": messages, "nutrition_facts": known}
+
+def _nutrition_tool_messages(tool_calls:list, results:list, known:dict) -> list:
+    # artifact에는 검색된 문서의 메타데이터를 그대로 담아, 이후 노드가 구조화된 값으로 사용할 수 있게 합니다.
+    # (artifact는 LLM에게 전달되지 않습니다.)
+    # - 단일 도구: [후보 메타데이터, ...]
+    # - batch 도구: [[음식 1의 후보 메타데이터, ...], [음식 2의 ...], ...]
+    # 새로 검색된 음식의 영양 정보는 known에 추가됩니다.
+    messages, start = [], 0
+    for tool_call in tool_calls:
+        queries = _tool_call_queries(tool_call)
+        datas_list = results[start:start + len(queries)]
+        start += len(queries)
+
+        if tool_call['name'] == nutrition_batch_retriever_tool.name:
+            items = compact_nutrition(queries, datas_list)
+            content = format_nutrition_batch(items, known)
+            facts = [item for item in items if item["food"]]
+            artifact = [[data.metadata for data in datas] for datas in datas_list]
+        else:
+            content = format_nutrition(datas_list[0], known)
+            facts = nutrition_facts([data.metadata for data in datas_list[0]])
+            artifact = [data.metadata for data in datas_list[0]]
+
+        for fact in facts:
+            known.setdefault(fact["food"], {key: value for key, value in fact.items() if key not in ("query", "alternatives")})
+        messages.append(ToolMessage(content=content, tool_call_id=tool_call['id'], name=tool_call['name'], artifact=artifact))
+    return messages
 
 
 # 6. 최종 인슐린 용량 계산을 위한 노드의 파츠
@@ -237,6 +436,10 @@ def call_insulin_agent(state: AgentState) -> dict:
     # 3. 결과를 상태에 저장합니다.
     return {"calculation_result": result_string}
 
+async def acall_insulin_agent(state: AgentState) -> dict:
+    """call_insulin_agent의 비동기 버전입니다. 계산만 하므로 thread pool을 거치지 않고 바로 실행합니다."""
+    return call_insulin_agent(state)
+
 
 # 7. 모든 해결 과정을 종결하는 초기화 노드의 파츠
 # 문제가 해결되면 dialogue_mode를 None으로 초기화합니다.
@@ -246,4 +449,8 @@ def call_cleanup_node(state: AgentState) -> dict:
     구체적으로 dialogue_mode를 None으로 설정합니다.
     """
     print("--- A task cycle is complete. Cleaning up state. ---")
+    return {"dialogue_mode": None}
+
+async def acall_cleanup_node(state: AgentState) -> dict:
+    """call_cleanup_node의 비동기 버전입니다."""
     return {"dialogue_mode": None}
\ No newline at end of file
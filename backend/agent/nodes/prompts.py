@@ -1,3 +1,5 @@
+from typing import List, Optional
+
 from pydantic import BaseModel, Field
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import PydanticOutputParser
@@ -24,7 +26,7 @@ information_prompt = ChatPromptTemplate.from_messages([
         당신의 유일한 임무는 최종 인슐린 계산에 필요한 아래 정보들을 사용자에게 질문하여 모두 알아내는 것입니다.
 
         **[정보 수집 체크리스트]**
-        1. 섭취할 음식들/식단 (파악 후 `nutrition_retriever_tool`을 사용해 영양 정보 확인)
+        1. 섭취할 음식들/식단과 음식마다 먹을 양(몇 인분, 몇 g, 몇 개) (파악 후 `nutrition_retriever_tool` 또는 `nutrition_batch_retriever_tool`을 사용해 영양 정보 확인)
         2. 최근 이틀 간 운동 여부(구체적인 종류, 강도, 시간)
         3. 현재 스트레스 강도(상/중/하)
         4. 소화 불량 여부
@@ -34,6 +36,7 @@ information_prompt = ChatPromptTemplate.from_messages([
         - 한 번에 하나씩 물어보세요.
         - 체크리스트의 정보가 부족하면, 사용자에게 친절하게 추가 질문을 하세요.
         - 음식 이름이 나오면, 주저 말고 `nutrition_retriever_tool`을 사용해 영양성분을 확인하고 사용자에게 알려주세요. 
+        - 음식이 여러 개라면 `nutrition_batch_retriever_tool`로 모든 음식을 한 번에 확인하세요.
         - 음식은 여러 개일 수 있으니 명확하게 확인하세요. (ex. 혹시 더 드실 음식이나 음료가 있으신가요? 없으시다면 다음 단계로 진행하겠습니다.)
         - **모든 정보가 수집되었다고 판단되면, 더 이상 질문이나 도구 사용 없이 "정보 수집이 완료되었습니다." 라고만 답변하세요.** 이것이 당신의 임무가 끝났다는 신호입니다.
         - 절대로 인슐린 용량을 계산하거나 추측하지 마세요. 그건 당신의 역할이 아닙니다.
@@ -43,7 +46,7 @@ information_prompt = ChatPromptTemplate.from_messages([
 ])
 
 
-# facotr_node의 PydanticOutputParser 사용을 위한 스키마 설정
+# factor_node가 반환하는 보정 계수의 스키마 (insulin_calculation의 인자와 같습니다.)
 class Factor_schema(BaseModel):
     carbs: float = Field(default=0.0, description="이전 대화에서 파악한 음식의 탄수화물량을 계산합니다. 기준량 100g의 탄수화물량을 1인분용량에 곱해서 계산하거나, 배경지식에 의해서 추산합니다.")
     blood_sugar: float = Field(default=120.0, description="현재 혈당 수치(mg/dl)입니다.")
@@ -53,32 +56,44 @@ class Factor_schema(BaseModel):
     stress_factor: float = Field(default=1.0, description="스트레스로 인한 인슐린 저항성 증가 계수. 상/중/하에 따라 1.3/1.15/1.0 (1.0~1.3)")
     ill_factor: float = Field(default=1.0, description="질병으로 인한 인슐린 저항성 증가 계수 (1.0~1.3)")
 
-factor_parser = PydanticOutputParser(pydantic_object=Factor_schema)
+# 음식 하나의 먹을 양 (셋 중 사용자가 말한 하나만 채웁니다.)
+class FoodAmount_schema(BaseModel):
+    food: str = Field(description="음식 목록에 적힌 음식 이름")
+    servings: Optional[float] = Field(default=None, description="인분, 그릇, 공기, 줄, 잔 등 1인분 단위로 말한 양")
+    grams: Optional[float] = Field(default=None, description="g 또는 ml로 말한 양")
+    pieces: Optional[float] = Field(default=None, description="개, 피스, 조각 등 개수로 말한 양")
+
+# factor_node에서 규칙으로 채우지 못한 계수와 먹을 양만 추출하기 위한 스키마
+# (carbs, blood_sugar, iob, morning_factor는 factors.py에서 계산합니다.)
+class FuzzyFactor_schema(BaseModel):
+    exercise_factor: float = Field(default=1.0, description="운동 효과로 인한 인슐린 감량 계수 (0.5~1.0)")
+    stress_factor: float = Field(default=1.0, description="스트레스로 인한 인슐린 저항성 증가 계수. 상/중/하에 따라 1.3/1.15/1.0 (1.0~1.3)")
+    ill_factor: float = Field(default=1.0, description="질병으로 인한 인슐린 저항성 증가 계수 (1.0~1.3)")
+    amounts: List[FoodAmount_schema] = Field(default_factory=list, description="음식 목록의 음식마다 사용자가 말한 먹을 양. 말하지 않은 음식은 넣지 않습니다.")
+
+factor_parser = PydanticOutputParser(pydantic_object=FuzzyFactor_schema)
 
 format = factor_parser.get_format_instructions()
 
-# 보정 계수 생성을 위한 노드(factor_node)를 위한 프롬프트
+# 보정 계수 추출을 위한 노드(factor_node)를 위한 프롬프트
 factor_prompt = ChatPromptTemplate.from_messages([
     (
         "system",
         """
-        당신은 1형 당뇨 환자의 인슐린 용량 계산을 위해 음식의 탄수화물과 각종 보정 계수를 계산하는 어시스턴트입니다.
-        주어진 대화 전체를 활용하여 탄수화물량과 인슐린 계산에 필요한 보정 계수를 산출하세요.
+        당신은 1형 당뇨 환자의 대화에서 인슐린 보정 계수를 추출하는 어시스턴트입니다.
+        주어진 대화에서 사용자가 답한 내용만 근거로 아래 계수를 산출하세요. 언급이 없으면 1.0으로 두세요.
 
-        * 이전 대화에서 주어진 음식의 영양성분을 활용하여 carbs를 영양학적으로 정확히 계산하세요. (ex. 100g 기준 탄수화물량 * 1인분 용량)
         * 최근 2일간, 그리고 식후 운동량을 종합하여 exercise_factor를 0.5 ~ 1.0 사이로 설정하세요.
-        * 오전 6시 ~ 10시 사이라면, morning_factor를 1.3으로 보정하세요. 점심이나 저녁이라면 1.0으로 두면 됩니다.
         * 스트레스 수준에 따라 stress_factor를 1.0~1.3 사이로 조정하세요.
         * 몸살, 감기 등 기타 질병 여부에 따라 ill_factor를 1.0~1.3 사이로 조정하세요.
+        * 아래 음식 목록의 음식마다 사용자가 말한 먹을 양을 amounts에 적으세요.
+          양을 말하지 않은 음식은 넣지 말고, 1인분으로 추측하지 마세요.
+        음식 목록:
+        {foods}
 
-        현재 시간:
-        {time}
-
-        현재 혈당:
-        {blood_sugar}
-
-        IOB:
-        {iob}
+        참고: 최근 혈당 추세와 체내 잔존 인슐린/탄수화물로 예측한 앞으로의 혈당입니다. (mg/dL)
+        {forecast}
+        예측은 대화에서 말한 운동, 스트레스, 질병의 정도를 판단할 때 참고만 하세요.
 
         형식:
         {format}
@@ -114,4 +129,22 @@ answering_prompt = ChatPromptTemplate.from_messages([
         """
     ),
     MessagesPlaceholder(variable_name="messages")
-])
\ No newline at end of file
+])
+
+# 오래된 대화를 누적 요약하기 위한 프롬프트 (context.py의 token 예산 관리에 사용)
+summary_prompt = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        """당신은 1형 당뇨 관리 어드바이저의 대화 기록을 정리하는 담당자입니다.
+        기존 요약에 새로 주어진 대화를 합쳐, 이후 상담에 필요한 사실만 간결한 한국어로 다시 요약하세요.
+
+        * 반드시 남길 것: 섭취한(할) 음식과 양, 영양 성분 검색 결과의 탄수화물 수치, 운동/스트레스/소화/질병 여부, 혈당, 계산된 인슐린 용량
+        * 인사말, 중복된 질문, 도구 호출 과정은 생략하세요.
+
+        기존 요약:
+        {summary}
+        """
+    ),
+    MessagesPlaceholder(variable_name="messages"),
+    ("human", "위 대화를 기존 요약과 합쳐 요약해 주세요.")
+])
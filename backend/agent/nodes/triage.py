@@ -0,0 +1,186 @@
+import json
+import math
+import re
+from collections import Counter
+from typing import Iterable, Optional
+
+from ..lazy import lazy
+from ..settings import TRIAGE_HIGH_GLUCOSE, TRIAGE_MODEL_PATH
+
+## Triage 로컬 분류기
+# * triage_node 앞단에서 LLM 호출 없이 대화 의도를 분류합니다.
+# * 작업순서:
+#   1. 정규식 규칙으로 label 별 점수를 계산합니다.
+#   2. 문자 bigram 기반의 작은 Naive Bayes 모델(triage_model.json)로 확률을 계산합니다.
+#   3. 두 결과를 합쳐 (label, confidence)를 반환합니다. confidence가 낮으면 LLM을 호출합니다.
+#      ("혈당 200 넘으면 위험해?"처럼 투여 의도 없이 묻는 문장은 meal/correction으로 확신하지 않고 LLM에게 넘깁니다.)
+#      correction은 투여 의도나 고혈당 근거(높다/오른다, TRIAGE_HIGH_GLUCOSE 이상의 수치)가 있을 때만 확신하며,
+#      저혈당 맥락("혈당이 떨어져서 어지러워", "사탕 먹었어")은 교정 인슐린 경로로 보내지 않도록 LLM에게 넘깁니다.
+
+LABELS = ("meal", "correction", "query")
+
+# 규칙 하나가 매칭될 때마다 더해지는 log-odds
+RULE_WEIGHT = 2.0
+# token 당 평균 log-likelihood에 곱하는 가중치 (모델 확률이 과신하지 않도록 보정)
+MODEL_WEIGHT = 4.0
+# 투여 의도 없는 질문이 meal/correction으로 분류될 때의 최대 confidence (threshold보다 낮아 LLM이 판단합니다.)
+QUESTION_CONFIDENCE = 0.5
+# 근거 없는 correction, 저혈당 맥락의 correction의 최대 confidence
+UNSUPPORTED_CONFIDENCE = 0.5
+
+# 인슐린을 맞으려는(용량을 묻는) 표현
+DOSING_INTENT = re.compile(r"인슐린|주사|맞(아|을|으|고|혀)|교정|보정|단위|용량|내리|내려|떨어뜨리")
+# 조건/판단을 묻는 표현 ("~이면", "~넘으면", "정상이야?", "위험해?")
+QUESTION = re.compile(r"\?|이면|넘으면|정상(이|인)|위험")
+# 혈당이 높다는 표현 ("안 떨어져"는 높은 혈당이 내려가지 않는다는 뜻입니다.)
+HIGH_GLUCOSE = re.compile(r"고혈당|스파이크|높|올라|오르|안\s?떨어|안\s?내려")
+# 저혈당 맥락 (혈당이 떨어지는 중이거나, 저혈당 증상/처치)
+LOW_GLUCOSE = re.compile(r"저혈당|(?<!안)(?<!안\s)떨어(져|졌|지)|어지러|식은땀|손\s?떨|사탕|주스\s?마셨|포도당")
+
+
+class HighReading:
+    """
+    측정한 혈당 수치를 알리는 문장("혈당 270이야", "300 넘었어") 중 수치가 TRIAGE_HIGH_GLUCOSE 이상인 경우만 찾습니다.
+    ("혈당 120이야"는 정상 수치이므로 교정 대상이 아닙니다.) RULES의 정규식과 같이 search()로 사용합니다.
+    """
+    pattern = re.compile(r"혈당.{0,8}?(?<!\d)(\d{2,3})\s?(이야|이에요|예요|야$|나왔|넘었|이상이에요|이상이야|인데)")
+
+    def search(self, text: str) -> Optional[re.Match]:
+        for match in self.pattern.finditer(text):
+            if int(match.group(1)) >= TRIAGE_HIGH_GLUCOSE:
+                return match
+        return None
+
+RULES = {
+    "meal": [
+        re.compile(r"먹(을|으려|으면|고\s?싶|을게|을래|겠|기\s?전)"),
+        re.compile(r"(아침|점심|저녁|간식|식사|메뉴)(으로|는|에|\s?인슐린)"),
+        re.compile(r"(마실|드실|먹을)\s?(거|건데|예정)"),
+        re.compile(r"식전|식사\s?인슐린"),
+    ],
+    "correction": [
+        # 혈당 수치/상승 + 투여 의도 (수치만 있는 질문은 제외합니다.)
+        re.compile(rf"^(?=.*({DOSING_INTENT.pattern})).*혈당.{{0,8}}(높|올라|오르|[1-4]\d{{2}})"),
+        # 측정한 높은 수치를 알리는 문장 ("혈당 270이야", "300 넘었어")
+        HighReading(),
+        re.compile(r"고혈당|스파이크"),
+        re.compile(r"(교정|보정)\s?(인슐린|주사|용량|해|할|하려|필요)"),
+        # 혈당을 내리려는 표현 ("떨어져"만으로는 방향을 알 수 없으므로 넣지 않습니다.)
+        re.compile(r"(내리|떨어뜨리|안\s?떨어)"),
+    ],
+    "query": [
+        re.compile(r"(칼로리|영양\s?성분|성분|함량|혈당\s?지수|탄수화물\s?(몇|얼마))"),
+        re.compile(r"(뭐야|뭔가요|무엇|왜|어떻게\s?(돼|해|써|챙겨)|알려\s?줘|궁금|추천)"),
+        re.compile(r"^(안녕|고마워|감사)"),
+        re.compile(r"(이면|넘으면|높으면|낮으면).{0,12}(정상|위험|괜찮|높은|낮은|돼|해야|가야|왜)"),
+    ],
+}
+
+
+def rule_scores(text: str) -> dict:
+    """label 별로 매칭된 규칙의 수를 반환합니다."""
+    return {label: sum(1 for rule in rules if rule.search(text)) for label, rules in RULES.items()}
+
+
+def tokenize(text: str) -> list:
+    """공백을 제거한 문자 bigram 목록을 반환합니다."""
+    compact = re.sub(r"\s+", "", text.lower())
+    return [compact[i:i + 2] for i in range(len(compact) - 1)] or [compact]
+
+
+class TriageModel:
+    """문자 bigram 다항 Naive Bayes 모델. json 파일 하나로 저장됩니다."""
+
+    def __init__(self, priors: dict, likelihoods: dict, unknown: dict):
+        self.priors = priors
+        self.likelihoods = likelihoods
+        self.unknown = unknown
+
+    @classmethod
+    def train(cls, samples: Iterable[tuple], alpha: float = 0.5) -> "TriageModel":
+        """(text, label) 목록으로 모델을 학습합니다."""
+        label_counts = Counter()
+        token_counts = {label: Counter() for label in LABELS}
+        for text, label in samples:
+            label_counts[label] += 1
+            token_counts[label].update(tokenize(text))
+
+        vocab = set().union(*token_counts.values())
+        total = sum(label_counts.values())
+        priors, likelihoods, unknown = {}, {}, {}
+        for label in LABELS:
+            denominator = sum(token_counts[label].values()) + alpha * (len(vocab) + 1)
+            priors[label] = math.log((label_counts[label] + 1) / (total + len(LABELS)))
+            likelihoods[label] = {
+                token: round(math.log((count + alpha) / denominator), 4)
+                for token, count in token_counts[label].items()
+            }
+            unknown[label] = round(math.log(alpha / denominator), 4)
+        return cls(priors, likelihoods, unknown)
+
+    @classmethod
+    def load(cls, path: str = TRIAGE_MODEL_PATH) -> Optional["TriageModel"]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        return cls(data["priors"], data["likelihoods"], data["unknown"])
+
+    def save(self, path: str = TRIAGE_MODEL_PATH) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"priors": self.priors, "likelihoods": self.likelihoods, "unknown": self.unknown},
+                f, ensure_ascii=False, separators=(",", ":"),
+            )
+
+    def log_scores(self, text: str) -> dict:
+        tokens = tokenize(text)
+        return {
+            label: self.priors[label] + sum(
+                self.likelihoods[label].get(token, self.unknown[label]) for token in tokens
+            )
+            for label in LABELS
+        }
+
+
+# 모델 파일을 한 번만 읽어서 재사용합니다. 파일이 없으면 규칙만 사용합니다.
+# 읽기 전용이므로 gunicorn --preload 시 master에서 읽은 모델을 모든 worker가 공유합니다.
+get_model = lazy(TriageModel.load, shared=True)
+
+
+def classify(text: str, model: Optional[TriageModel] = None) -> tuple:
+    """
+    사용자 입력을 분류합니다.
+
+    Returns:
+        (label, confidence): confidence는 0~1 사이의 확률입니다.
+    """
+    model = model or get_model()
+
+    scores = model.log_scores(text) if model else {label: 0.0 for label in LABELS}
+    rules = rule_scores(text)
+
+    # 모델 점수는 문장 길이에 비례하므로 token 수로 나눈 뒤 규칙 점수와 합칩니다.
+    n_tokens = len(tokenize(text))
+    logits = {
+        label: MODEL_WEIGHT * scores[label] / max(n_tokens, 1) + RULE_WEIGHT * rules[label]
+        for label in LABELS
+    }
+
+    top = max(logits.values())
+    exp = {label: math.exp(logit - top) for label, logit in logits.items()}
+    total = sum(exp.values())
+
+    label = max(exp, key=exp.get)
+    confidence = exp[label] / total
+    if label != "query" and QUESTION.search(text) and not DOSING_INTENT.search(text):
+        confidence = min(confidence, QUESTION_CONFIDENCE)
+    if label == "correction" and (LOW_GLUCOSE.search(text) or not supports_correction(text)):
+        confidence = min(confidence, UNSUPPORTED_CONFIDENCE)
+    return label, confidence
+
+
+def supports_correction(text: str) -> bool:
+    """투여 의도, 고혈당 표현, TRIAGE_HIGH_GLUCOSE 이상의 수치 중 하나가 있으면 True"""
+    return bool(DOSING_INTENT.search(text) or HIGH_GLUCOSE.search(text) or HighReading().search(text))
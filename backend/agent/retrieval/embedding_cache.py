@@ -0,0 +1,238 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+from ..metrics import EMBEDDING_CACHE_LOOKUPS
+from ..settings import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_SIZE, EMBEDDING_CACHE_MAX_ROWS
+
+## 검색어 임베딩 캐시
+# * 같은 음식(밥, 김치, 삼겹살 ...)을 반복해서 묻는 경우 임베딩 요청(네트워크, quota)을 생략합니다.
+# * 작업순서:
+#   1. 검색어를 정규화(NFKC, 소문자, 공백 정리)하고 모델 이름과 함께 sha1으로 key를 만듭니다.
+#   2. 프로세스 내 LRU(memory)를 먼저 보고, 없으면 SQLite 파일(disk)을 봅니다.
+#      SQLite 파일은 모든 gunicorn worker가 함께 사용합니다. (WAL 모드)
+#   3. 둘 다 없으면 miss로 반환하고, 호출한 쪽에서 임베딩한 뒤 put_many()로 두 곳에 저장합니다.
+#   4. disk의 행 수가 최대치를 넘으면 가장 오래 사용하지 않은 행부터 지웁니다.
+#      행 수는 연결할 때 한 번 세고 추가한 만큼 더해 추정합니다. (저장할 때마다 COUNT(*)하지 않습니다.)
+# * disk hit의 last_used는 바로 쓰지 않고 모아 두었다가 다음 저장 또는 TOUCH_FLUSH_INTERVAL마다 한 번에 씁니다.
+#   조회 경로가 SQLite 쓰기 잠금을 기다리지 않도록 하기 위해서입니다.
+# * SQLite 오류는 요청을 실패시키지 않고 miss(조회) 또는 생략(저장)으로 처리합니다. (tier="error"로 집계)
+# * 벡터는 float32 byte열로 저장합니다. (4096차원 = 16KB)
+
+# disk 행 수가 최대치를 넘으면 이 비율만큼 한 번에 지웁니다. (매번 지우지 않도록)
+EVICT_FRACTION = 0.1
+# 조회한 행의 last_used를 모아서 쓰는 주기(초)
+TOUCH_FLUSH_INTERVAL = 60
+# SQLite 잠금을 기다리는 최대 시간(초). 캐시이므로 오래 기다리지 않고 miss로 처리합니다.
+SQLITE_TIMEOUT = 1
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip().lower()
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha1(f"{model}\0{normalize(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    2단계(memory LRU + SQLite) 임베딩 캐시.
+    path가 None이면 memory만 사용합니다.
+    SQLite 오류(잠김, 디스크 가득 참, 손상 등)는 disk miss 또는 저장 생략으로 처리합니다.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = EMBEDDING_CACHE_PATH,
+        memory_size: int = EMBEDDING_CACHE_MEMORY_SIZE,
+        max_rows: int = EMBEDDING_CACHE_MAX_ROWS,
+    ):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_rows = max_rows
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        # disk 행 수 추정치와 마지막으로 COUNT(*)를 실행했을 때의 값
+        self._rows = 0
+        self._counted_rows = 0
+        # last_used를 갱신할 key와 사용 시각 (조회할 때마다 쓰지 않고 모아서 씁니다.)
+        self._touched = {}
+        self._flushed_at = time.monotonic()
+        self.hits = {"memory": 0, "disk": 0, "miss": 0, "error": 0}
+
+    # 1. SQLite 연결 (fork 이후에는 새로 연결합니다.)
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = None
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=SQLITE_TIMEOUT)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            conn.commit()
+            # 행 수는 연결할 때 한 번만 세고, 이후에는 추가한 행 수만큼 더합니다.
+            (self._rows,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            self._counted_rows = self._rows
+            self._touched = {}
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _failed(self, action: str, error: sqlite3.Error) -> None:
+        """SQLite 오류를 기록하고, 다음 요청에서 새로 연결하도록 연결을 버립니다."""
+        logger.warning("임베딩 캐시 %s 실패 (%s): %s", action, self.path, error)
+        self._count("error")
+        if self._conn is not None:
+            try:
+                self._conn.rollback()
+            except sqlite3.Error:
+                self._conn = None
+
+    # 2. 조회
+    def get_many(self, model: str, texts: list) -> list:
+        """texts와 같은 순서로 벡터(list[float]) 또는 None(miss)을 반환합니다."""
+        keys = [cache_key(model, text) for text in texts]
+        found = {}
+
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self._count("memory")
+
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            if missing and self.path:
+                try:
+                    conn = self._connection()
+                    placeholders = ",".join("?" * len(missing))
+                    rows = conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", missing
+                    ).fetchall()
+                except sqlite3.Error as error:
+                    self._failed("조회", error)
+                    rows = []
+
+                # 읽기 경로에서는 쓰기 잠금을 잡지 않습니다. last_used는 모아 두었다가 flush합니다.
+                now = time.time()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector
+                    self._touched[key] = now
+                    self._remember(key, vector)
+                    self._count("disk")
+                if self._touched and time.monotonic() - self._flushed_at >= TOUCH_FLUSH_INTERVAL:
+                    self._flush()
+
+            for key in keys:
+                if key not in found:
+                    self._count("miss")
+
+        return [found[key].tolist() if key in found else None for key in keys]
+
+    # 3. 저장
+    def put_many(self, model: str, texts: list, vectors: list) -> None:
+        entries = {cache_key(model, text): array("f", vector) for text, vector in zip(texts, vectors)}
+
+        with self._lock:
+            for key, vector in entries.items():
+                self._remember(key, vector)
+
+            if not self.path:
+                return
+
+            try:
+                conn = self._connection()
+                now = time.time()
+                # 같은 key의 벡터는 같으므로 이미 있는 행은 그대로 두고, 새로 추가한 행 수만 셉니다.
+                cursor = conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)",
+                    [(key, model, vector.tobytes(), now) for key, vector in entries.items()],
+                )
+                self._rows += max(cursor.rowcount, 0)
+                self._flush(commit=False)
+                conn.commit()
+                self._evict(conn)
+            except sqlite3.Error as error:
+                self._failed("저장", error)
+
+    # 4. last_used 갱신 (조회한 key를 모아 한 transaction으로 씁니다.)
+    def _flush(self, commit: bool = True) -> None:
+        touched, self._touched = self._touched, {}
+        self._flushed_at = time.monotonic()
+        if not touched:
+            return
+        try:
+            conn = self._connection()
+            conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in touched.items()],
+            )
+            if commit:
+                conn.commit()
+        except sqlite3.Error as error:
+            # 사용 시각은 정리 순서에만 쓰이므로 잃어버려도 됩니다.
+            self._failed("사용 시각 갱신", error)
+
+    # 5. 크기 제한
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        # 다른 worker가 추가한 행은 추정치에 없으므로, 추정치가 최대치를 넘거나
+        # 마지막으로 센 뒤 정리 단위만큼 늘었을 때만 실제로 셉니다.
+        step = max(int(self.max_rows * EVICT_FRACTION), 1)
+        if self._rows <= self.max_rows and self._rows - self._counted_rows < step:
+            return
+        (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        self._rows = self._counted_rows = count
+        if count <= self.max_rows:
+            return
+        remove = count - self.max_rows + int(self.max_rows * EVICT_FRACTION)
+        cursor = conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (remove,),
+        )
+        conn.commit()
+        self._rows = self._counted_rows = count - max(cursor.rowcount, 0)
+
+    def _remember(self, key: str, vector: array) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _count(self, tier: str) -> None:
+        self.hits[tier] += 1
+        EMBEDDING_CACHE_LOOKUPS.labels(tier=tier).inc()
+
+    @property
+    def hit_rate(self) -> float:
+        total = sum(self.hits.values())
+        return (self.hits["memory"] + self.hits["disk"]) / total if total else 0.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._touched = {}
+            if self.path:
+                try:
+                    conn = self._connection()
+                    conn.execute("DELETE FROM embeddings")
+                    conn.commit()
+                    self._rows = self._counted_rows = 0
+                except sqlite3.Error as error:
+                    self._failed("삭제", error)
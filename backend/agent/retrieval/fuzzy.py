@@ -0,0 +1,190 @@
+from bisect import bisect_left
+from collections import defaultdict
+
+from .lexical import segments
+from .names import NameIndex, name_key
+
+## 오타/자모 허용 음식 이름 색인
+# * "삽겹살"(삼겹살), "삼겹살 구이"(삼겹살구이), "ㅅㄱㅅ"(초성) 같은 검색어의 후보를 로컬에서 찾습니다.
+#   후보는 최종 결과가 아니라 hybrid.py에서 벡터 검색 결과와 RRF로 합칩니다. ("초코우유" -> "초코아츄"처럼 가까워도 다른 음식이 많습니다.)
+# * 작업순서:
+#   1. names.py의 key("삼겹살구이", "고추장" ...)와 식품명을 공백으로도 나눈 단어("아이스", "아메리카노")를
+#      자모로 분해합니다. ("삼" -> "ㅅㅏㅁ")
+#   2. 자모 문자열의 trigram -> key 목록 역색인을 만듭니다.
+#      편집 거리가 d인 두 문자열은 trigram을 최대 3d개만 다르게 가지므로(q-gram lemma),
+#      검색어의 가장 드문 trigram 3d + 1개로 후보 key를 먼저 좁히고 후보만 편집 거리를 계산합니다.
+#   3. 검색어 전체(공백 제거)가 key와 가까우면 그 key로 이름 색인을 다시 찾은 음식을("삽겹살" -> "삼겹살구이"),
+#      아니면 단어마다 가까운 key를 찾아
+#      모든 단어가 일치하는 음식을 반환합니다.
+#   4. 검색어가 초성만으로 되어 있으면("ㅅㄱㅅ") 정렬된 초성 key 배열에서 접두어 범위를 찾습니다.
+
+CHOSEONG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+JUNGSEONG = "ㅏㅐㅑㅒㅓㅔㅕㅖㅗㅘㅙㅚㅛㅜㅝㅞㅟㅠㅡㅢㅣ"
+JONGSEONG = ["", "ㄱ", "ㄲ", "ㄳ", "ㄴ", "ㄵ", "ㄶ", "ㄷ", "ㄹ", "ㄺ", "ㄻ", "ㄼ", "ㄽ", "ㄾ", "ㄿ", "ㅀ",
+             "ㅁ", "ㅂ", "ㅄ", "ㅅ", "ㅆ", "ㅇ", "ㅈ", "ㅊ", "ㅋ", "ㅌ", "ㅍ", "ㅎ"]
+HANGUL_START, HANGUL_END = 0xAC00, 0xD7A3
+
+# 초성 검색을 허용하는 최소 글자 수 ("ㄱ" 하나로는 너무 많은 음식이 나옵니다.)
+MIN_CHOSEONG_LENGTH = 2
+# 이 수보다 짧은 자모 문자열(두 글자 이하의 단어)은 오타 검색을 하지 않습니다. ("콩" -> "공"처럼 엉뚱한 음식과 겹칩니다.)
+MIN_FUZZY_JAMO = 5
+# 자모 이 수마다 편집 거리를 1씩 더 허용합니다. (네 글자 정도까지는 1글자 오타만 허용합니다.)
+JAMO_PER_EDIT = 12
+
+
+def jamo(text: str) -> str:
+    """한글 음절을 초성/중성/종성 자모로 분해합니다. 한글이 아닌 글자는 그대로 둡니다."""
+    chars = []
+    for char in text:
+        code = ord(char)
+        if HANGUL_START <= code <= HANGUL_END:
+            code -= HANGUL_START
+            chars.append(CHOSEONG[code // 588] + JUNGSEONG[code % 588 // 28] + JONGSEONG[code % 28])
+        else:
+            chars.append(char)
+    return "".join(chars)
+
+
+def choseong(text: str) -> str:
+    """한글 음절의 초성만 남깁니다. ("삼겹살" -> "ㅅㄱㅅ")"""
+    return "".join(
+        CHOSEONG[(ord(char) - HANGUL_START) // 588] if HANGUL_START <= ord(char) <= HANGUL_END else char
+        for char in text
+    )
+
+
+def is_choseong(text: str) -> bool:
+    return bool(text) and all(char in CHOSEONG for char in text)
+
+
+def trigrams(text: str) -> set:
+    padded = f"^^{text}$$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_distance(text: str) -> int:
+    """허용하는 자모 편집 거리. (네 글자 정도까지 1, 여덟 글자 정도까지 2, 그 이상 3)"""
+    return min(1 + len(text) // JAMO_PER_EDIT, 3)
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein 거리. limit를 넘으면 계산을 멈추고 limit + 1을 반환합니다."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class FuzzyIndex:
+
+    def __init__(self, names: NameIndex):
+        self.names = names
+        # key -> 문서 번호 목록. 이름 색인의 key에, 단어 별 검색("아이스 아메리카노")을 위한 공백 단위 단어를 더합니다.
+        self.documents = {key: list(doc_ids) for key, doc_ids in names.exact.items()}
+        for doc_id, row in enumerate(names.rows):
+            for word in dict.fromkeys(segments(row.get('식품명', ''))):
+                doc_ids = self.documents.setdefault(word, [])
+                if doc_id not in doc_ids:
+                    doc_ids.append(doc_id)
+        self.keys = list(self.documents)
+        self.jamo = [jamo(key) for key in self.keys]
+        self.grams = [trigrams(text) for text in self.jamo]
+        self.postings = defaultdict(list)
+        for key_id, grams in enumerate(self.grams):
+            for gram in grams:
+                self.postings[gram].append(key_id)
+
+        self.choseong_keys = sorted((choseong(key), key) for key in self.keys)
+
+    # 1. 편집 거리 검색
+    def nearest(self, text: str) -> list:
+        """text와 자모 편집 거리가 max_distance 이내인 (거리, key) 목록을 가까운 순서로 반환합니다."""
+        query = jamo(text)
+        if len(query) < MIN_FUZZY_JAMO:
+            return []
+        limit = max_distance(query)
+        grams = sorted(trigrams(query), key=lambda gram: len(self.postings.get(gram, ())))
+
+        # 공유해야 하는 trigram이 len(grams) - 3 * limit개이므로, 후보는 가장 드문 3 * limit + 1개 trigram 중
+        # 하나는 반드시 가지고 있습니다. (흔한 trigram의 긴 목록은 보지 않습니다.)
+        candidates = set()
+        for gram in grams[:3 * limit + 1]:
+            candidates.update(self.postings.get(gram, ()))
+
+        needed, query_grams = len(grams) - 3 * limit, set(grams)
+        found = []
+        for key_id in candidates:
+            text = self.jamo[key_id]
+            if abs(len(text) - len(query)) > limit or len(query_grams & self.grams[key_id]) < needed:
+                continue
+            distance = edit_distance(query, text, limit)
+            if distance <= limit:
+                found.append((distance, len(self.keys[key_id]), self.keys[key_id]))
+        return [(distance, key) for distance, _, key in sorted(found)]
+
+    # 2. 초성 접두어 검색
+    def choseong_prefix(self, text: str, k: int) -> list:
+        doc_ids = []
+        start = bisect_left(self.choseong_keys, (text, ""))
+        matches = []
+        for initials, key in self.choseong_keys[start:]:
+            if not initials.startswith(text):
+                break
+            # 초성 수가 같은 key, 짧은 key, 음식이 많은(흔한) key 순서로 봅니다.
+            matches.append((len(initials) != len(text), len(key), -len(self.documents[key]), key))
+        for *_, key in sorted(matches):
+            doc_ids.extend(doc_id for doc_id in self.documents[key] if doc_id not in doc_ids)
+            if len(doc_ids) >= k:
+                break
+        return doc_ids[:k]
+
+    def lookup(self, query: str, k: int = 3) -> tuple:
+        """
+        Returns:
+            (match, 문서 번호 목록): match는 "fuzzy", "choseong", "miss" 중 하나입니다.
+        """
+        key = name_key(query)
+        if not key:
+            return "miss", []
+
+        if is_choseong(key):
+            doc_ids = self.choseong_prefix(key, k) if len(key) >= MIN_CHOSEONG_LENGTH else []
+            return ("choseong", doc_ids) if doc_ids else ("miss", [])
+
+        # 검색어 전체가 하나의 key와 가까운 경우 ("삽겹살구이" -> "삼겹살구이")
+        # key의 음식은 이름 색인의 순서(head 음식 먼저)로 가져옵니다. ("삽겹살" -> "삼겹살구이", "김치찌개_삼겹살"이 아님)
+        nearest = self.nearest(key)
+        if nearest:
+            doc_ids = []
+            for _, candidate in nearest:
+                _, found = self.names.lookup(candidate, k=k)
+                found = found or self.documents[candidate][:k]
+                doc_ids.extend(doc_id for doc_id in found if doc_id not in doc_ids)
+                if len(doc_ids) >= k:
+                    break
+            return "fuzzy", doc_ids[:k]
+
+        # 단어마다 가까운 key가 있고, 모든 단어의 key를 가진 음식 ("삼겹살 김치찌게" -> "김치찌개_삼겹살")
+        words = segments(query)
+        if len(words) < 2:
+            return "miss", []
+        scores = None
+        for word in words:
+            distances = {}
+            for distance, candidate in self.nearest(word) or ([(0, word)] if word in self.documents else []):
+                for doc_id in self.documents[candidate]:
+                    distances.setdefault(doc_id, distance)
+            scores = distances if scores is None else {
+                doc_id: scores[doc_id] + distance for doc_id, distance in distances.items() if doc_id in scores
+            }
+            if not scores:
+                return "miss", []
+        ranked = sorted(scores, key=lambda doc_id: (scores[doc_id], len(self.names.rows[doc_id].get('식품명', ''))))
+        return "fuzzy", ranked[:k]
@@ -0,0 +1,127 @@
+from typing import Awaitable, Callable
+
+from langchain_core.documents import Document
+
+from .fuzzy import FuzzyIndex
+from .lexical import LexicalIndex
+from .names import NameIndex
+from ..lazy import lazy
+from ..metrics import NAME_INDEX_LOOKUPS, RETRIEVER_PATH, timed
+from ..settings import HYBRID_CANDIDATES, RETRIEVER_TOP_K, RRF_K
+
+## Hybrid(BM25 + 벡터) 영양 성분 검색
+# * 작업순서:
+#   0. 음식 이름 색인(names.py)에서 식품명 하나와 그대로 일치(exact)하면 그 결과를 바로 반환합니다.
+#      재료/접두어로만 일치하거나 여러 음식과 일치(candidate)하면("계란" -> "볶음밥_계란") lexical 결과와 합친 뒤 3.으로 보냅니다.
+#   1. 나머지 검색어를 lexical 색인(BM25)으로 검색합니다. (로컬, 수십 μs)
+#   2. 상위 결과가 검색어의 모든 단어를 포함하는(confident) 검색어는 lexical 결과를 그대로 반환합니다.
+#   2-1. 오타/초성 검색어("삽겹살 구이", "ㄱㅊㅉㄱ")는 자모 편집 거리 색인(fuzzy.py)의 결과를 lexical 결과 대신 후보로 씁니다.
+#        편집 거리가 가까워도 다른 음식일 수 있으므로("초코우유" -> "초코아츄") 바로 반환하지 않고 3.에서 벡터 결과와 합칩니다.
+#   3. 나머지 검색어만 모아서 한 번에 임베딩하고 벡터 검색한 뒤, 두 결과를 Reciprocal Rank Fusion으로 합칩니다.
+# * 벡터 검색 함수는 tools.py에서 주입합니다. (임베딩 client와 vectorDB는 tools.py가 관리합니다.)
+
+# 색인은 읽기 전용이므로 gunicorn --preload 시 master에서 만든 것을 모든 worker가 공유합니다.
+get_lexical_index = lazy(LexicalIndex.load, shared=True)
+get_name_index = lazy(lambda: NameIndex(get_lexical_index().rows), shared=True)
+get_fuzzy_index = lazy(lambda: FuzzyIndex(get_name_index()), shared=True)
+
+
+def _document(index: LexicalIndex, doc_id: int) -> Document:
+    """원본 행에 food_id(원본 행 번호)를 더해 메타데이터로 사용합니다. (nutrition_table.NutritionTable.resolve)"""
+    row = index.row(doc_id)
+    return Document(page_content=row.get('식품명', ''), metadata={**row, 'food_id': doc_id})
+
+
+def rrf_fuse(ranked_lists: list, k: int = RRF_K, top_k: int = RETRIEVER_TOP_K) -> list:
+    """여러 검색기의 순위 목록(Document 목록)을 식품명 기준으로 합쳐 상위 top_k개를 반환합니다."""
+    scores, documents = {}, {}
+    for documents_in_rank in ranked_lists:
+        seen = set()
+        for rank, document in enumerate(documents_in_rank, start=1):
+            key = document.metadata.get('식품명', document.page_content)
+            # 같은 목록에 같은 식품명(출처만 다른 행)이 여러 번 있어도 가장 높은 순위만 점수에 더합니다.
+            if key in seen:
+                continue
+            seen.add(key)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(key, document)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)[:top_k]]
+
+
+def _local(queries: list) -> tuple:
+    """
+    로컬 색인만으로 검색합니다.
+
+    Returns:
+        (candidates, pending): 검색어 별 후보(Document 목록)와, 벡터 검색이 필요한 검색어의 index 목록
+    """
+    index, names, fuzzy = get_lexical_index(), get_name_index(), get_fuzzy_index()
+    candidates, pending = [], []
+    paths = {"name": 0, "lexical": 0, "fuzzy": 0, "hybrid": 0}
+
+    with timed("retriever", "lexical"):
+        for i, query in enumerate(queries):
+            match, doc_ids = names.lookup(query, k=RETRIEVER_TOP_K)
+            NAME_INDEX_LOOKUPS.labels(result=match).inc()
+            if match == "exact":
+                candidates.append([_document(index, doc_id) for doc_id in doc_ids])
+                paths["name"] += 1
+                continue
+
+            results = index.search(query, k=HYBRID_CANDIDATES)
+            if match == "candidate":
+                # 이름 후보가 맞는 음식인지 알 수 없으므로, lexical 결과와 합쳐 벡터 결과와 함께 순위를 정합니다.
+                candidates.append(rrf_fuse(
+                    [[_document(index, doc_id) for doc_id in doc_ids], [_document(index, doc_id) for doc_id, _ in results]],
+                    top_k=HYBRID_CANDIDATES,
+                ))
+                pending.append(i)
+                paths["hybrid"] += 1
+                continue
+
+            if index.confident(query, results):
+                candidates.append([_document(index, doc_id) for doc_id, _ in results])
+                paths["lexical"] += 1
+                continue
+
+            match, doc_ids = fuzzy.lookup(query, k=RETRIEVER_TOP_K)
+            if match != "miss":
+                candidates.append([_document(index, doc_id) for doc_id in doc_ids])
+                paths["fuzzy"] += 1
+            else:
+                candidates.append([_document(index, doc_id) for doc_id, _ in results])
+                paths["hybrid"] += 1
+            pending.append(i)
+
+    for path, count in paths.items():
+        RETRIEVER_PATH.labels(path=path).inc(count)
+    return candidates, pending
+
+
+def _merge(candidates: list, pending: list, vector_results: list) -> list:
+    results = [documents[:RETRIEVER_TOP_K] for documents in candidates]
+    for i, documents in zip(pending, vector_results):
+        results[i] = rrf_fuse([candidates[i], documents])
+    return results
+
+
+def hybrid_search(queries: list, vector_search: Callable[[list], list]) -> list:
+    """
+    검색어 목록을 검색하여, 검색어마다 Document 목록을 반환합니다.
+
+    Args:
+        queries: 음식 이름 목록
+        vector_search: 검색어 목록 -> 검색어 별 Document 목록 (임베딩은 한 번에 요청해야 합니다.)
+    """
+    candidates, pending = _local(queries)
+
+    vector_results = vector_search([queries[i] for i in pending]) if pending else []
+    return _merge(candidates, pending, vector_results)
+
+
+async def ahybrid_search(queries: list, vector_search: Callable[[list], Awaitable[list]]) -> list:
+    """hybrid_search의 비동기 버전입니다."""
+    candidates, pending = _local(queries)
+
+    vector_results = await vector_search([queries[i] for i in pending]) if pending else []
+    return _merge(candidates, pending, vector_results)
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, asdict
+from typing import Iterator
+
+from ..settings import FOOD_DATA_PATH, INGEST_BATCH_SIZE, INGEST_CONCURRENCY, INGEST_RETRIES
+
+## 음식 영양 성분 벡터DB(chroma_db) 적재
+# * 원본 JSONL이 바뀌어도 바뀐 행만 다시 임베딩합니다. (전체 5,676행을 매번 임베딩하지 않습니다.)
+# * 작업순서:
+#   1. JSONL을 한 줄씩 읽어 행 내용의 hash(sha1)를 문서 id로 사용합니다. (내용이 같은 중복 행은 한 번만 넣습니다.)
+#   2. collection에 이미 있는 id는 건너뛰고, 새 id만 batch로 묶어 임베딩합니다.
+#      - 동시에 보내는 요청은 concurrency개로 제한하고, 실패한 요청은 지수 backoff로 재시도합니다.
+#      - 임베딩이 끝난 batch는 바로 upsert하므로, 중간에 실패해도 다시 실행하면 남은 행만 처리합니다.
+#   3. 원본에서 사라졌거나 내용이 바뀐 행의 이전 id는 collection에서 삭제합니다.
+# * page_content는 식품명, metadata는 원본 행 그대로입니다. (hybrid.py의 lexical 결과와 같은 형식)
+# * 이전 collection에서 옮겨오기(migration)
+#   - 이 명령 이전에 만든 collection은 id가 content hash가 아니고 page_content 형식도 다릅니다.
+#     그래서 처음 실행할 때 전체 행(5,676행)을 다시 임베딩하고, 이전 id는 모두 삭제합니다.
+#   - 비용: passage 임베딩 5,676건 = 요청 ceil(5,676 / INGEST_BATCH_SIZE)회 (기본 57회)입니다.
+#     이후 실행에서는 바뀐 행만 임베딩합니다.
+#   - 이전 id는 모든 batch가 성공한 뒤에만 삭제합니다. 그래서 적재 중에는 이전 문서와 새 문서가 함께 있습니다.
+#     worker는 적재가 끝난 뒤 컴파일하는 mmap 파일을 읽으므로, 그동안 검색 결과에는 영향이 없습니다.
+#   - --dry-run으로 먼저 실행하면 다시 임베딩할 행 수와 이전 형식의 행 수(legacy)를 확인할 수 있습니다.
+
+# 재시도 간격(초): BACKOFF_SECONDS * 2 ** (시도 횟수 - 1)
+BACKOFF_SECONDS = 1.0
+# content_hash()로 만든 문서 id (이 형식이 아니면 이전 방식으로 적재한 문서입니다.)
+HASH_ID = re.compile(r"[0-9a-f]{40}")
+
+
+def content_hash(row: dict) -> str:
+    return hashlib.sha1(json.dumps(row, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def iter_rows(path: str = FOOD_DATA_PATH) -> Iterator[tuple]:
+    """(문서 id, 행)을 한 줄씩 반환합니다. 내용이 같은 행은 처음 한 번만 반환합니다."""
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            doc_id = content_hash(row)
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            yield doc_id, row
+
+
+def _metadata(row: dict) -> dict:
+    # Chroma metadata에는 None을 넣을 수 없습니다. ("1인분용량"이 없는 행)
+    return {key: value for key, value in row.items() if value is not None}
+
+
+def _batches(iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_passages(embeddings, texts: list, retries: int = INGEST_RETRIES) -> list:
+    """
+    passage 모델로 texts를 한 번의 요청으로 임베딩합니다. 실패하면 retries번까지 다시 요청합니다.
+    (UpstageEmbeddings.embed_documents는 요청을 10개씩 나누므로 client로 직접 요청합니다.)
+    """
+    params = embeddings._invocation_params
+    params["model"] = params["model"] + "-passage"
+
+    for attempt in range(retries + 1):
+        try:
+            data = embeddings.client.create(input=texts, **params).data
+            return [item.embedding for item in data]
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(BACKOFF_SECONDS * 2 ** attempt)
+
+
+@dataclass
+class IngestReport:
+    total: int = 0          # 원본의 (중복 제외) 행 수
+    unchanged: int = 0      # 이미 collection에 있어 건너뛴 행 수
+    embedded: int = 0       # 새로 임베딩하여 upsert한 행 수
+    failed: int = 0         # 재시도 후에도 임베딩하지 못한 행 수
+    deleted: int = 0        # collection에서 삭제한 이전 행 수
+    legacy: int = 0         # 이전 방식(content hash가 아닌 id)으로 적재되어 있던 행 수
+    seconds: float = 0.0
+
+    @property
+    def docs_per_s(self) -> float:
+        return self.embedded / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "seconds": round(self.seconds, 3), "docs_per_s": round(self.docs_per_s, 1)}
+
+
+def ingest(
+    collection,
+    embeddings,
+    path: str = FOOD_DATA_PATH,
+    batch_size: int = INGEST_BATCH_SIZE,
+    concurrency: int = INGEST_CONCURRENCY,
+    retries: int = INGEST_RETRIES,
+    dry_run: bool = False,
+) -> IngestReport:
+    """
+    Args:
+        collection: chromadb Collection (get/upsert/delete)
+        embeddings: UpstageEmbeddings (client.create로 직접 요청합니다.)
+        dry_run: True이면 임베딩/변경 없이 바뀐 행 수만 셉니다.
+    """
+    report = IngestReport()
+    start = time.perf_counter()
+
+    # 1. 이미 적재된 문서 id
+    existing = set(collection.get(include=[])["ids"])
+    report.legacy = sum(1 for doc_id in existing if not HASH_ID.fullmatch(doc_id))
+    current = set()
+
+    def changed_rows():
+        for doc_id, row in iter_rows(path):
+            report.total += 1
+            current.add(doc_id)
+            if doc_id in existing:
+                report.unchanged += 1
+            else:
+                yield doc_id, row
+
+    def upsert(batch: list, vectors: list) -> None:
+        collection.upsert(
+            ids=[doc_id for doc_id, _ in batch],
+            embeddings=vectors,
+            documents=[row['식품명'] for _, row in batch],
+            metadatas=[_metadata(row) for _, row in batch],
+        )
+        report.embedded += len(batch)
+
+    # 2. 바뀐 행만 batch로 임베딩 (진행 중인 요청은 concurrency개까지만 유지합니다.)
+    if dry_run:
+        report.embedded = sum(1 for _ in changed_rows())
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            running = {}
+
+            def collect(futures) -> None:
+                for future in futures:
+                    batch = running.pop(future)
+                    try:
+                        upsert(batch, future.result())
+                    except Exception:
+                        report.failed += len(batch)
+
+            for batch in _batches(changed_rows(), batch_size):
+                if len(running) >= concurrency:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    collect(done)
+                texts = [row['식품명'] for _, row in batch]
+                running[executor.submit(embed_passages, embeddings, texts, retries)] = batch
+            collect(list(running))
+
+    # 3. 원본에 없는 이전 행 삭제 (임베딩에 실패한 batch가 있으면 이전 행을 남겨둡니다.)
+    stale = list(existing - current)
+    if stale and not report.failed:
+        if not dry_run:
+            collection.delete(ids=stale)
+        report.deleted = len(stale)
+
+    report.seconds = time.perf_counter() - start
+    return report
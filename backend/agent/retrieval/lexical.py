@@ -0,0 +1,98 @@
+import json
+import math
+import re
+from collections import defaultdict
+from typing import Optional
+
+from ..settings import FOOD_DATA_PATH
+
+## 음식 이름 lexical 검색 색인 (BM25)
+# * 식품명은 "토마토_방울토마토_생것"처럼 '_'로 구분된 짧은 한국어 이름이므로, 형태소 분석 대신 문자 n-gram을 씁니다.
+# * 작업순서:
+#   1. 식품명을 '_'와 공백으로 나눈 segment마다 문자 bigram과 segment 전체를 token으로 만듭니다.
+#   2. token -> [(문서 번호, 빈도)] 역색인과 문서 길이로 BM25 점수를 계산합니다.
+#   3. 상위 문서의 segment에 검색어의 모든 단어가 있으면 confident로 보고, 벡터 검색(임베딩 요청)을 생략합니다.
+
+# BM25 parameter
+K1 = 1.2
+B = 0.75
+
+
+def segments(text: str) -> list:
+    """'_'와 공백으로 나눈 segment 목록. (괄호 안의 제조사 표기 등은 공백과 같이 취급합니다.)"""
+    return [segment for segment in re.split(r"[_\s()\[\],/]+", text.lower()) if segment]
+
+
+def compact(text: str) -> str:
+    return "".join(segments(text))
+
+
+def tokenize(text: str, query: bool = False) -> list:
+    tokens = []
+    words = segments(text)
+    # 검색어는 띄어 쓴 단어를 붙인 형태("삼겹살 구이" -> "삼겹살구이")로도 segment와 비교합니다.
+    if query and len(words) > 1:
+        tokens.append(f"#{''.join(words)}")
+    for segment in words:
+        # segment 전체가 일치하면 bigram보다 더 많은 점수를 받도록 segment 자체도 token으로 넣습니다.
+        tokens.append(f"#{segment}")
+        if len(segment) == 1:
+            tokens.append(segment)
+        tokens.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+    return tokens
+
+
+class LexicalIndex:
+    """식품명 BM25 색인. rows는 원본 JSONL의 각 행(메타데이터)입니다."""
+
+    def __init__(self, rows: list):
+        self.rows = rows
+        self.segments = [set(segments(row.get('식품명', ''))) for row in rows]
+        self.postings = defaultdict(list)
+        self.lengths = []
+
+        for doc_id, row in enumerate(rows):
+            # "토마토_흑토마토"처럼 같은 글자가 반복된 이름이 유리하지 않도록 빈도는 0/1로만 셉니다.
+            tokens = set(tokenize(row.get('식품명', '')))
+            self.lengths.append(len(tokens))
+            for token in tokens:
+                self.postings[token].append((doc_id, 1))
+
+        self.average_length = sum(self.lengths) / max(len(self.lengths), 1)
+        self.idf = {
+            token: math.log(1 + (len(rows) - len(posting) + 0.5) / (len(posting) + 0.5))
+            for token, posting in self.postings.items()
+        }
+
+    @classmethod
+    def load(cls, path: str = FOOD_DATA_PATH) -> "LexicalIndex":
+        with open(path, encoding="utf-8") as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    def search(self, query: str, k: int = 10) -> list:
+        """BM25 점수 상위 k개의 (문서 번호, 점수) 목록을 반환합니다."""
+        scores = defaultdict(float)
+        for token in set(tokenize(query, query=True)):
+            idf = self.idf.get(token)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[token]:
+                norm = K1 * (1 - B + B * self.lengths[doc_id] / self.average_length)
+                scores[doc_id] += idf * tf * (K1 + 1) / (tf + norm)
+
+        # 점수가 같으면 이름이 짧은(더 일반적인) 음식을 앞에 둡니다.
+        return sorted(scores.items(), key=lambda item: (-item[1], self.lengths[item[0]]))[:k]
+
+    def confident(self, query: str, results: list) -> bool:
+        """
+        가장 점수가 높은 음식의 이름에 검색어의 모든 단어가 segment로 그대로 있으면 True. (벡터 검색 생략 조건)
+        부분 문자열만 겹치는 경우("콜라" - "쇼콜라")는 벡터 검색과 합칩니다.
+        """
+        if not results:
+            return False
+        words = segments(query)
+        names = self.segments[results[0][0]]
+        return bool(words) and (all(word in names for word in words) or compact(query) in names)
+
+    def row(self, doc_id: int) -> Optional[dict]:
+        return self.rows[doc_id] if 0 <= doc_id < len(self.rows) else None
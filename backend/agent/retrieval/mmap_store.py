@@ -0,0 +1,191 @@
+import json
+import os
+import struct
+import tempfile
+import threading
+from typing import Iterable, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from ..settings import VECTOR_STORE_PATH
+
+## 읽기 전용 memory-mapped 영양 성분 vector store
+# * Chroma client는 worker마다 색인을 메모리에 따로 올립니다. 대신 벡터를 하나의 binary 파일로 컴파일하고
+#   np.memmap으로 열어서, 모든 worker가 OS page cache의 한 벌을 공유하게 합니다.
+# * 작업순서:
+#   1. compile_collection(): Chroma collection의 벡터/문서/메타데이터를 파일 하나로 씁니다.
+#      임시 파일에 쓴 뒤 os.replace()로 바꾸므로, 읽는 쪽은 항상 완전한 파일만 봅니다.
+#   2. MmapVectorStore: 검색할 때마다 파일의 (inode, mtime)을 확인하여 다시 컴파일되었으면 새 파일을 엽니다.
+#      (이전 파일을 열고 있던 검색은 이전 mapping으로 끝까지 실행됩니다.)
+#   3. 검색은 float32 행렬 전체와의 brute-force 거리 계산입니다. (5,676 x 4096 행렬곱, 검색어 당 수 ms)
+#   4. from_texts(): Chroma 없이 텍스트를 바로 임베딩하여 파일을 만듭니다. (테스트, benchmark용)
+# * 파일 형식: MAGIC | header 길이(uint64) | header(JSON: count, dim, space, ids, documents, metadatas)
+#             | 64byte 정렬 padding | 제곱 norm float32[count] | 벡터 float32[count, dim]
+
+MAGIC = b"NUTRVEC1"
+ALIGNMENT = 64
+
+
+def write_store(path: str, ids: list, documents: list, metadatas: list, vectors, space: str = "l2") -> None:
+    """벡터와 메타데이터를 파일 하나로 쓰고, 기존 파일을 원자적으로 교체합니다."""
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+    header = json.dumps({
+        "count": len(ids),
+        "dim": matrix.shape[1],
+        "space": space,
+        "ids": list(ids),
+        "documents": list(documents),
+        "metadatas": list(metadatas),
+    }, ensure_ascii=False).encode("utf-8")
+
+    start = len(MAGIC) + 8 + len(header)
+    padding = -start % ALIGNMENT
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        f.write(b"\0" * padding)
+        f.write(np.einsum("ij,ij->i", matrix, matrix).astype(np.float32).tobytes())
+        f.write(matrix.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def compile_collection(collection, path: str = VECTOR_STORE_PATH) -> int:
+    """Chroma collection 전체를 mmap 파일로 컴파일합니다. 컴파일한 문서 수를 반환합니다."""
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+    write_store(
+        path,
+        data["ids"],
+        [document or "" for document in data["documents"]],
+        [metadata or {} for metadata in data["metadatas"]],
+        np.asarray(data["embeddings"], dtype=np.float32),
+        space=space,
+    )
+    return len(data["ids"])
+
+
+class _Mapping:
+    """파일 하나를 연 결과. (header + memmap 행렬)"""
+
+    def __init__(self, path: str):
+        stat = os.stat(path)
+        self.signature = (stat.st_ino, stat.st_mtime_ns)
+
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path}는 영양 성분 vector store 파일이 아닙니다.")
+            (length,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(length).decode("utf-8"))
+
+        start = len(MAGIC) + 8 + length
+        start += -start % ALIGNMENT
+        count, dim = header["count"], header["dim"]
+
+        self.space = header["space"]
+        self.documents = [
+            Document(id=doc_id, page_content=document, metadata=metadata)
+            for doc_id, document, metadata in zip(header["ids"], header["documents"], header["metadatas"])
+        ]
+        self.norms = np.memmap(path, dtype=np.float32, mode="r", offset=start, shape=(count,))
+        self.matrix = np.memmap(path, dtype=np.float32, mode="r", offset=start + 4 * count, shape=(count, dim))
+
+    def distances(self, queries: np.ndarray) -> np.ndarray:
+        """(검색어 수, 문서 수) 거리 행렬. 작을수록 가깝습니다. (Chroma의 distance 공간과 같은 순위)"""
+        products = queries @ self.matrix.T
+        if self.space == "ip":
+            return -products
+        if self.space == "cosine":
+            return -products / np.sqrt(np.maximum(self.norms, 1e-12))
+        return self.norms - 2 * products
+
+
+class MmapVectorStore(VectorStore):
+    """compile_collection()으로 만든 파일을 읽는 읽기 전용 vector store."""
+
+    def __init__(self, path: str = VECTOR_STORE_PATH, embedding: Optional[Embeddings] = None):
+        self.path = path
+        self.embedding = embedding
+        self._lock = threading.Lock()
+        self._mapping = _Mapping(path)
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding
+
+    def _current(self) -> _Mapping:
+        # 파일이 다시 컴파일되었으면(inode/mtime 변경) 새 파일을 엽니다.
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self._mapping
+        if (stat.st_ino, stat.st_mtime_ns) != self._mapping.signature:
+            with self._lock:
+                if (stat.st_ino, stat.st_mtime_ns) != self._mapping.signature:
+                    self._mapping = _Mapping(self.path)
+        return self._mapping
+
+    def __len__(self) -> int:
+        return len(self._current().documents)
+
+    def search_many(self, vectors: list, k: int = 4) -> list:
+        """벡터 목록을 한 번의 행렬곱으로 검색하여 벡터 별 Document 목록을 반환합니다."""
+        mapping = self._current()
+        if not vectors or not mapping.documents:
+            return [[] for _ in vectors]
+
+        distances = mapping.distances(np.asarray(vectors, dtype=np.float32))
+        k = min(k, distances.shape[1])
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(distances, top):
+            ordered = candidates[np.argsort(row[candidates], kind="stable")]
+            results.append([mapping.documents[i] for i in ordered])
+        return results
+
+    def similarity_search_by_vector(self, embedding: list, k: int = 4, **kwargs) -> list:
+        return self.search_many([embedding], k=k)[0]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list:
+        if self.embedding is None:
+            raise ValueError("검색어를 임베딩하려면 embedding이 필요합니다.")
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k=k)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: Iterable[str],
+        embedding: Embeddings,
+        metadatas: Optional[list] = None,
+        *,
+        ids: Optional[list] = None,
+        path: Optional[str] = None,
+        space: str = "l2",
+        **kwargs,
+    ) -> "MmapVectorStore":
+        """
+        texts를 임베딩하여 write_store()로 파일을 만들고 엽니다. (테스트, benchmark용)
+        path가 없으면 임시 파일에 쓰고, 연 뒤에 바로 지웁니다. (mapping은 store가 살아 있는 동안 유지됩니다.)
+        """
+        texts = list(texts)
+        ids = [str(i) for i in range(len(texts))] if ids is None else list(ids)
+        metadatas = [{} for _ in texts] if metadatas is None else list(metadatas)
+        vectors = np.asarray(embedding.embed_documents(texts), dtype=np.float32)
+
+        temporary = path is None
+        if temporary:
+            fd, path = tempfile.mkstemp(prefix="nutrition_vectors_", suffix=".bin")
+            os.close(fd)
+        try:
+            write_store(path, ids, texts, metadatas, vectors, space=space)
+            return cls(path, embedding=embedding)
+        finally:
+            if temporary:
+                os.unlink(path)
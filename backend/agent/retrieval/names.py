@@ -0,0 +1,116 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+## 음식 이름 정확/접두어 일치 색인
+# * "쌀밥", "사과"처럼 식품명과 거의 같은 검색어는 BM25나 벡터 검색 없이 바로 찾습니다.
+# * 작업순서:
+#   1. 식품명("토마토_방울토마토_생것")을 '_'로만 나누고, segment 안의 공백을 없애 key를 만듭니다.
+#      ("계란 덮밥"은 "계란"과 "덮밥"이 아닌 "계란덮밥" 하나의 segment입니다.)
+#      - 앞에서부터 이어 붙인 key(head): "토마토", "토마토방울토마토", "토마토방울토마토생것"
+#      - 첫 번째가 아닌 segment: "방울토마토", "생것" (단, 너무 많은 음식에 붙는 상태 표현은 제외)
+#   2. key -> 문서 번호 목록(정확 일치)과, 정렬된 head key 배열(접두어 일치)을 만듭니다.
+#      정렬된 배열에서 bisect로 접두어 범위를 찾는 것은 trie의 접두어 탐색과 같은 결과를 줍니다.
+#   3. 검색어를 같은 방식으로 정규화하여 아래 순서로 후보를 모읍니다.
+#      - head 정확 일치: "사과" -> "사과_생것", "사과_감홍_생것", "사과_동결건조" (덜 가공된 이름 먼저)
+#      - head 접두어 일치: "삼겹살" -> "삼겹살구이"
+#      - 뒤쪽 segment 정확 일치: "삼겹살" -> "김치찌개_삼겹살" (다른 음식의 재료인 경우가 많으므로 마지막에 봅니다.)
+#   4. 검색어가 식품명 하나(생것 표기 제외)와 그대로 같을 때만 "exact"로 바로 반환합니다. ("쌀밥", "사과" -> "사과_생것")
+#      나머지("계란" -> "볶음밥_계란", "김치" -> "김치국_김치_콩나물")는 "candidate"로 반환하여
+#      hybrid.py가 벡터 검색 결과와 합쳐 순위를 정합니다.
+
+# 이 수보다 많은 음식에 붙는 segment("생것", "말린것" 등)는 단독 key로 쓰지 않습니다.
+MAX_SEGMENT_DOCS = 50
+# 접두어 검색을 허용하는 검색어의 최소 글자 수 (두 글자는 "콜라" -> "콜라겐"처럼 엉뚱한 음식과 겹치기 쉽습니다.)
+MIN_PREFIX_LENGTH = 3
+# 가공하지 않은 상태를 뜻하는 segment. ("사과_생것"은 "사과"와 같은 음식으로 보고 "사과_동결건조"보다 앞에 둡니다.)
+RAW_SEGMENTS = {"생것"}
+
+
+def name_segments(text: str) -> list:
+    """식품명(또는 검색어)을 '_'로 나누고 segment 안의 공백을 없앱니다."""
+    return [segment for segment in (re.sub(r"\s+", "", part.lower()) for part in text.split("_")) if segment]
+
+
+def name_key(text: str) -> str:
+    return "".join(name_segments(text))
+
+
+class NameIndex:
+
+    def __init__(self, rows: list):
+        self.rows = rows
+        heads, tails = defaultdict(list), defaultdict(list)
+
+        for doc_id, row in enumerate(rows):
+            parts = name_segments(row.get('식품명', ''))
+            for i in range(len(parts)):
+                # head key: (key 뒤에 붙은 가공/품종 segment 수, 생것이 아닌지, 이름 길이)가 작을수록 대표적인 음식입니다.
+                rest = parts[i + 1:]
+                extra = sum(part not in RAW_SEGMENTS for part in rest)
+                raw = any(part in RAW_SEGMENTS for part in rest)
+                heads["".join(parts[:i + 1])].append((extra, not raw, len(parts), doc_id))
+                if i > 0:
+                    tails[parts[i]].append((i, len(parts), doc_id))
+
+        self.heads = {key: sorted(set(entries)) for key, entries in heads.items()}
+        # head로도 쓰이는 key는 문서가 많아도 남겨 둡니다.
+        self.tails = {
+            key: [entry[-1] for entry in sorted(set(entries))]
+            for key, entries in tails.items() if key in self.heads or len(entries) <= MAX_SEGMENT_DOCS
+        }
+        # key -> 문서 번호 목록 (head 일치를 먼저 둡니다. fuzzy.py가 후보 key 목록으로 사용합니다.)
+        self.exact = {}
+        for key in set(self.heads) | set(self.tails):
+            doc_ids = [entry[-1] for entry in self.heads.get(key, [])] + self.tails.get(key, [])
+            self.exact[key] = list(dict.fromkeys(doc_ids))
+        self.sorted_heads = sorted(self.heads)
+
+    def _head_prefix(self, key: str) -> list:
+        """key로 시작하는 (key와 다른) head key의 문서를 짧은 key부터 반환합니다."""
+        candidates = []
+        start = bisect_left(self.sorted_heads, key)
+        for candidate in self.sorted_heads[start:]:
+            if not candidate.startswith(key):
+                break
+            if candidate != key:
+                candidates.append((len(candidate), candidate))
+        doc_ids = []
+        for _, candidate in sorted(candidates):
+            doc_ids.extend(entry[-1] for entry in self.heads[candidate])
+        return doc_ids
+
+    def _unique(self, key: str) -> bool:
+        """key와 그대로 같은 식품명(생것 표기 제외)이 한 가지뿐이면 True (출처만 다른 같은 이름의 행은 하나로 봅니다.)"""
+        names = {self.rows[doc_id].get('식품명', '') for extra, _, _, doc_id in self.heads.get(key, []) if extra == 0}
+        return len(names) == 1
+
+    def lookup(self, query: str, k: int = 3) -> tuple:
+        """
+        Returns:
+            (match, 문서 번호 목록): match는 "exact", "candidate", "miss" 중 하나입니다.
+            "exact"만 바로 사용할 수 있는 결과이고, "candidate"는 벡터 검색과 합쳐야 하는 후보입니다.
+            같은 식품명의 문서(출처만 다른 행)는 하나만 반환합니다.
+        """
+        key = name_key(query)
+        if not key:
+            return "miss", []
+
+        ranked = [entry[-1] for entry in self.heads.get(key, [])]
+        if len(key) >= MIN_PREFIX_LENGTH:
+            ranked.extend(self._head_prefix(key))
+        ranked.extend(self.tails.get(key, []))
+
+        doc_ids, names = [], set()
+        for doc_id in ranked:
+            name = self.rows[doc_id].get('식품명', '')
+            if name in names:
+                continue
+            names.add(name)
+            doc_ids.append(doc_id)
+            if len(doc_ids) >= k:
+                break
+
+        if not doc_ids:
+            return "miss", []
+        return ("exact" if self._unique(key) else "candidate"), doc_ids
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import re
+from typing import Optional, Sequence
+
+import numpy as np
+
+from ..lazy import lazy
+from ..settings import FOOD_DATA_PATH, NUTRITION_TABLE_PATH
+
+## 음식 영양 성분 숫자 표 (NumPy structured array)
+# * 원본 JSONL의 값은 모두 문자열("4.26", "1개 (150g)")이므로, 탄수화물 계산을 LLM이 하지 않도록 숫자로 바꿔 둡니다.
+# * 작업순서:
+#   1. 행마다 영양 성분(기준량 당)과 기준량/1인분용량/개당용량을 g 단위 float32로 변환합니다.
+#      - "1개 (150g)" -> 1인분 150g, 1인분 개수 1 / "1/2컵 (100g)" -> 1인분 100g, 1인분 개수 0.5
+#      - 1인분용량이 없으면 기준량을, 개당용량이 없으면 1인분용량 / 1인분 개수를 사용합니다.
+#   2. 표는 .npz 파일로 저장하고, 원본 JSONL의 hash가 같으면 다시 변환하지 않고 읽습니다.
+#   3. 문서 번호(food_id)는 원본 JSONL의 행 번호입니다. (lexical.py의 문서 번호와 같습니다.)
+#      같은 식품명이 값이 다른 여러 행에 있으므로(1,026개 이름), 이름이 아니라 검색된 문서로 food_id를 찾습니다. (resolve)
+#      carbs()는 (food_id, 양) 목록 전체의 탄수화물량을 한 번의 배열 연산으로 계산합니다.
+
+DTYPE = np.dtype([
+    ("energy", "f4"),         # kcal / 기준량
+    ("carbs", "f4"),          # g / 기준량
+    ("protein", "f4"),        # g / 기준량
+    ("fat", "f4"),            # g / 기준량
+    ("standard_g", "f4"),     # 기준량(g)
+    ("serving_g", "f4"),      # 1인분용량(g)
+    ("serving_count", "f4"),  # 1인분의 개수 ("10개 (150g)" -> 10, 없으면 NaN)
+    ("piece_g", "f4"),        # 개당용량(g)
+])
+
+COLUMNS = {
+    "energy": '에너지(kcal)',
+    "carbs": '탄수화물(g)',
+    "protein": '단백질(g)',
+    "fat": '지방(g)',
+}
+
+GRAMS = re.compile(r"([\d.]+)\s*(?:g|ml|mL)")
+COUNT = re.compile(r"^\s*(\d+(?:\.\d+)?)(?:\s*/\s*(\d+))?\s*[가-힣]")
+
+
+def parse_grams(text) -> Optional[float]:
+    """'1개 (150g)', '100g', '200ml' 같은 용량 문자열에서 g(ml) 값을 꺼냅니다."""
+    matches = GRAMS.findall(str(text or ""))
+    if not matches:
+        return None
+    try:
+        return float(matches[-1])
+    except ValueError:
+        return None
+
+
+def parse_count(text) -> Optional[float]:
+    """'10개 (150g)', '1/2컵 (100g)' 같은 용량 문자열에서 개수를 꺼냅니다."""
+    match = COUNT.match(str(text or ""))
+    if not match:
+        return None
+    count = float(match.group(1))
+    return count / float(match.group(2)) if match.group(2) else count
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class NutritionTable:
+    """
+    음식 영양 성분 숫자 표.
+    table은 DTYPE의 structured array, names는 같은 순서의 식품명 목록입니다.
+    """
+
+    def __init__(self, table: np.ndarray, names: Sequence[str], source: str = ""):
+        self.table = table
+        self.names = list(names)
+        self.source = source
+        # 식품명 -> 그 이름의 모든 food_id
+        self._ids = {}
+        for food_id, name in enumerate(self.names):
+            self._ids.setdefault(name, []).append(food_id)
+
+    # 1. 변환
+    @classmethod
+    def from_rows(cls, rows: Sequence[dict], source: str = "") -> "NutritionTable":
+        table = np.zeros(len(rows), dtype=DTYPE)
+        for food_id, row in enumerate(rows):
+            standard = parse_grams(row.get('기준량')) or 100.0
+            serving = parse_grams(row.get('1인분용량')) or standard
+            count = parse_count(row.get('1인분용량'))
+            piece = parse_grams(row.get('개당용량')) or (serving / count if count else np.nan)
+
+            table[food_id] = (
+                *(_number(row.get(key)) for key in COLUMNS.values()),
+                standard, serving, count if count else np.nan, piece,
+            )
+        return cls(table, [row.get('식품명', '') for row in rows], source)
+
+    @classmethod
+    def build(cls, path: str = FOOD_DATA_PATH) -> "NutritionTable":
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        return cls.from_rows(rows, source=_digest(path))
+
+    # 2. 저장/로드
+    def save(self, path: str = NUTRITION_TABLE_PATH) -> None:
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, table=self.table, names=np.array(self.names), source=np.array(self.source))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = FOOD_DATA_PATH, table_path: Optional[str] = NUTRITION_TABLE_PATH) -> "NutritionTable":
+        """저장된 표가 원본과 같으면(hash 비교) 읽고, 아니면 원본에서 다시 변환하여 저장합니다."""
+        source = _digest(path)
+        if table_path and os.path.exists(table_path):
+            with np.load(table_path) as data:
+                if str(data["source"]) == source:
+                    return cls(data["table"], data["names"].tolist(), source)
+
+        nutrition_table = cls.build(path)
+        if table_path:
+            try:
+                nutrition_table.save(table_path)
+            except OSError:
+                pass  # 읽기 전용 배포 환경에서는 매번 변환합니다. (수십 ms)
+        return nutrition_table
+
+    # 3. 조회/계산
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def resolve(self, metadatas: Sequence[dict]) -> np.ndarray:
+        """
+        검색된 문서의 메타데이터마다 food_id를 찾습니다. 찾지 못하면 -1입니다.
+        - lexical/이름 색인의 문서: 메타데이터의 food_id(원본 행 번호)를 사용합니다. (hybrid.py)
+        - 벡터DB의 문서: 같은 이름의 행 중 영양 성분/용량 값이 문서와 같은 행을 찾습니다.
+        """
+        food_ids = np.full(len(metadatas), -1, dtype=np.int64)
+        for i, metadata in enumerate(metadatas):
+            name = metadata.get('식품명', '')
+            food_id = metadata.get('food_id')
+            if isinstance(food_id, int) and 0 <= food_id < len(self.names) and self.names[food_id] == name:
+                food_ids[i] = food_id
+                continue
+
+            candidates = self._ids.get(name)
+            if not candidates:
+                continue
+            row = NutritionTable.from_rows([metadata]).table[0]
+            for candidate in candidates:
+                if all(np.isclose(self.table[candidate][field], row[field], equal_nan=True) for field in DTYPE.names):
+                    food_ids[i] = candidate
+                    break
+        return food_ids
+
+    def lookup(self, metadatas: Sequence[dict]) -> tuple:
+        """
+        검색된 문서 목록의 (표, food_id 배열)을 반환합니다.
+        표에서 찾지 못한 문서(원본과 다른 벡터DB 등)가 있으면 메타데이터로 만든 표를 대신 반환합니다.
+        """
+        food_ids = self.resolve(metadatas)
+        if (food_ids < 0).any():
+            return NutritionTable.from_rows(metadatas), np.arange(len(metadatas))
+        return self, food_ids
+
+    def grams(self, food_ids, grams=None, servings=None, pieces=None) -> np.ndarray:
+        """
+        음식마다 먹은 양(g)을 반환합니다. grams, servings(인분), pieces(개) 중 하나를 food_ids와 같은 길이로 줍니다.
+        아무것도 주지 않으면 1인분으로 계산합니다.
+        """
+        rows = self.table[np.asarray(food_ids, dtype=np.int64)]
+        if grams is not None:
+            return np.asarray(grams, dtype=np.float64)
+        if pieces is not None:
+            piece_g = np.where(np.isnan(rows["piece_g"]), rows["serving_g"], rows["piece_g"])
+            return np.asarray(pieces, dtype=np.float64) * piece_g
+        amount = np.ones(len(rows)) if servings is None else np.asarray(servings, dtype=np.float64)
+        return amount * rows["serving_g"]
+
+    def carbs(self, food_ids, grams=None, servings=None, pieces=None) -> np.ndarray:
+        """
+        음식마다 탄수화물량(g)을 반환합니다. (기준량 당 탄수화물 * 먹은 양 / 기준량)
+        예) table.carbs([12, 40], servings=[1, 0.5]).sum() -> 한 끼의 탄수화물 합계
+        """
+        rows = self.table[np.asarray(food_ids, dtype=np.int64)]
+        return rows["carbs"] * self.grams(food_ids, grams, servings, pieces) / rows["standard_g"]
+
+
+# 표는 읽기 전용이므로 gunicorn --preload 시 master에서 만든 것을 모든 worker가 공유합니다.
+get_nutrition_table = lazy(NutritionTable.load, shared=True)
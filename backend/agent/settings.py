@@ -13,6 +13,8 @@ MONGODB_URI = os.environ.get("MONGODB_URI")
 LLM_MODEL_NAME = "gemini-2.5-flash"
 THINKING_MODEL_NAME = "gemini-2.5-pro"
 TEMPERATURE = 0.6
+# 운동/스트레스/질병 계수처럼 대화에서 규칙으로 찾지 못한 값만 추출하는 작은 모델
+EXTRACTION_MODEL_NAME = os.environ.get("EXTRACTION_MODEL_NAME", "gemini-2.5-flash-lite")
 
 # 개인 당뇨 관리 profile
 ISR = 6.5
@@ -25,3 +27,135 @@ PERSIST_DIRECTORY = os.path.join(BASE_DIR, 'agent', 'chroma_db')
 COLLECTION_NAME = 'nutrition_facts'
 QUERY_EMBEDDING_MODEL_NAME = 'solar-embedding-1-large-query'
 DOCUMENT_EMBEDDING_MODEL_NAME = 'solar-embedding-1-large-passage'
+# chroma_db를 컴파일한 읽기 전용 mmap 파일 (있으면 Chroma 대신 사용하며, 모든 worker가 page cache를 공유합니다.)
+VECTOR_STORE_PATH = os.environ.get("VECTOR_STORE_PATH") or os.path.join(BASE_DIR, 'agent', 'nutrition_vectors.bin')
+# 벡터DB에 들어 있는 음식 영양 성분 원본 데이터 (lexical 검색 색인을 만들 때 사용)
+FOOD_DATA_PATH = os.path.join(BASE_DIR, 'agent', 'food_data', 'refined_food_data_fixed_weight.jsonl')
+# 원본 데이터를 숫자로 변환한 영양 성분 표 (retrieval/nutrition_table.py, 원본이 바뀌면 다시 만듭니다.)
+NUTRITION_TABLE_PATH = os.environ.get("NUTRITION_TABLE_PATH") or os.path.join(BASE_DIR, 'agent', 'food_data', 'nutrition_table.npz')
+# 벡터DB 적재(ingest_nutrition 명령) 구성 정보
+# 임베딩 요청 1회에 보낼 문서 수(Upstage 최대 100), 동시에 보낼 요청 수, 실패 시 재시도 횟수
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 100))
+INGEST_CONCURRENCY = int(os.environ.get("INGEST_CONCURRENCY", 4))
+INGEST_RETRIES = int(os.environ.get("INGEST_RETRIES", 3))
+
+# Hybrid(BM25 + 벡터) 검색 구성 정보
+# 검색어 당 반환할 음식 수와, RRF로 합치기 전에 각 검색기에서 가져올 후보 수
+RETRIEVER_TOP_K = 3
+HYBRID_CANDIDATES = 10
+# Reciprocal Rank Fusion의 상수 k (score = sum(1 / (k + rank)))
+RRF_K = 60
+# 영양 성분 batch 검색 API(/api/chat/nutrition/) 요청 1회에 받을 최대 음식 수
+NUTRITION_BATCH_MAX_FOODS = 20
+# 영양 성분 도구 결과 형식: "compact"(음식 당 한 줄, 이미 보낸 음식은 생략) 또는 "verbose"(원본 값 여러 줄)
+NUTRITION_TOOL_OUTPUT = os.environ.get("NUTRITION_TOOL_OUTPUT", "compact")
+
+# 검색어 임베딩 캐시 구성 정보 (모든 worker가 같은 SQLite 파일을 공유합니다.)
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH") or os.path.join(BASE_DIR, 'agent', 'embedding_cache.sqlite')
+# 프로세스 내 LRU에 보관할 벡터 수와 SQLite 파일에 보관할 최대 벡터 수 (4096차원 벡터 하나에 16KB)
+EMBEDDING_CACHE_MEMORY_SIZE = int(os.environ.get("EMBEDDING_CACHE_MEMORY_SIZE", 1024))
+EMBEDDING_CACHE_MAX_ROWS = int(os.environ.get("EMBEDDING_CACHE_MAX_ROWS", 10000))
+
+
+# LangGraph checkpointer 구성 정보
+# CHECKPOINT_DB_URI가 없으면 Django와 같은 Postgres를, 그것도 없으면(개발 환경) SQLite 파일을 사용합니다.
+def _default_checkpoint_db_uri() -> str:
+    if os.environ.get("POSTGRES_HOST"):
+        return "postgresql://{user}:{password}@{host}:{port}/{db}".format(
+            user=os.environ.get("POSTGRES_USER", ""),
+            password=os.environ.get("POSTGRES_PASSWORD", ""),
+            host=os.environ.get("POSTGRES_HOST"),
+            port=os.environ.get("POSTGRES_PORT", "5432"),
+            db=os.environ.get("POSTGRES_DB", ""),
+        )
+    return os.path.join(BASE_DIR, 'agent', 'checkpoints.sqlite')
+
+CHECKPOINT_DB_URI = os.environ.get("CHECKPOINT_DB_URI") or _default_checkpoint_db_uri()
+CHECKPOINT_POOL_SIZE = int(os.environ.get("CHECKPOINT_POOL_SIZE", 4))
+# 프로세스 내 read-through 캐시에 보관할 최대 checkpoint 수
+CHECKPOINT_CACHE_SIZE = int(os.environ.get("CHECKPOINT_CACHE_SIZE", 256))
+# thread_id 당 남겨둘 최근 checkpoint 수 (prune_checkpoints가 실행될 때마다 압축합니다.)
+CHECKPOINT_KEEP_LAST = int(os.environ.get("CHECKPOINT_KEEP_LAST", 5))
+# 마지막 메시지 이후 이 시간이 지난 대화의 state는 삭제합니다.
+CHECKPOINT_TTL_HOURS = int(os.environ.get("CHECKPOINT_TTL_HOURS", 24 * 7))
+# prune_checkpoints --every 의 기본 실행 간격(초). (docker-compose.yml의 checkpoint-pruner 서비스)
+CHECKPOINT_PRUNE_INTERVAL = int(os.environ.get("CHECKPOINT_PRUNE_INTERVAL", 60 * 60))
+
+
+# Triage 로컬 분류기 구성 정보
+# 로컬 분류기의 confidence가 이 값 이상이면 LLM을 호출하지 않습니다.
+TRIAGE_CONFIDENCE_THRESHOLD = float(os.environ.get("TRIAGE_CONFIDENCE_THRESHOLD", 0.85))
+TRIAGE_MODEL_PATH = os.path.join(BASE_DIR, 'agent', 'nodes', 'triage_model.json')
+# 투여 의도 없이 알려준 혈당 수치는 이 값(mg/dL) 이상일 때만 교정(correction)으로 확신합니다. (고혈당 기준)
+TRIAGE_HIGH_GLUCOSE = int(os.environ.get("TRIAGE_HIGH_GLUCOSE", 180))
+
+
+# 대화 컨텍스트(token 예산) 구성 정보
+# 노드 별로 LLM에 보낼 대화 기록의 최대 token 수
+CONTEXT_TOKEN_BUDGETS = {
+    "information_node": int(os.environ.get("INFORMATION_TOKEN_BUDGET", 4000)),
+    "answer_node": int(os.environ.get("ANSWER_TOKEN_BUDGET", 6000)),
+}
+# 요약하지 않고 원문 그대로 유지하는 최근 턴 수
+CONTEXT_KEEP_TURNS = 3
+# 최근 턴 밖의 대화가 이만큼 쌓이면 요약에 접어 넣습니다.
+SUMMARY_TRIGGER_TOKENS = 1500
+# 지난 턴의 도구 결과는 앞부분 이 글자 수만 남깁니다.
+TOOL_RESULT_CONDENSE_CHARS = 300
+# 대화 창 밖으로 밀려난 영양 정보(state['nutrition_facts'])를 LLM에 다시 보낼 최대 음식 수
+NUTRITION_FACTS_CONTEXT_LIMIT = 10
+
+
+# 보정 계수 계산(factor_node) 구성 정보
+# 아침 시간대(한국 시간, [시작, 끝))와 이때 적용하는 인슐린 저항성 계수
+MORNING_HOURS = (6, 10)
+MORNING_FACTOR = 1.3
+# 스트레스 강도(상/중/하)에 따른 계수
+STRESS_FACTORS = {"상": 1.3, "중": 1.15, "하": 1.0}
+
+
+# IOB/COB 곡선(curves.py) 구성 정보
+# 인슐린 곡선: linear, exponential, biexponential
+INSULIN_CURVE = os.environ.get("INSULIN_CURVE", "linear")
+# linear: 인슐린 작용 시간(분)
+INSULIN_ACTION_MINUTES = 265.0
+# exponential: 반감기(분)
+INSULIN_HALF_LIFE_MINUTES = 120.0
+# biexponential: 흡수/소멸 시정수(분). (50, 110)이면 작용이 약 72분에 최고점입니다.
+INSULIN_BIEXPONENTIAL_MINUTES = (50.0, 110.0)
+# 탄수화물 곡선: linear, triangle
+CARB_CURVE = os.environ.get("CARB_CURVE", "linear")
+# linear: 탄수화물 흡수 속도(g/시간)
+DIGEST_SPEED = 20
+# triangle: 흡수가 끝나는 시간(분)
+CARB_ABSORPTION_MINUTES = 180.0
+
+
+# 혈당/주사 기록 snapshot(health.py) 구성 정보
+# factor_node는 이 시간(초)보다 오래된 snapshot이면 DB를 바로 조회합니다.
+HEALTH_SNAPSHOT_MAX_AGE = float(os.environ.get("HEALTH_SNAPSHOT_MAX_AGE", 60))
+# 백그라운드 갱신 방식: poll(주기 조회), watch(MongoDB change stream, replica set 필요), off(요청 시에만 조회)
+HEALTH_SNAPSHOT_MODE = os.environ.get("HEALTH_SNAPSHOT_MODE", "poll")
+# poll 방식의 조회 주기(초). HEALTH_SNAPSHOT_MAX_AGE보다 짧아야 요청이 DB를 기다리지 않습니다.
+HEALTH_SNAPSHOT_POLL_INTERVAL = float(os.environ.get("HEALTH_SNAPSHOT_POLL_INTERVAL", 20))
+# poll 방식은 새 기록만 조회하고, 이 주기(초)마다 전체를 다시 읽어 수정/삭제된 기록을 반영합니다.
+HEALTH_SNAPSHOT_FULL_REFRESH = float(os.environ.get("HEALTH_SNAPSHOT_FULL_REFRESH", 300))
+
+
+# 혈당 예측(forecast.py) 구성 정보
+# 예측 기간(시간)과 간격(분)
+FORECAST_HOURS = 4
+FORECAST_STEP_MINUTES = 5
+# 최근 이 시간(분) 안의 CGM 기록으로 추세(기울기)를 계산합니다. (1분 간격 CGM까지 고려하여 TREND_MINUTES + 1개를 읽습니다.)
+TREND_MINUTES = 30
+# 추세가 이어지는 정도(분). 추세의 영향은 이 시정수로 지수적으로 줄어듭니다.
+TREND_DECAY_MINUTES = 20
+# 새 혈당/주사 기록이 없어도 이 시간(초)이 지나면 예측을 다시 계산합니다.
+FORECAST_MAX_AGE = 300
+
+
+# 계측(metrics.py) 구성 정보
+# 대화 턴의 단계별 소요 시간을 ChatMessage.metrics에 저장할 비율 (0~1)
+METRICS_SAMPLE_RATE = float(os.environ.get("METRICS_SAMPLE_RATE", 0.1))
+# 설정하면 /metrics 요청에 "Authorization: Bearer <토큰>" 헤더가 필요합니다.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
@@ -0,0 +1,107 @@
+import unittest
+from unittest import mock
+
+from langgraph.checkpoint.base import empty_checkpoint
+
+from agent.checkpointer import build_checkpointer
+
+
+def config(thread_id: str, checkpoint_id: str = None) -> dict:
+    configurable = {"thread_id": thread_id, "checkpoint_ns": ""}
+    if checkpoint_id:
+        configurable["checkpoint_id"] = checkpoint_id
+    return {"configurable": configurable}
+
+
+class CachedCheckpointSaverTests(unittest.TestCase):
+    """SqliteSaver(:memory:)를 감싼 CachedCheckpointSaver의 캐시, 최신 id 조회, 압축을 확인합니다."""
+
+    def setUp(self):
+        self.checkpointer = build_checkpointer(":memory:")
+        self.checkpointer.setup()
+
+    def put(self, thread_id: str, count: int) -> list:
+        """checkpoint를 count개 저장하고 id 목록을 반환합니다. (마지막 id가 최신)"""
+        ids = []
+        parent = None
+        for step in range(count):
+            checkpoint = empty_checkpoint()
+            checkpoint["channel_values"] = {"step": step}
+            checkpoint["channel_versions"] = {"step": str(step + 1)}
+            saved = self.checkpointer.put(
+                config(thread_id, parent), checkpoint, {"step": step}, {"step": str(step + 1)},
+            )
+            parent = saved["configurable"]["checkpoint_id"]
+            self.checkpointer.put_writes(saved, [("step", step)], task_id=f"task{step}")
+            ids.append(parent)
+        return ids
+
+    def checkpoint_ids(self, thread_id: str) -> list:
+        return [item.config["configurable"]["checkpoint_id"] for item in self.checkpointer.list(config(thread_id))]
+
+    def test_latest_checkpoint_lookup(self):
+        self.assertIsNone(self.checkpointer.get_tuple(config("empty")))
+        ids = self.put("a", 3)
+        self.put("b", 1)
+
+        latest = self.checkpointer.get_tuple(config("a"))
+        self.assertEqual(latest.config["configurable"]["checkpoint_id"], ids[-1])
+        self.assertEqual(latest.checkpoint["channel_values"], {"step": 2})
+        self.assertEqual(self.checkpointer._latest_checkpoint_id("a", ""), ids[-1])
+
+    def test_cache_is_bounded_lru(self):
+        self.checkpointer.maxsize = 2
+        ids = self.put("a", 3)
+        for checkpoint_id in ids:
+            self.checkpointer.get_tuple(config("a", checkpoint_id))
+        # 가장 오래 사용하지 않은 첫 번째 checkpoint가 빠집니다.
+        self.assertEqual([key[2] for key in self.checkpointer._cache], ids[1:])
+
+        with mock.patch.object(self.checkpointer.saver, "get_tuple", wraps=self.checkpointer.saver.get_tuple) as get_tuple:
+            self.checkpointer.get_tuple(config("a", ids[1]))
+            self.assertEqual(get_tuple.call_count, 0)
+            self.checkpointer.get_tuple(config("a", ids[0]))
+            self.assertEqual(get_tuple.call_count, 1)
+        self.assertEqual([key[2] for key in self.checkpointer._cache], [ids[1], ids[0]])
+
+    def test_cached_value_is_copied(self):
+        (checkpoint_id,) = self.put("a", 1)
+        first = self.checkpointer.get_tuple(config("a"))
+        first.checkpoint["channel_values"]["step"] = 100
+        self.assertEqual(self.checkpointer.get_tuple(config("a", checkpoint_id)).checkpoint["channel_values"], {"step": 0})
+
+    def test_put_does_not_compact(self):
+        self.put("a", 12)
+        self.assertEqual(len(self.checkpoint_ids("a")), 12)
+
+    def test_compact_keeps_latest(self):
+        ids = self.put("a", 8)
+        self.checkpointer.get_tuple(config("a", ids[0]))
+        self.checkpointer.compact("a", keep=3)
+
+        self.assertEqual(self.checkpoint_ids("a"), ids[:-4:-1])
+        self.assertEqual(self.checkpointer._cache, {})
+        with self.checkpointer.saver.cursor() as cur:
+            cur.execute("SELECT DISTINCT checkpoint_id FROM writes WHERE thread_id = 'a'")
+            self.assertEqual(sorted(row[0] for row in cur.fetchall()), sorted(ids[-3:]))
+
+    def test_compact_all_only_touches_oversized_threads(self):
+        self.put("long", 6)
+        self.put("short", 2)
+        with mock.patch.object(self.checkpointer, "compact", wraps=self.checkpointer.compact) as compact:
+            self.assertEqual(self.checkpointer.compact_all(keep=3), 1)
+        compact.assert_called_once_with("long", "", 3)
+        self.assertEqual(len(self.checkpoint_ids("long")), 3)
+        self.assertEqual(self.checkpointer.compact_all(keep=3), 0)
+
+    def test_evicted_threads_are_not_stored(self):
+        self.put("a", 2)
+        self.put("b", 2)
+        self.assertEqual(self.checkpointer.stored_thread_ids(), {"a", "b"})
+        self.assertEqual(self.checkpointer.evict_threads(["a"]), 1)
+        self.assertEqual(self.checkpointer.stored_thread_ids(), {"b"})
+        self.assertIsNone(self.checkpointer.get_tuple(config("a")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from unittest import mock
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.nodes.context import MESSAGE_OVERHEAD_TOKENS, plan_context
+from agent.settings import SUMMARY_TRIGGER_TOKENS
+
+
+def turn(human_tokens: int, ai_tokens: int = 0) -> list:
+    """글자 수 = token 수(count_tokens를 len으로 대체)가 되도록 턴 하나를 만듭니다."""
+    messages = [HumanMessage(content="질" * (human_tokens - MESSAGE_OVERHEAD_TOKENS))]
+    if ai_tokens:
+        messages.append(AIMessage(content="답" * (ai_tokens - MESSAGE_OVERHEAD_TOKENS)))
+    return messages
+
+
+class PlanContextTests(unittest.TestCase):
+
+    def setUp(self):
+        # tokenizer 파일 없이도 같은 결과가 나오도록 글자 수로 셉니다.
+        patcher = mock.patch("agent.nodes.context.count_tokens", len)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_under_budget_keeps_everything(self):
+        messages = turn(20, 30) + turn(20, 30) + turn(20)
+        plan = plan_context(messages, budget=1000, keep_turns=3)
+
+        self.assertEqual(plan.window, messages)
+        self.assertEqual(plan.to_summarize, [])
+        self.assertEqual(plan.summarized_until, 0)
+
+    def test_folds_exactly_at_summary_threshold(self):
+        recent = turn(20, 30) + turn(20, 30) + turn(20)
+        for outside_tokens, folded in ((SUMMARY_TRIGGER_TOKENS - 1, False), (SUMMARY_TRIGGER_TOKENS, True)):
+            with self.subTest(outside_tokens=outside_tokens):
+                old = turn(outside_tokens)
+                plan = plan_context(old + recent, budget=10 * SUMMARY_TRIGGER_TOKENS, keep_turns=3)
+                if folded:
+                    self.assertEqual(plan.to_summarize, old)
+                    self.assertEqual(plan.window, recent)
+                    self.assertEqual(plan.summarized_until, len(old))
+                else:
+                    self.assertEqual(plan.to_summarize, [])
+                    self.assertEqual(plan.window, old + recent)
+                    self.assertEqual(plan.summarized_until, 0)
+
+    def test_over_budget_folds_older_turns_but_keeps_last(self):
+        messages = turn(100, 100) + turn(100, 100) + turn(500)
+        plan = plan_context(messages, budget=700, keep_turns=3)
+
+        self.assertEqual(plan.window, messages[2:])
+        self.assertEqual(plan.to_summarize, messages[:2])
+        self.assertEqual(plan.summarized_until, 2)
+
+        # 마지막 턴은 예산을 넘어도 보냅니다.
+        plan = plan_context(messages, budget=10, keep_turns=3)
+        self.assertEqual(plan.window, messages[4:])
+        self.assertEqual(plan.summarized_until, 4)
+
+    def test_existing_summary_is_not_recounted_and_uses_budget(self):
+        summarized = turn(100, 100)
+        messages = summarized + turn(50, 50) + turn(50)
+        start = len(summarized)
+
+        # 이미 요약한 메시지는 다시 보거나 요약하지 않습니다.
+        plan = plan_context(messages, budget=150, summary="", summarized_until=start)
+        self.assertEqual(plan.window, messages[start:])
+        self.assertEqual(plan.to_summarize, [])
+        self.assertEqual(plan.summarized_until, start)
+
+        # 같은 예산이라도 요약문이 token을 차지하면 오래된 턴을 요약에 접어 넣습니다.
+        plan = plan_context(messages, budget=150, summary="요" * 20, summarized_until=start)
+        self.assertEqual(plan.window, messages[start + 2:])
+        self.assertEqual(plan.to_summarize, messages[start:start + 2])
+        self.assertEqual(plan.summarized_until, start + 2)
+
+    def test_nothing_new_after_summary(self):
+        messages = turn(20, 30)
+        plan = plan_context(messages, budget=100, summary="요약", summarized_until=len(messages))
+        self.assertEqual(plan.window, [])
+        self.assertEqual(plan.summarized_until, len(messages))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from datetime import datetime, timezone
+
+import numpy as np
+
+from agent import curves
+from agent.settings import CARB_ABSORPTION_MINUTES, INSULIN_ACTION_MINUTES, INSULIN_HALF_LIFE_MINUTES
+
+
+class CurveTests(unittest.TestCase):
+
+    def test_insulin_curves(self):
+        minutes = np.array([0.0, INSULIN_ACTION_MINUTES / 2, INSULIN_ACTION_MINUTES, 600.0])
+        np.testing.assert_allclose(curves.linear_insulin(minutes, 2.0), [2.0, 1.0, 0.0, 0.0])
+        self.assertAlmostEqual(float(curves.exponential_insulin(np.array(INSULIN_HALF_LIFE_MINUTES), 2.0)), 1.0)
+
+        # biexponential은 주사 직후 전량이 남아 있고, 처음에는 천천히 줄다가 계속 줄어듭니다.
+        remaining = curves.biexponential_insulin(np.arange(0, 601, 5.0), 1.0)
+        self.assertAlmostEqual(float(remaining[0]), 1.0)
+        self.assertTrue(np.all(np.diff(remaining) < 0))
+        self.assertGreater(float(remaining[1]), float(curves.exponential_insulin(np.array(5.0), 1.0)))
+        self.assertLess(float(remaining[-1]), 0.05)
+
+    def test_carb_curves(self):
+        self.assertAlmostEqual(float(curves.linear_carbs(np.array(60.0), 60.0)), 40.0)
+        self.assertEqual(float(curves.linear_carbs(np.array(600.0), 60.0)), 0.0)
+        minutes = np.array([0.0, CARB_ABSORPTION_MINUTES / 2, CARB_ABSORPTION_MINUTES])
+        np.testing.assert_allclose(curves.triangle_carbs(minutes, 60.0), [60.0, 30.0, 0.0])
+
+    def test_on_board_sums_past_records_only(self):
+        times = np.array([0.0, 3600.0, 7200.0])
+        doses = np.array([2.0, np.nan, 1.0])
+        at = np.array([0.0, 3600.0, 5400.0])
+        # 7200초의 기록은 아직 주사 전이고, NaN은 0으로 봅니다.
+        expected = [curves.linear_insulin(np.array(minutes), 2.0) for minutes in (0.0, 60.0, 90.0)]
+        np.testing.assert_allclose(curves.iob(times, doses, at, "linear"), expected)
+        self.assertEqual(curves.cob([], [], at).tolist(), [0.0, 0.0, 0.0])
+
+    def test_time_grid(self):
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        grid = curves.time_grid(start, hours=6, step_minutes=5)
+        self.assertEqual(len(grid), 73)
+        self.assertEqual(grid[0], start.timestamp())
+        self.assertEqual(grid[-1] - grid[0], 6 * 3600)
@@ -0,0 +1,104 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from agent.retrieval import embedding_cache
+from agent.retrieval.embedding_cache import EmbeddingCache, cache_key
+
+MODEL = "test-model"
+
+
+class EmbeddingCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "embeddings.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def cache(self, **kwargs) -> EmbeddingCache:
+        return EmbeddingCache(path=self.path, **kwargs)
+
+    def last_used(self, text: str) -> float:
+        with sqlite3.connect(self.path) as conn:
+            return conn.execute(
+                "SELECT last_used FROM embeddings WHERE key = ?", (cache_key(MODEL, text),)
+            ).fetchone()[0]
+
+    def test_disk_hit_shared_between_instances(self):
+        self.cache().put_many(MODEL, ["김치", "밥"], [[1.0, 0.0], [0.0, 1.0]])
+
+        other = self.cache()
+        self.assertEqual(other.get_many(MODEL, [" 김치 ", "사과"]), [[1.0, 0.0], None])
+        self.assertEqual(other.hits, {"memory": 0, "disk": 1, "miss": 1, "error": 0})
+
+    def test_disk_hit_does_not_write_until_flush(self):
+        self.cache().put_many(MODEL, ["김치"], [[1.0]])
+        stored = self.last_used("김치")
+
+        reader = self.cache()
+        with mock.patch("time.time", return_value=stored + 100):
+            self.assertEqual(reader.get_many(MODEL, ["김치"]), [[1.0]])
+        self.assertEqual(self.last_used("김치"), stored)
+
+        # 다음 저장에서 모아 둔 사용 시각을 함께 씁니다.
+        reader.put_many(MODEL, ["밥"], [[0.5]])
+        self.assertEqual(self.last_used("김치"), stored + 100)
+
+    def test_disk_hit_flushes_after_interval(self):
+        self.cache().put_many(MODEL, ["김치"], [[1.0]])
+        stored = self.last_used("김치")
+
+        reader = self.cache()
+        reader._flushed_at -= embedding_cache.TOUCH_FLUSH_INTERVAL
+        with mock.patch("time.time", return_value=stored + 100):
+            reader.get_many(MODEL, ["김치"])
+        self.assertEqual(self.last_used("김치"), stored + 100)
+
+    def test_row_count_is_tracked_without_counting_every_put(self):
+        cache = self.cache(max_rows=100)
+        cache.put_many(MODEL, ["a", "b"], [[1.0], [2.0]])
+        cache.put_many(MODEL, ["b", "c"], [[2.0], [3.0]])
+        self.assertEqual(cache._rows, 3)
+
+        statements = []
+        cache._conn.set_trace_callback(statements.append)
+        cache.put_many(MODEL, ["d"], [[4.0]])
+        self.assertFalse(any("COUNT" in statement for statement in statements))
+
+    def test_evicts_least_recently_used(self):
+        cache = self.cache(max_rows=10, memory_size=0)
+        for i in range(10):
+            with mock.patch("time.time", return_value=1000.0 + i):
+                cache.put_many(MODEL, [f"food{i}"], [[float(i)]])
+        # 가장 오래된 food0을 조회하면 정리 대상에서 빠집니다.
+        with mock.patch("time.time", return_value=2000.0):
+            cache.get_many(MODEL, ["food0"])
+            cache.put_many(MODEL, ["food10"], [[10.0]])
+
+        with sqlite3.connect(self.path) as conn:
+            (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        self.assertEqual(count, 9)
+        self.assertEqual(cache._rows, 9)
+        self.assertEqual(cache.get_many(MODEL, ["food0", "food1", "food2", "food3"]), [[0.0], None, None, [3.0]])
+
+    def test_sqlite_errors_degrade_to_miss(self):
+        cache = self.cache()
+        cache.put_many(MODEL, ["김치"], [[1.0]])
+        cache._memory.clear()
+
+        locked = mock.Mock(side_effect=sqlite3.OperationalError("database is locked"))
+        with mock.patch.object(EmbeddingCache, "_connection", locked), self.assertLogs(embedding_cache.logger, "WARNING"):
+            self.assertEqual(cache.get_many(MODEL, ["김치"]), [None])
+            cache.put_many(MODEL, ["밥"], [[0.5]])
+        self.assertEqual(cache.hits["error"], 2)
+
+        # 메모리에는 저장되고, 연결이 회복되면 disk도 다시 사용합니다.
+        self.assertEqual(cache.get_many(MODEL, ["밥", "김치"]), [[0.5], [1.0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
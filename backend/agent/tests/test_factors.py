@@ -0,0 +1,91 @@
+import json
+import unittest
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agent.nodes.factors import Meal, deterministic_factors, merge_extracted, parse_amount, rule_factors
+from agent.settings import FOOD_DATA_PATH
+
+
+def _rows(*names) -> list:
+    with open(FOOD_DATA_PATH, encoding="utf-8") as f:
+        rows = {row["식품명"]: row for row in map(json.loads, f) if row["식품명"] in names}
+    return [rows[name] for name in names]
+
+
+def _searched(foods: dict) -> list:
+    """{검색어: 메타데이터}를 batch 도구 호출과 결과 메시지로 만듭니다."""
+    tool_call = {"name": "nutrition_batch_retriever_tool", "args": {"queries": list(foods)}, "id": "call_1"}
+    return [
+        AIMessage(content="", tool_calls=[tool_call]),
+        ToolMessage(content="", tool_call_id="call_1", artifact=[[metadata] for metadata in foods.values()]),
+    ]
+
+
+class RuleFactorTests(unittest.TestCase):
+
+    def test_direct_negative_answers(self):
+        found = rule_factors([AIMessage(content="최근 이틀 간 운동하셨나요?"), HumanMessage(content="아니요")])
+        self.assertEqual(found, {"exercise_factor": 1.0})
+        self.assertEqual(rule_factors([HumanMessage(content="운동은 안 했어요")]), {"exercise_factor": 1.0})
+
+    def test_positive_answers_are_not_negative(self):
+        question = AIMessage(content="최근 이틀 간 운동하셨나요?")
+        for answer in ["네 1시간 달렸는데 괜찮아요", "네 운동 1시간 했는데 괜찮아요"]:
+            with self.subTest(answer=answer):
+                self.assertNotIn("exercise_factor", rule_factors([question, HumanMessage(content=answer)]))
+
+        question = AIMessage(content="혹시 몸살이나 감기 같은 질병이 있으신가요?")
+        found = rule_factors([question, HumanMessage(content="감기 기운이 있는데 괜찮아요")])
+        self.assertNotIn("ill_factor", found)
+
+    def test_mixed_answer_is_split_into_clauses(self):
+        found = rule_factors([HumanMessage(content="운동은 안 했는데 감기 걸려서 아파요")])
+        self.assertEqual(found.get("exercise_factor"), 1.0)
+        self.assertNotIn("ill_factor", found)
+
+    def test_stress_level(self):
+        found = rule_factors([AIMessage(content="스트레스 강도는 어느 정도인가요?"), HumanMessage(content="중간 정도예요")])
+        self.assertEqual(found, {"stress_factor": 1.15})
+
+
+class MealAmountTests(unittest.TestCase):
+
+    def setUp(self):
+        self.kimbap, self.sushi = _rows("김밥_참치", "초밥_광어")
+
+    def test_parse_amount(self):
+        self.assertEqual(parse_amount("김밥 두 줄"), {"servings": 2.0})
+        self.assertEqual(parse_amount("초밥 10피스"), {"pieces": 10.0})
+        self.assertEqual(parse_amount("밥 반 공기"), {"servings": 0.5})
+        self.assertEqual(parse_amount("한 공기 반"), {"servings": 1.5})
+        self.assertEqual(parse_amount("우유 200ml"), {"grams": 200.0})
+        self.assertIsNone(parse_amount("김밥 먹을래요"))
+
+    def test_stated_servings(self):
+        messages = [HumanMessage(content="점심으로 김밥 두 줄 먹을래요"), *_searched({"김밥": self.kimbap})]
+        meal = Meal.from_messages(messages)
+        self.assertEqual(meal.unknown, [])
+        self.assertAlmostEqual(meal.carbs, 2 * 400 * 17.49 / 100, places=0)
+
+    def test_pieces_without_piece_weight_are_asked(self):
+        messages = [HumanMessage(content="초밥 10피스 먹을 거예요"), *_searched({"초밥": self.sushi})]
+        meal = Meal.from_messages(messages)
+        self.assertEqual(meal.unknown, [0])
+        self.assertIn("몇 인분 또는 몇 g", meal.question())
+
+    def test_unknown_amount_is_not_one_serving(self):
+        messages = [HumanMessage(content="김밥이랑 초밥 먹을래요"), *_searched({"김밥": self.kimbap, "초밥": self.sushi})]
+        factors, missing, meal = deterministic_factors(messages, {"blood_sugar": 150})
+        self.assertEqual(meal.unknown, [0, 1])
+        self.assertEqual(factors["carbs"], 0.0)
+
+        merged = merge_extracted(factors, missing, {"amounts": [{"food": "김밥", "servings": 2}]}, meal)
+        self.assertEqual(meal.unknown, [1])
+        self.assertAlmostEqual(merged["carbs"], 2 * 400 * 17.49 / 100, places=0)
+
+    def test_answer_to_amount_question(self):
+        messages = [HumanMessage(content="김밥 먹을래요"), *_searched({"김밥": self.kimbap})]
+        meal = Meal.from_messages(messages)
+        messages += [AIMessage(content=meal.question()), HumanMessage(content="한 줄 반이요")]
+        self.assertEqual(Meal.from_messages(messages).amounts, [{"servings": 1.5}])
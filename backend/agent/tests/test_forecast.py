@@ -0,0 +1,82 @@
+import unittest
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+
+from agent.benchmarks.fakes import FakeMongoDB
+from agent.forecast import HIGH, ForecastCache, forecast, trend
+from agent.health import HealthSnapshotCache
+from agent.settings import CF, ISR, TREND_MINUTES
+
+NOW = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def entries(values: list, step_minutes: float = 5) -> list:
+    """새 기록부터, step_minutes 간격의 CGM 기록"""
+    return [
+        {"sgv": value, "timestamp": NOW.timestamp() - i * step_minutes * 60} for i, value in enumerate(values)
+    ]
+
+
+def health(blood_sugar_history: list, treatments: list = ()) -> HealthSnapshotCache:
+    cache = HealthSnapshotCache(mode="off")
+    cache.entries = entries(blood_sugar_history)
+    cache.treatments.extend(treatments)
+    return cache
+
+
+class TrendTests(unittest.TestCase):
+
+    def test_slope_per_minute(self):
+        self.assertAlmostEqual(trend(entries([130, 128, 126, 124]), NOW.timestamp()), 0.4)
+
+    def test_ignores_old_and_missing_readings(self):
+        history = entries([120, 120, 120]) + [{"sgv": 300, "timestamp": NOW.timestamp() - (TREND_MINUTES + 5) * 60}]
+        history.append({"sgv": None, "timestamp": NOW.timestamp() - 60})
+        self.assertAlmostEqual(trend(history, NOW.timestamp()), 0.0)
+        self.assertEqual(trend(entries([120]), NOW.timestamp()), 0.0)
+
+
+class ForecastTests(unittest.TestCase):
+
+    def test_flat_without_treatments(self):
+        result = forecast(health([120, 120, 120]), NOW, hours=4)
+        np.testing.assert_allclose(result.glucose, 120)
+        self.assertEqual(result.minutes[-1], 240)
+
+    def test_insulin_and_carb_effects(self):
+        bolus = {"created_at": NOW, "insulin": 2.0, "carbs": None}
+        result = forecast(health([150, 150], [bolus]), NOW, hours=4)
+        self.assertTrue(np.all(np.diff(result.glucose) <= 0))
+        self.assertAlmostEqual(result.glucose[-1], 150 - CF * (result.iob[0] - result.iob[-1]))
+
+        meal = {"created_at": NOW, "insulin": None, "carbs": 30}
+        result = forecast(health([150, 150], [meal]), NOW, hours=4)
+        self.assertAlmostEqual(result.glucose[-1], min(150 + CF / ISR * (result.cob[0] - result.cob[-1]), HIGH))
+
+    def test_clipped_and_missing_blood_sugar(self):
+        meal = {"created_at": NOW, "insulin": None, "carbs": 200}
+        self.assertEqual(forecast(health([380, 370], [meal]), NOW).glucose.max(), HIGH)
+
+        result = forecast(health([]), NOW)
+        self.assertIsNone(result.blood_sugar)
+        self.assertTrue(np.isnan(result.glucose).all())
+
+
+class ForecastCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeMongoDB()
+        self.health = HealthSnapshotCache(db=self.db, mode="off")
+        self.health.refresh()
+        self.cache = ForecastCache(self.health)
+
+    def test_reuses_until_snapshot_changes(self):
+        first = self.cache.get()
+        self.assertIs(self.cache.get(), first)
+
+        created_at = (datetime.now(timezone.utc) - timedelta(minutes=10)).isoformat()
+        self.db["treatments"].docs.append({"insulin": 1.0, "carbs": 0, "created_at": created_at})
+        self.health.update()
+        self.assertIsNone(self.cache.cached())
+        self.assertIsNot(self.cache.get(), first)
@@ -0,0 +1,143 @@
+import unittest
+from datetime import datetime, timezone, timedelta
+from unittest import mock
+
+from agent import health
+from agent.benchmarks.fakes import FakeCollection, FakeMongoDB
+from agent.health import HealthSnapshotCache
+
+
+class QueryCollection(FakeCollection):
+    """조회 조건($gt/$gte)과 sort/limit을 적용하고, 받은 조건을 기록하는 collection."""
+
+    def __init__(self, docs: list):
+        super().__init__(docs)
+        self.queries = []
+
+    def find(self, query=None, projection=None, sort=None, limit=0):
+        self.queries.append(query or {})
+        docs = [doc for doc in self.docs if self._match(doc, query or {})]
+        for key, direction in reversed(sort or []):
+            docs.sort(key=lambda doc: doc.get(key) or 0, reverse=direction < 0)
+        return docs[:limit] if limit else docs
+
+    @staticmethod
+    def _match(doc: dict, query: dict) -> bool:
+        for key, condition in query.items():
+            if key.startswith("$") or not isinstance(condition, dict):
+                continue
+            value = doc.get(key)
+            if "$gt" in condition and not (value is not None and value > condition["$gt"]):
+                return False
+            if "$gte" in condition and not (value is not None and value >= condition["$gte"]):
+                return False
+        return True
+
+
+def iso(minutes_ago: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)).isoformat().replace("+00:00", "Z")
+
+
+def epoch_ms(minutes_ago: float) -> int:
+    return int((datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)).timestamp() * 1000)
+
+
+class HealthSnapshotCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeMongoDB()
+        # full_refresh=0: 매번 전체를 다시 읽습니다.
+        self.cache = HealthSnapshotCache(db=self.db, mode="off", full_refresh=0)
+        self.cache.refresh()
+        self.treatments = self.db["treatments"].docs
+
+    def test_unchanged_poll_keeps_version(self):
+        version = self.cache.version
+        self.cache.update()
+        self.assertEqual(self.cache.version, version)
+
+    def test_full_refresh_applies_edited_treatment(self):
+        iob = self.cache.context_data()["iob"]
+        version = self.cache.version
+        self.treatments[0] = {**self.treatments[0], "insulin": 4.0}
+
+        self.cache.update()
+        self.assertEqual(self.cache.version, version + 1)
+        self.assertEqual(len(self.cache.treatments), 1)
+        self.assertGreater(self.cache.context_data()["iob"], iob)
+
+    def test_full_refresh_drops_deleted_treatment(self):
+        self.treatments.clear()
+        self.cache.update()
+        self.assertEqual(len(self.cache.treatments), 0)
+
+
+class IncrementalUpdateTests(unittest.TestCase):
+
+    def setUp(self):
+        self.entries = QueryCollection([{"sgv": 120 + i, "date": epoch_ms(5 * i)} for i in range(3)])
+        self.treatments = QueryCollection([{"insulin": 2.0, "carbs": 30, "created_at": iso(90)}])
+        self.cache = HealthSnapshotCache(
+            db={"entries": self.entries, "treatments": self.treatments}, mode="off", full_refresh=3600,
+        )
+        self.cache.refresh()
+        self.entries.queries.clear()
+        self.treatments.queries.clear()
+
+    def test_queries_only_after_last_seen_record(self):
+        version = self.cache.version
+        self.cache.update()
+
+        self.assertEqual(self.cache.version, version)
+        self.assertEqual(self.entries.queries, [{"date": {"$gt": self.entries.docs[0]["date"]}}])
+        since = self.treatments.queries[0]["created_at"]["$gte"]
+        self.assertEqual(
+            datetime.fromisoformat(since), datetime.fromisoformat(self.treatments.docs[0]["created_at"].replace("Z", "+00:00")),
+        )
+
+    def test_new_records_are_added(self):
+        version = self.cache.version
+        self.entries.docs.append({"sgv": 200, "date": epoch_ms(-1)})
+        self.treatments.docs.append({"insulin": 1.5, "carbs": None, "created_at": iso(1)})
+
+        self.cache.update()
+
+        self.assertEqual(self.cache.version, version + 1)
+        self.assertEqual(self.cache.blood_sugar, 200)
+        self.assertEqual([entry["sgv"] for entry in self.cache.entries], [200, 120, 121, 122])
+        self.assertEqual(len(self.cache.treatments), 2)
+
+    def test_edits_wait_for_full_refresh(self):
+        self.treatments.docs.clear()
+        self.cache.update()
+        self.assertEqual(len(self.cache.treatments), 1)
+
+        self.cache.full_refresh = 0
+        version = self.cache.version
+        self.cache.update()
+        self.assertEqual(len(self.cache.treatments), 0)
+        self.assertEqual(self.cache.version, version + 1)
+        # 전체 조회는 최근 5시간 전체를 읽습니다.
+        since = datetime.fromisoformat(self.treatments.queries[-1]["created_at"]["$gte"])
+        self.assertAlmostEqual((datetime.now(timezone.utc) - since).total_seconds(), 5 * 3600, delta=60)
+
+
+class PollTests(unittest.TestCase):
+
+    def test_failures_are_logged_with_backoff(self):
+        cache = HealthSnapshotCache(db=FakeMongoDB(), mode="off", poll_interval=20)
+        cache._stop = mock.Mock()
+        cache._stop.is_set.side_effect = [False, False, False, True]
+        error = RuntimeError("mongo down")
+
+        with mock.patch.object(cache, "update", side_effect=[error, error, None]), \
+                self.assertLogs(health.logger, "WARNING") as logs:
+            cache._poll()
+
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual([call.args[0] for call in cache._stop.wait.call_args_list], [40, 80, 20])
+        self.assertEqual(cache._poll_delay(10), health.MAX_POLL_BACKOFF)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from agent.retrieval import ingest as ingest_module
+from agent.retrieval.ingest import content_hash, ingest
+
+
+class FakeCollection:
+    """chromadb Collection의 get/upsert/delete만 흉내 냅니다."""
+
+    def __init__(self, documents: dict = None):
+        self.documents = dict(documents or {})
+        self.upserted = []
+        self.deleted = []
+
+    def get(self, include=None) -> dict:
+        return {"ids": list(self.documents)}
+
+    def upsert(self, ids, embeddings, documents, metadatas) -> None:
+        self.upserted.extend(ids)
+        for doc_id, vector, document, metadata in zip(ids, embeddings, documents, metadatas):
+            self.documents[doc_id] = (document, metadata, vector)
+
+    def delete(self, ids) -> None:
+        self.deleted.extend(ids)
+        for doc_id in ids:
+            del self.documents[doc_id]
+
+
+class FakeEmbeddings:
+    """UpstageEmbeddings 대신 client.create 요청을 기록하고 글자 수를 벡터로 돌려줍니다."""
+
+    def __init__(self, fail: set = ()):
+        self.requests = []
+        self.fail = set(fail)
+        self.client = SimpleNamespace(create=self.create)
+
+    @property
+    def _invocation_params(self) -> dict:
+        return {"model": "embedding"}
+
+    def create(self, input, model):
+        self.requests.append(list(input))
+        if self.fail & set(input):
+            raise RuntimeError("embedding failed")
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(text))]) for text in input])
+
+
+def row(name: str, carbs: float) -> dict:
+    return {"식품명": name, "탄수화물(g)": carbs, "1인분용량": None}
+
+
+class IngestTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "food.jsonl")
+        patcher = mock.patch.object(ingest_module, "BACKOFF_SECONDS", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rows: list) -> None:
+        with open(self.path, "w", encoding="utf-8") as f:
+            for item in rows:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+    def run_ingest(self, collection, embeddings=None, **kwargs):
+        return ingest(collection, embeddings or FakeEmbeddings(), path=self.path, batch_size=2, concurrency=2, **kwargs)
+
+    def test_first_run_embeds_all_and_skips_duplicates(self):
+        rows = [row("사과", 14), row("우유", 5), row("김치", 4)]
+        self.write(rows + [rows[0]])
+        collection = FakeCollection()
+
+        report = self.run_ingest(collection)
+
+        self.assertEqual((report.total, report.embedded, report.unchanged, report.deleted), (3, 3, 0, 0))
+        document, metadata, _ = collection.documents[content_hash(rows[0])]
+        self.assertEqual(document, "사과")
+        self.assertEqual(metadata, {"식품명": "사과", "탄수화물(g)": 14})
+
+    def test_unchanged_rows_are_skipped(self):
+        rows = [row("사과", 14), row("우유", 5)]
+        self.write(rows)
+        collection = FakeCollection()
+        self.run_ingest(collection)
+
+        embeddings = FakeEmbeddings()
+        report = self.run_ingest(collection, embeddings)
+
+        self.assertEqual((report.unchanged, report.embedded, report.deleted), (2, 0, 0))
+        self.assertEqual(embeddings.requests, [])
+
+    def test_changed_rows_are_reembedded_and_removed_rows_deleted(self):
+        apple, milk, kimchi = row("사과", 14), row("우유", 5), row("김치", 4)
+        self.write([apple, milk, kimchi])
+        collection = FakeCollection()
+        self.run_ingest(collection)
+
+        changed_milk, rice = row("우유", 6), row("쌀밥", 70)
+        self.write([apple, changed_milk, rice])
+        embeddings = FakeEmbeddings()
+        collection.upserted.clear()
+        report = self.run_ingest(collection, embeddings)
+
+        self.assertEqual((report.total, report.unchanged, report.embedded, report.deleted), (3, 1, 2, 2))
+        self.assertEqual(sorted(text for request in embeddings.requests for text in request), ["쌀밥", "우유"])
+        self.assertEqual(sorted(collection.upserted), sorted([content_hash(changed_milk), content_hash(rice)]))
+        self.assertEqual(sorted(collection.deleted), sorted([content_hash(milk), content_hash(kimchi)]))
+        self.assertEqual(set(collection.documents), {content_hash(apple), content_hash(changed_milk), content_hash(rice)})
+
+    def test_failed_batch_keeps_previous_rows(self):
+        old = row("우유", 5)
+        self.write([old])
+        collection = FakeCollection()
+        self.run_ingest(collection)
+
+        self.write([row("우유", 6)])
+        report = self.run_ingest(collection, FakeEmbeddings(fail={"우유"}), retries=1)
+
+        self.assertEqual((report.failed, report.embedded, report.deleted), (1, 0, 0))
+        self.assertEqual(set(collection.documents), {content_hash(old)})
+
+    def test_legacy_collection_is_fully_replaced(self):
+        rows = [row("사과", 14), row("우유", 5)]
+        self.write(rows)
+        collection = FakeCollection({"uuid-1": ("사과_생것 탄수화물 14g", {}, [0.0]), "uuid-2": ("우유", {}, [0.0])})
+
+        report = self.run_ingest(collection, dry_run=True)
+        self.assertEqual((report.legacy, report.embedded, report.deleted), (2, 2, 2))
+        self.assertEqual(set(collection.documents), {"uuid-1", "uuid-2"})
+
+        report = self.run_ingest(collection)
+        self.assertEqual((report.legacy, report.embedded, report.deleted), (2, 2, 2))
+        self.assertEqual(set(collection.documents), {content_hash(item) for item in rows})
+
+
+if __name__ == "__main__":
+    unittest.main()
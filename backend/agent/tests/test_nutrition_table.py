@@ -0,0 +1,40 @@
+import unittest
+
+from agent.retrieval.nutrition_table import NutritionTable, parse_count, parse_grams
+
+ROWS = [
+    {"식품명": "토마토_방울토마토_생것", "탄수화물(g)": "6.02", "기준량": "100g", "1인분용량": "10개 (150g)", "개당용량": "15g"},
+    {"식품명": "짜장면", "탄수화물(g)": "19.22", "기준량": "100g", "1인분용량": "550g"},
+    {"식품명": "짜장면", "탄수화물(g)": "29.14", "기준량": "100g", "1인분용량": "550g"},
+    {"식품명": "우유", "탄수화물(g)": "4.8", "기준량": "100ml", "1인분용량": "1/2컵 (100ml)"},
+]
+
+
+class NutritionTableTests(unittest.TestCase):
+
+    def setUp(self):
+        self.table = NutritionTable.from_rows(ROWS)
+
+    def test_parse_serving(self):
+        self.assertEqual(parse_grams("10개 (150g)"), 150.0)
+        self.assertEqual(parse_count("10개 (150g)"), 10.0)
+        self.assertEqual(parse_count("1/2컵 (100ml)"), 0.5)
+        self.assertIsNone(parse_count("550g"))
+
+    def test_carbs_by_amount(self):
+        self.assertAlmostEqual(float(self.table.carbs([0])[0]), 9.03, places=2)
+        self.assertAlmostEqual(float(self.table.carbs([0], pieces=[4])[0]), 3.61, places=2)
+        self.assertAlmostEqual(float(self.table.carbs([1], servings=[2])[0]), 211.42, places=1)
+        self.assertAlmostEqual(float(self.table.carbs([1], grams=[100])[0]), 19.22, places=2)
+
+    def test_resolve_uses_retrieved_row(self):
+        # 같은 이름의 행이 여러 개면 이름이 아니라 문서의 값(또는 food_id)으로 찾습니다.
+        self.assertEqual(self.table.resolve([ROWS[2]]).tolist(), [2])
+        self.assertEqual(self.table.resolve([{**ROWS[1], "food_id": 1}]).tolist(), [1])
+        self.assertAlmostEqual(float(self.table.carbs(self.table.resolve([ROWS[2]]))[0]), 160.27, places=1)
+
+    def test_lookup_falls_back_to_metadata(self):
+        other = {"식품명": "짜장면", "탄수화물(g)": "25", "기준량": "100g", "1인분용량": "500g"}
+        self.assertEqual(self.table.resolve([other]).tolist(), [-1])
+        table, food_ids = self.table.lookup([ROWS[0], other])
+        self.assertAlmostEqual(float(table.carbs(food_ids)[1]), 125.0, places=1)
@@ -0,0 +1,185 @@
+import os
+import tempfile
+import unittest
+
+from langchain_core.documents import Document
+
+from agent.benchmarks.fakes import FakeEmbeddings
+from agent.retrieval import hybrid
+from agent.retrieval.fuzzy import FuzzyIndex
+from agent.retrieval.lexical import LexicalIndex
+from agent.retrieval.mmap_store import MmapVectorStore
+from agent.retrieval.names import NameIndex
+
+NAMES = [
+    "김치찌개_삼겹살", "김치찌개_삼겹살", "김치찌개_삼겹살", "돼지불고기_삼겹살_오징어", "삼겹살구이", "삼겹살구이_고추장",
+    "사과_동결건조", "사과_생것", "사과_감홍_생것", "사과차_석류 애플라임",
+    "비스킷/쿠키/크래커_쿠키의 정석 오트밀레이즌",
+    "우유", "우유_딸기", "시리얼_우유",
+    "아이스크림_초코아츄 아이스크림",
+    "계란 덮밥", "볶음밥_계란", "김밥_계란", "달걀_생것", "달걀_삶은것",
+    "배추김치", "김치 돼지고기볶음", "김치 콩나물국", "김치국_김치_콩나물",
+]
+
+
+def names(rows: list, doc_ids: list) -> list:
+    return [rows[doc_id]["식품명"] for doc_id in doc_ids]
+
+
+class NameIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [{"식품명": name} for name in NAMES]
+        self.index = NameIndex(self.rows)
+
+    def test_head_noun_before_ingredient(self):
+        # 다른 음식의 재료(뒤쪽 segment)보다 그 이름으로 시작하는 음식이 먼저입니다.
+        # "삼겹살"이라는 식품명은 없으므로 바로 반환하지 않고 벡터 검색과 합칠 후보로 반환합니다.
+        match, doc_ids = self.index.lookup("삼겹살", k=3)
+        self.assertEqual(match, "candidate")
+        self.assertEqual(names(self.rows, doc_ids), ["삼겹살구이", "삼겹살구이_고추장", "김치찌개_삼겹살"])
+
+    def test_raw_form_first(self):
+        match, doc_ids = self.index.lookup("사과", k=3)
+        self.assertEqual(match, "exact")
+        self.assertEqual(names(self.rows, doc_ids), ["사과_생것", "사과_감홍_생것", "사과_동결건조"])
+
+        match, doc_ids = self.index.lookup("우유", k=3)
+        self.assertEqual((match, names(self.rows, doc_ids)[0]), ("exact", "우유"))
+
+    def test_segments_split_only_on_underscore(self):
+        # "계란 덮밥"은 "계란"으로 시작하는 음식이 아니며, 재료로만 일치하는 "볶음밥_계란"은 바로 사용하지 않습니다.
+        match, doc_ids = self.index.lookup("계란", k=3)
+        self.assertEqual(match, "candidate")
+        self.assertNotIn("계란 덮밥", names(self.rows, doc_ids))
+        self.assertEqual(self.index.lookup("계란 덮밥"), ("exact", [NAMES.index("계란 덮밥")]))
+
+        match, doc_ids = self.index.lookup("김치", k=3)
+        self.assertEqual(match, "candidate")
+        self.assertEqual(names(self.rows, doc_ids), ["김치국_김치_콩나물"])
+
+    def test_no_prefix_match_inside_other_food(self):
+        self.assertEqual(self.index.lookup("오트밀"), ("miss", []))
+        self.assertEqual(self.index.lookup("삼겹")[0], "miss")
+
+
+class LexicalIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [{"식품명": name} for name in NAMES + ["쇼콜라 케이크"]]
+        self.index = LexicalIndex(self.rows)
+
+    def test_word_order_and_spacing(self):
+        for query, expected in [("삼겹살 김치찌개", "김치찌개_삼겹살"), ("삼겹살 구이", "삼겹살구이"), ("우유 딸기", "우유_딸기")]:
+            with self.subTest(query=query):
+                results = self.index.search(query, k=3)
+                self.assertEqual(self.rows[results[0][0]]["식품명"], expected)
+                self.assertTrue(self.index.confident(query, results))
+
+    def test_substring_is_not_confident(self):
+        # "콜라"는 "쇼콜라"의 bigram과 겹칠 뿐이므로 벡터 검색과 합쳐야 합니다.
+        results = self.index.search("콜라", k=3)
+        self.assertEqual(self.rows[results[0][0]]["식품명"], "쇼콜라 케이크")
+        self.assertFalse(self.index.confident("콜라", results))
+        self.assertEqual(self.index.search("초밥"), [])
+
+
+class FuzzyIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [{"식품명": name} for name in NAMES]
+        self.index = FuzzyIndex(NameIndex(self.rows))
+
+    def test_typo_uses_name_ranking(self):
+        match, doc_ids = self.index.lookup("삽겹살", k=3)
+        self.assertEqual(match, "fuzzy")
+        self.assertEqual(names(self.rows, doc_ids)[0], "삼겹살구이")
+
+    def test_short_key_allows_one_edit(self):
+        # "초코우유"와 "초코아츄"는 자모 두 개가 다르므로, 네 글자 검색어에서는 후보가 아닙니다.
+        self.assertEqual(self.index.lookup("초코우유"), ("miss", []))
+        self.assertEqual(self.index.lookup("삽겹살 구이")[0], "fuzzy")
+
+
+class HybridSearchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [{"식품명": name} for name in NAMES]
+        index = LexicalIndex(self.rows)
+        names_index = NameIndex(self.rows)
+        hybrid.get_lexical_index.override(index)
+        hybrid.get_name_index.override(names_index)
+        hybrid.get_fuzzy_index.override(FuzzyIndex(names_index))
+        self.vector_queries = []
+        self.vector_name = "우유_딸기"
+
+    def tearDown(self):
+        for getter in (hybrid.get_lexical_index, hybrid.get_name_index, hybrid.get_fuzzy_index):
+            getter.reset()
+
+    def vector_search(self, queries: list) -> list:
+        self.vector_queries.extend(queries)
+        return [[Document(page_content=self.vector_name, metadata={"식품명": self.vector_name})] for _ in queries]
+
+    def test_name_match_skips_vector_search(self):
+        results = hybrid.hybrid_search(["사과"], self.vector_search)
+        self.assertEqual(results[0][0].metadata["식품명"], "사과_생것")
+        self.assertEqual(self.vector_queries, [])
+
+    def test_unconfident_lexical_match_is_fused(self):
+        results = hybrid.hybrid_search(["사과", "딸기 우유", "콜라"], self.vector_search)
+        self.assertEqual(self.vector_queries, ["콜라"])
+        self.assertEqual([documents[0].metadata["식품명"] for documents in results[:2]], ["사과_생것", "우유_딸기"])
+        self.assertEqual(results[2][0].metadata["식품명"], "우유_딸기")
+
+    def test_ingredient_match_is_fused_with_vector_results(self):
+        self.vector_name = "배추김치"
+        results = hybrid.hybrid_search(["김치", "계란"], self.vector_search)
+        self.assertEqual(self.vector_queries, ["김치", "계란"])
+        self.assertIn("배추김치", [document.metadata["식품명"] for document in results[0]])
+        self.assertNotEqual(results[1][0].metadata["식품명"], "계란 덮밥")
+
+    def test_fuzzy_match_is_fused_with_vector_results(self):
+        results = hybrid.hybrid_search(["삽겹살"], self.vector_search)
+        self.assertEqual(self.vector_queries, ["삽겹살"])
+        self.assertEqual(results[0][0].metadata["식품명"], "삼겹살구이")
+        self.assertIn("우유_딸기", [document.metadata["식품명"] for document in results[0]])
+
+    def test_rrf_counts_each_name_once_per_list(self):
+        def document(name):
+            return Document(page_content=name, metadata={"식품명": name})
+
+        fused = hybrid.rrf_fuse([
+            [document("삼겹살구이")],
+            [document("삼겹살구이"), document("흰죽"), document("흰죽"), document("흰죽")],
+        ])
+        self.assertEqual([item.page_content for item in fused], ["삼겹살구이", "흰죽"])
+
+
+class MmapVectorStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.embeddings = FakeEmbeddings()
+
+    def test_from_texts_searches_embedded_texts(self):
+        store = MmapVectorStore.from_texts(
+            ["김치찌개_삼겹살", "사과_생것", "우유_딸기"], self.embeddings,
+            metadatas=[{"식품명": "김치찌개_삼겹살"}, {"식품명": "사과_생것"}, {"식품명": "우유_딸기"}],
+        )
+        # 임시 파일은 지워지지만 열어 둔 mapping으로 계속 검색합니다.
+        self.assertFalse(os.path.exists(store.path))
+        self.assertEqual(len(store), 3)
+
+        (document,) = store.similarity_search("사과 생것", k=1)
+        self.assertEqual(document.page_content, "사과_생것")
+        self.assertEqual(document.metadata, {"식품명": "사과_생것"})
+        self.assertEqual(document.id, "1")
+
+    def test_from_texts_keeps_given_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "vectors.bin")
+            store = MmapVectorStore.from_texts(["우유", "우유_딸기"], self.embeddings, ids=["a", "b"], path=path)
+
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(MmapVectorStore(path).search_many([self.embeddings.embed_query("우유")], k=2)[0][0].id, "a")
+            self.assertEqual(store.similarity_search("우유_딸기", k=1)[0].id, "b")
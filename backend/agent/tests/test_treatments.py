@@ -0,0 +1,56 @@
+import unittest
+from datetime import datetime, timezone, timedelta
+
+from agent.treatments import TreatmentBuffer
+from agent.utils import COB_calculator, IOB_calculator
+
+NOW = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def treatment(minutes_ago: float, insulin=None, carbs=None) -> dict:
+    return {"created_at": NOW - timedelta(minutes=minutes_ago), "insulin": insulin, "carbs": carbs}
+
+
+class TreatmentBufferTests(unittest.TestCase):
+
+    def test_matches_calculators(self):
+        # 기존 IOB_calculator/COB_calculator와 같은 값을 계산합니다.
+        records = [treatment(30, insulin=4.0, carbs=60), treatment(120, insulin=2.0), treatment(200, carbs=20)]
+        buffer = TreatmentBuffer()
+        buffer.extend(records)
+
+        boluses = [{"minutes_ago": 30, "recent_bolus": 4.0}, {"minutes_ago": 120, "recent_bolus": 2.0}]
+        carbs = [{"minutes_ago": 30, "recent_carb": 60}, {"minutes_ago": 200, "recent_carb": 20}]
+        for curve in ("linear", "exponential", "biexponential"):
+            with self.subTest(curve=curve):
+                self.assertEqual(buffer.iob(NOW, curve), IOB_calculator(boluses, curve))
+        for curve in ("linear", "triangle"):
+            with self.subTest(curve=curve):
+                self.assertEqual(buffer.cob(NOW, curve), COB_calculator(carbs, curve))
+
+    def test_extend_skips_duplicates_and_grows(self):
+        buffer = TreatmentBuffer(capacity=2)
+        self.assertEqual(buffer.extend([treatment(10, insulin=1.0), treatment(10, insulin=1.0)]), 1)
+        self.assertEqual(buffer.extend([treatment(minutes, insulin=1.0) for minutes in range(20, 60, 10)]), 4)
+        self.assertEqual(len(buffer), 5)
+        self.assertEqual(buffer.iob(NOW, "linear"), IOB_calculator(
+            [{"minutes_ago": minutes, "recent_bolus": 1.0} for minutes in range(10, 60, 10)], "linear",
+        ))
+
+    def test_expire_and_late_records(self):
+        buffer = TreatmentBuffer()
+        buffer.extend([treatment(400, insulin=3.0), treatment(60, insulin=2.0)])
+        # 업로더가 늦게 올린 과거 기록은 뒤에 붙지만, 계산할 때 시각 범위로 거릅니다.
+        buffer.extend([treatment(350, insulin=5.0)])
+        self.assertEqual(buffer.iob(NOW, "exponential"), IOB_calculator([{"minutes_ago": 60, "recent_bolus": 2.0}], "exponential"))
+
+        self.assertEqual(buffer.expire(NOW), 1)
+        self.assertEqual(len(buffer), 2)
+
+    def test_reset_reports_changes(self):
+        buffer = TreatmentBuffer()
+        records = [treatment(30, insulin=4.0), treatment(90, carbs=40)]
+        self.assertTrue(buffer.reset(records))
+        self.assertFalse(buffer.reset(list(reversed(records))))
+        self.assertTrue(buffer.reset(records[:1]))
+        self.assertEqual(buffer.cob(NOW), 0)
@@ -0,0 +1,48 @@
+import unittest
+
+from agent.benchmarks.triage_bench import load_utterances
+from agent.nodes.triage import classify
+from agent.settings import TRIAGE_CONFIDENCE_THRESHOLD
+
+
+class TriageClassifierTests(unittest.TestCase):
+    """LLM 없이 분류한 결과(confidence가 threshold 이상)는 틀리면 안 됩니다."""
+
+    def assertNotConfidentDosing(self, text):
+        label, confidence = classify(text)
+        if label != "query":
+            self.assertLess(confidence, TRIAGE_CONFIDENCE_THRESHOLD, f"{text} -> {label} {confidence:.3f}")
+
+    def test_glucose_questions_are_not_dosing(self):
+        for text in ["혈당 200 넘으면 위험해?", "혈당 180이면 정상이야?", "혈당 250이면 운동해도 돼?", "떡볶이 먹으면 혈당 많이 올라?"]:
+            with self.subTest(text=text):
+                self.assertNotConfidentDosing(text)
+
+    def test_low_or_normal_glucose_is_not_correction(self):
+        # 혈당이 떨어지는 중이거나 정상 수치를 알리는 문장은 교정 인슐린 경로로 보내면 안 됩니다.
+        for text in ["혈당이 떨어져서 어지러워", "혈당 떨어져서 사탕 먹었어", "혈당 120이야", "혈당 100 나왔어", "혈당 60이야",
+                     "저혈당인데 인슐린 맞아도 돼?"]:
+            with self.subTest(text=text):
+                label, confidence = classify(text)
+                if label == "correction":
+                    self.assertLess(confidence, TRIAGE_CONFIDENCE_THRESHOLD, f"{text} -> {confidence:.3f}")
+
+    def test_high_reading_is_correction(self):
+        for text in ["혈당 270이야", "혈당이 200 이상이에요", "운동했는데도 혈당이 안 떨어져 지금 230"]:
+            with self.subTest(text=text):
+                self.assertEqual(classify(text)[0], "correction")
+                self.assertGreaterEqual(classify(text)[1], TRIAGE_CONFIDENCE_THRESHOLD)
+
+    def test_correction_with_dosing_intent(self):
+        for text in ["혈당이 280이야 교정 인슐린 얼마나 맞아?", "혈당 250 넘으면 교정 몇 단위 맞아야 해?", "cgm 보니까 혈당 270이야"]:
+            with self.subTest(text=text):
+                label, confidence = classify(text)
+                self.assertEqual(label, "correction")
+                self.assertGreaterEqual(confidence, TRIAGE_CONFIDENCE_THRESHOLD)
+
+    def test_confident_labels_are_correct(self):
+        for row in load_utterances("all"):
+            label, confidence = classify(row["text"])
+            if confidence >= TRIAGE_CONFIDENCE_THRESHOLD:
+                with self.subTest(text=row["text"]):
+                    self.assertEqual(label, row["label"])
@@ -1,45 +1,158 @@
+import asyncio
+import os
+import numpy as np
+from langchain_core.documents import Document
 from langchain_core.tools import tool
-from langchain_upstage import UpstageEmbeddings
-from langchain_chroma import Chroma
-from .settings import QUERY_EMBEDDING_MODEL_NAME, PERSIST_DIRECTORY, COLLECTION_NAME
+from .lazy import lazy
+from .metrics import timed
+from .retrieval.hybrid import hybrid_search, ahybrid_search
+from .retrieval.embedding_cache import EmbeddingCache
+from .retrieval.mmap_store import MmapVectorStore
+from .retrieval.nutrition_table import get_nutrition_table
+from .settings import QUERY_EMBEDDING_MODEL_NAME, PERSIST_DIRECTORY, COLLECTION_NAME, HYBRID_CANDIDATES, VECTOR_STORE_PATH
+from .settings import NUTRITION_TOOL_OUTPUT
+
+# 임베딩 client와 vectorDB는 처음 사용할 때 프로세스마다 한 번 생성합니다.
+# (import 시점에는 네트워크 연결이나 Chroma 로드가 일어나지 않습니다.)
 
 # nutrition_retriever 정의
-query_embeddings = UpstageEmbeddings(model=QUERY_EMBEDDING_MODEL_NAME)
+@lazy
+def get_query_embeddings():
+    from langchain_upstage import UpstageEmbeddings
+    return UpstageEmbeddings(model=QUERY_EMBEDDING_MODEL_NAME)
 
 # vectorDB 로드
-vectorDB = Chroma(
-    persist_directory=PERSIST_DIRECTORY,
-    embedding_function=query_embeddings,
-    collection_name=COLLECTION_NAME
-)
+# ingest_nutrition 명령이 컴파일한 mmap 파일이 있으면 그것을, 없으면 Chroma를 사용합니다.
+# (entrypoint.sh가 시작할 때 ingest_nutrition --compile-only로 chroma_db에서 다시 컴파일합니다.)
+@lazy
+def get_vector_store():
+    if os.path.exists(VECTOR_STORE_PATH):
+        return MmapVectorStore(VECTOR_STORE_PATH, embedding=get_query_embeddings())
+
+    from langchain_chroma import Chroma
+    return Chroma(
+        persist_directory=PERSIST_DIRECTORY,
+        embedding_function=get_query_embeddings(),
+        collection_name=COLLECTION_NAME
+    )
 
 # retrievr 객체 생성
-nutrition_retriever = vectorDB.as_retriever(search_kwargs={'k':3})
+@lazy
+def get_nutrition_retriever():
+    return get_vector_store().as_retriever(search_kwargs={'k':3})
 
-# RAG health_Check
-print(nutrition_retriever.invoke("삽겹살 구이"))
+# RAG health_Check (warmup.py에서 명시적으로 호출합니다.)
+def health_check() -> list:
+    return get_nutrition_retriever().invoke("삽겹살 구이")
 
-# tools(도구 가방)
-tools = []
+# 검색어 임베딩 캐시 (memory LRU + 모든 worker가 공유하는 SQLite 파일)
+get_embedding_cache = lazy(EmbeddingCache)
 
-# Document Retriever 도구(영양 성분 쿼리)
-# 추후에 BM25와 결합한 Hybrid Retriever로 바꿀 필요 있음.
-@tool
-def nutrition_retriever_tool(query: str) -> str:
-    """
-    음식의 영양 정보를 확인할 때 사용합니다.
-    '짬뽕', '김치볶음밥', '포도'과 같은 음식 이름 또는 원재료명이 들어왔을 때 사용합니다.
-    100g 기준값이므로, 1인분용량에 맞게 곱해서 적절히 사용합니다.
-    """
+# 여러 검색어를 한 번의 요청으로 임베딩하는 함수
+# UpstageEmbeddings.embed_documents는 passage 모델을 사용하므로, query 모델로 직접 요청합니다.
+# 캐시에 있는 검색어는 요청하지 않고, 나머지만 한 번에 요청합니다.
+def embed_queries(queries: list) -> list:
+    query_embeddings = get_query_embeddings()
+    params = query_embeddings._invocation_params
+    params["model"] = params["model"] + "-query"
+
+    cache = get_embedding_cache()
+    vectors = cache.get_many(params["model"], queries)
+    missing = list(dict.fromkeys(query for query, vector in zip(queries, vectors) if vector is None))
+    if not missing:
+        return vectors
+
+    with timed("retriever", "embed"):
+        data = query_embeddings.client.create(input=missing, **params).data
+    fetched = [item.embedding for item in data]
+    cache.put_many(params["model"], missing, fetched)
+
+    return _fill(queries, vectors, dict(zip(missing, fetched)))
+
+async def aembed_queries(queries: list) -> list:
+    query_embeddings = get_query_embeddings()
+    params = query_embeddings._invocation_params
+    params["model"] = params["model"] + "-query"
+
+    cache = get_embedding_cache()
+    # 메모리에 없는 검색어는 SQLite를 읽으므로(다른 worker의 쓰기 lock을 기다릴 수 있습니다) thread pool에서 실행합니다.
+    vectors = await asyncio.to_thread(cache.get_many, params["model"], queries)
+    missing = list(dict.fromkeys(query for query, vector in zip(queries, vectors) if vector is None))
+    if not missing:
+        return vectors
+
+    with timed("retriever", "embed"):
+        data = (await query_embeddings.async_client.create(input=missing, **params)).data
+    fetched = [item.embedding for item in data]
+    # SQLite 쓰기는 다른 worker와 lock을 기다릴 수 있으므로 thread pool에서 실행합니다.
+    await asyncio.to_thread(cache.put_many, params["model"], missing, fetched)
 
-    datas = nutrition_retriever.invoke(query)
+    return _fill(queries, vectors, dict(zip(missing, fetched)))
+
+def _fill(queries: list, vectors: list, fetched: dict) -> list:
+    return [vector if vector is not None else fetched[query] for query, vector in zip(queries, vectors)]
+
+
+# 여러 음식의 영양 정보를 한 번에 검색하는 함수
+# 음식 이름 lexical 색인(BM25)으로 먼저 찾고, 확실하지 않은 검색어만 벡터 검색과 합칩니다. (retrieval/hybrid.py)
+def search_nutrition(queries: list) -> list:
+    if not queries:
+        return []
+
+    return hybrid_search(queries, vector_search)
+
+async def asearch_nutrition(queries: list) -> list:
+    if not queries:
+        return []
+
+    return await ahybrid_search(queries, avector_search)
+
+# 벡터 검색: 임베딩은 한 번에 요청하고, 모든 검색어를 collection에 한 번의 multi-query로 검색합니다.
+def vector_search(queries: list) -> list:
+    vectors = embed_queries(queries)
+    vector_store = get_vector_store()
+
+    with timed("retriever", "search"):
+        return similarity_search_many(vector_store, vectors)
+
+async def avector_search(queries: list) -> list:
+    vectors = await aembed_queries(queries)
+    vector_store = get_vector_store()
+
+    with timed("retriever", "search"):
+        return await asyncio.to_thread(similarity_search_many, vector_store, vectors)
+
+def similarity_search_many(vector_store, vectors: list, k: int = HYBRID_CANDIDATES) -> list:
+    """벡터 목록을 한 번에 검색하여 벡터 별 Document 목록을 반환합니다."""
+    if isinstance(vector_store, MmapVectorStore):
+        return vector_store.search_many(vectors, k=k)
+
+    collection = getattr(vector_store, "_collection", None)
+    if collection is None:
+        # Chroma가 아닌 vector store(benchmarks의 InMemoryVectorStore 등)는 벡터마다 검색합니다.
+        return [vector_store.similarity_search_by_vector(vector, k=k) for vector in vectors]
+
+    result = collection.query(query_embeddings=vectors, n_results=k, include=["documents", "metadatas"])
+    return [
+        [Document(page_content=document or "", metadata=metadata or {}) for document, metadata in zip(documents, metadatas)]
+        for documents, metadatas in zip(result["documents"], result["metadatas"])
+    ]
+
+
+# 검색된 문서를 LLM이 읽기 쉬운 텍스트로 변환하는 함수
+def format_nutrition_docs(datas: list) -> str:
 
     if not datas:
         return "검색 결과, 해당 음식에 대한 정보를 찾을 수 없습니다."
     
     formatted_results = []
 
-    for data in datas:
+    # 1인분 탄수화물량은 영양 성분 표에서 한 번에 계산하여 함께 전달합니다. (LLM이 직접 곱하지 않도록)
+    # (검색된 문서 자신의 값으로 계산합니다. 같은 이름의 다른 행과 섞이지 않도록)
+    table, food_ids = get_nutrition_table().lookup([data.metadata for data in datas])
+    serving_carbs = table.carbs(food_ids)
+
+    for i, data in enumerate(datas):
         food_name = data.metadata.get('식품명', '')
         carbs = data.metadata.get('탄수화물(g)', '')
         protein = data.metadata.get('단백질(g)', '')
@@ -54,13 +167,127 @@ def nutrition_retriever_tool(query: str) -> str:
 탄수화물: {carbs}, 단백질: {protein}, 지방: {fat}
 기준량: {standard_weight}, 1인분용량: {serving_weight}
 """
+        if not np.isnan(serving_carbs[i]):
+            result_str += f"1인분 탄수화물: {serving_carbs[i]:.1f}g\n"
         formatted_results.append(result_str)
         
     return "\n\n".join(formatted_results)
 
+
+# 검색된 음식마다 1인분 영양 정보(dict)를 계산하는 함수
+# 영양 성분 표에서 한 번의 배열 연산으로 계산합니다.
+def nutrition_facts(metadatas: list) -> list:
+    # 표에 없는 음식(원본과 다른 벡터DB 등)이 있으면 메타데이터에서 바로 변환합니다.
+    table, food_ids = get_nutrition_table().lookup(metadatas)
+
+    rows = table.table[food_ids]
+    carbs = table.carbs(food_ids)
+    kcal = rows["energy"] * rows["serving_g"] / rows["standard_g"]
+
+    return [
+        {
+            "food": metadata.get('식품명'),
+            "serving": metadata.get('1인분용량') or metadata.get('기준량'),
+            "serving_g": _round(rows["serving_g"][i], 1),
+            "carbs_per_100g": _round(rows["carbs"][i], 2),
+            "carbs_per_serving": _round(carbs[i], 1),
+            "kcal_per_serving": _round(kcal[i], 1),
+        }
+        for i, metadata in enumerate(metadatas)
+    ]
+
+def _round(value, digits: int):
+    return None if np.isnan(value) else round(float(value), digits)
+
+# 여러 음식의 검색 결과를 음식 당 하나의 dict로 요약하는 함수 (가장 유사한 음식 + 다른 후보 이름)
+def compact_nutrition(queries: list, results: list) -> list:
+    facts = iter(nutrition_facts([datas[0].metadata for datas in results if datas]))
+
+    compact = []
+    for query, datas in zip(queries, results):
+        if not datas:
+            compact.append({"query": query, "food": None})
+            continue
+        fact = next(facts)
+        compact.append({
+            "query": query,
+            **fact,
+            "alternatives": list(dict.fromkeys(
+                data.metadata.get('식품명') for data in datas[1:] if data.metadata.get('식품명') != fact["food"]
+            )),
+        })
+    return compact
+
+# 영양 정보 하나를 한 줄로 변환하는 함수
+# known(이 대화에서 이미 보낸 음식)에 있으면 탄수화물량만 남깁니다.
+def format_fact(fact: dict, known=()) -> str:
+    carbs = f"{fact['carbs_per_serving']}g" if fact['carbs_per_serving'] is not None else "정보없음"
+    if fact["food"] in known:
+        return f"{fact['food']}: 앞에서 확인함, 1인분 탄수화물 {carbs}"
+    return f"{fact['food']}: 1인분 {fact['serving']}, 탄수화물 {carbs} (100g 당 {fact['carbs_per_100g']}g)"
+
+# 단일 검색 결과를 음식 당 한 줄의 텍스트로 변환하는 함수 (같은 이름의 음식은 한 번만)
+def format_nutrition_compact(facts: list, known=()) -> str:
+    if not facts:
+        return "검색 결과, 해당 음식에 대한 정보를 찾을 수 없습니다."
+    unique = {}
+    for fact in facts:
+        unique.setdefault(fact["food"], fact)
+    return "\n".join(f"- {format_fact(fact, known)}" for fact in unique.values())
+
+# 요약된 batch 검색 결과를 음식 당 한 줄의 텍스트로 변환하는 함수
+def format_nutrition_batch(items: list, known=()) -> str:
+    lines = []
+    for item in items:
+        if not item["food"]:
+            lines.append(f"- {item['query']}: 검색 결과 없음")
+            continue
+        lines.append(f"- {item['query']} -> {format_fact(item, known)}")
+    return "\n".join(lines)
+
+# 도구 결과 형식: compact(음식 당 한 줄) 또는 verbose(음식 당 여러 줄의 원본 값)
+def format_nutrition(datas: list, known=()) -> str:
+    if NUTRITION_TOOL_OUTPUT == "verbose":
+        return format_nutrition_docs(datas)
+    return format_nutrition_compact(nutrition_facts([data.metadata for data in datas]), known)
+
+
+# tools(도구 가방)
+tools = []
+
+# Document Retriever 도구(영양 성분 쿼리)
+# BM25(음식 이름)와 벡터 검색을 결합한 Hybrid Retriever를 사용합니다.
+@tool
+def nutrition_retriever_tool(query: str) -> str:
+    """
+    음식의 영양 정보를 확인할 때 사용합니다.
+    '짬뽕', '김치볶음밥', '포도'과 같은 음식 이름 또는 원재료명이 들어왔을 때 사용합니다.
+    음식 당 한 줄로 1인분 용량과 1인분 탄수화물(계산된 값), 100g 당 탄수화물을 반환합니다.
+    1인분 탄수화물은 계산된 값이므로 그대로 사용합니다.
+    """
+
+    datas = search_nutrition([query])[0]
+
+    return format_nutrition(datas)
+
 tools.append(nutrition_retriever_tool)
 
 
+# 여러 음식의 영양 정보를 한 번에 확인하는 도구
+# 임베딩 요청과 벡터DB 검색이 음식 수와 관계없이 한 번이므로, 음식이 많아도 지연 시간이 거의 늘지 않습니다.
+@tool
+def nutrition_batch_retriever_tool(queries: list[str]) -> str:
+    """
+    한 끼에 음식이 여러 개일 때, 모든 음식의 영양 정보를 한 번에 확인할 때 사용합니다.
+    ['밥', '김치찌개', '계란말이']처럼 음식 이름 목록을 넣습니다.
+    음식마다 가장 유사한 음식과 1인분 탄수화물량(계산된 값)을 한 줄씩 반환합니다.
+    """
+
+    return format_nutrition_batch(compact_nutrition(queries, search_nutrition(queries)))
+
+tools.append(nutrition_batch_retriever_tool)
+
+
 # 2. 인슐린 계산 함수를 만들어 도구로 제공합니다.
 @tool
 def insulin_calculation(
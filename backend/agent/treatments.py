@@ -0,0 +1,131 @@
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from . import curves
+from .settings import INSULIN_CURVE, CARB_CURVE
+from .utils import TREATMENT_WINDOW
+
+## 최근 주사/식사 기록의 ring buffer와 IOB/COB 계산
+# * IOB_calculator/COB_calculator는 5시간치 기록(dict 목록)을 매번 처음부터 다시 만들고 합산합니다.
+#   대신 (시각, 인슐린, 탄수화물)을 float64 배열 3개의 ring buffer에 쌓아 두고, 새 기록만 추가합니다.
+# * 작업순서:
+#   1. extend(): 새로 들어온 기록을 뒤에 추가합니다. (같은 기록이 다시 들어오면 무시합니다.)
+#      가득 차면 배열 크기를 두 배로 늘립니다.
+#      reset(): 다시 조회한 기록 전체로 바꾸고, 수정/삭제된 기록이 있었는지 알려줍니다.
+#   2. expire(now): 앞에서부터 작용 시간(horizon)이 지난 기록을 버립니다.
+#   3. iob(at)/cob(at): 남은 기록 전체를 curves.py의 곡선으로 한 번에 계산합니다. DB는 조회하지 않습니다.
+#      iob_curve(grid)/cob_curve(grid)는 여러 시각(예: 앞으로 6시간, 5분 간격)의 값을 한 번에 계산합니다.
+# * 기록은 대부분 시각 순서로 들어오지만, 업로더가 늦게 올린 과거 기록이 뒤에 붙을 수 있습니다.
+#   그래서 expire()는 앞쪽만 버리고, 계산할 때 시각 범위로 한 번 더 거릅니다.
+
+
+class TreatmentBuffer:
+
+    def __init__(self, capacity: int = 64, horizon: float = TREATMENT_WINDOW.total_seconds()):
+        self.horizon = horizon
+        self._times = np.zeros(capacity)   # utc timestamp(초)
+        self._insulin = np.zeros(capacity)  # 없으면 NaN
+        self._carbs = np.zeros(capacity)    # 없으면 NaN
+        self._start = 0
+        self._size = 0
+        self._keys = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    # 1. 추가
+    def extend(self, treatments: list) -> int:
+        """utils.parse_treatment() 형식의 기록 목록을 추가합니다. 추가한 기록 수를 반환합니다."""
+        with self._lock:
+            return sum(self._append(treatment) for treatment in treatments)
+
+    def reset(self, treatments: list) -> bool:
+        """
+        buffer를 treatments로 바꿉니다. 읽는 쪽이 빈 buffer를 보지 않도록 lock 안에서 한 번에 바꿉니다.
+
+        Returns:
+            기록이 바뀌었는지 여부 (수정/삭제/추가된 기록이 있으면 True)
+        """
+        with self._lock:
+            previous = set(self._keys)
+            self._start = self._size = 0
+            self._keys.clear()
+            for treatment in treatments:
+                self._append(treatment)
+            return self._keys != previous
+
+    def _append(self, treatment: dict) -> bool:
+        """lock을 잡은 상태에서 기록 하나를 추가합니다. 이미 있는 기록이면 False를 반환합니다."""
+        key = (treatment["created_at"].timestamp(), treatment["insulin"], treatment["carbs"])
+        if key in self._keys:
+            return False
+        if self._size == len(self._times):
+            self._grow()
+        index = (self._start + self._size) % len(self._times)
+        self._times[index] = key[0]
+        self._insulin[index] = np.nan if key[1] is None else key[1]
+        self._carbs[index] = np.nan if key[2] is None else key[2]
+        self._keys.add(key)
+        self._size += 1
+        return True
+
+    def _grow(self) -> None:
+        order = self._order()
+        self._times, self._insulin, self._carbs = (
+            np.concatenate([array[order], np.zeros(len(array))]) for array in (self._times, self._insulin, self._carbs)
+        )
+        self._start = 0
+
+    def _order(self) -> np.ndarray:
+        return (self._start + np.arange(self._size)) % len(self._times)
+
+    # 2. 만료
+    def expire(self, now: datetime) -> int:
+        """앞에서부터 horizon이 지난 기록을 버립니다. 버린 기록 수를 반환합니다."""
+        cutoff = now.timestamp() - self.horizon
+        expired = 0
+        with self._lock:
+            while self._size and self._times[self._start] < cutoff:
+                self._keys.discard(self._key(self._start))
+                self._start = (self._start + 1) % len(self._times)
+                self._size -= 1
+                expired += 1
+        return expired
+
+    def _key(self, index: int) -> tuple:
+        insulin, carbs = self._insulin[index], self._carbs[index]
+        return (
+            float(self._times[index]),
+            None if np.isnan(insulin) else insulin.item(),
+            None if np.isnan(carbs) else carbs.item(),
+        )
+
+    # 3. 계산
+    def records(self, start: float = None) -> tuple:
+        """(시각, 인슐린, 탄수화물) 배열의 복사본. start(utc timestamp)를 주면 start 기준 horizon 밖의 기록은 뺍니다."""
+        with self._lock:
+            order = self._order()
+            times, insulin, carbs = self._times[order], self._insulin[order], self._carbs[order]
+        if start is None:
+            return times, insulin, carbs
+        mask = times >= start - self.horizon
+        return times[mask], insulin[mask], carbs[mask]
+
+    def iob_curve(self, grid: np.ndarray, curve: str = INSULIN_CURVE, **params) -> np.ndarray:
+        """grid(utc timestamp 배열)의 시각마다 IOB를 계산합니다."""
+        times, insulin, _ = self.records(grid[0])
+        return curves.iob(times, insulin, grid, curve, **params)
+
+    def cob_curve(self, grid: np.ndarray, curve: str = CARB_CURVE, **params) -> np.ndarray:
+        """grid(utc timestamp 배열)의 시각마다 COB를 계산합니다."""
+        times, _, carbs = self.records(grid[0])
+        return curves.cob(times, carbs, grid, curve, **params)
+
+    def iob(self, at: datetime, curve: str = INSULIN_CURVE, **params) -> float:
+        return round(float(self.iob_curve(np.array([at.timestamp()]), curve, **params)[0]), 2)
+
+    def cob(self, at: datetime, curve: str = CARB_CURVE, **params) -> float:
+        return round(float(self.cob_curve(np.array([at.timestamp()]), curve, **params)[0]), 2)
@@ -1,165 +1,224 @@
 import os
+import numpy as np
 import pymongo
 from dotenv import load_dotenv
 from datetime import datetime, timezone, timedelta
+from . import curves
+from .lazy import lazy
+from .metrics import MongoCommandListener
+from .settings import INSULIN_CURVE, CARB_CURVE
 
 # 환경 변수 로드
 load_dotenv()
 
-# pymongo를 통해 mongodb client 생성
 MONGODB_URI = os.environ.get('MONGODB_URI')
-client = pymongo.MongoClient(MONGODB_URI)
-
-db = client['test']
-
-# 각 collection을 변수에 할당
-entries = db['entries']
-treatments = db['treatments']
-
-
-# 1. get_health_data() 생성
-def get_health_data() -> dict:
-    """
-    데이터베이스에서 사용자의 혈당 및 인슐린 정보를 가져옵니다.
-    이 도구는 별도의 입력 없이 항상 최신 정보를 반환합니다.
-    """
-
-    # 현재 시간 설정(utc 기준)
-    now_utc = datetime.now(timezone.utc)
-    # 현재 시간 설정(한국 기준)
-    now_korea = datetime.now(timezone.utc).astimezone(timezone(timedelta(hours=9))).isoformat()
-
-    # 1. 최근 혈당 데이터 가져오기
-    latest_entry = entries.find_one(sort=[('date', pymongo.DESCENDING)])
 
-    # 2. 최근 5시간 사이의 모든 주사 기록 가져오기
-    # 5시간 전 시간 계산
-    five_hours_ago = datetime.now(timezone.utc) - timedelta(hours=5)
-
-    # 최근 5시간 내에 생성되었고, 인슐린이나 탄수화물 값이 존재하는 모든 문서 조회
-    cursor = treatments.find({
+# pymongo를 통해 mongodb client 생성
+# MongoClient는 fork 이후에 재사용할 수 없으므로, 프로세스마다 처음 사용할 때 생성합니다.
+# 모든 조회의 실행 시간은 MongoCommandListener가 기록합니다.
+@lazy
+def get_db():
+    client = pymongo.MongoClient(MONGODB_URI, event_listeners=[MongoCommandListener()])
+    return client['test']
+
+
+# Nightscout 조회에서 가져올 필드 (mongo_indexes.py의 색인과 함께 관리합니다.)
+# treatments는 _id를 빼면 색인(created_at, insulin, carbs)만으로 응답하는 covered query가 될 수 있습니다.
+ENTRY_PROJECTION = {'_id': 0, 'sgv': 1}
+ENTRY_HISTORY_PROJECTION = {'_id': 0, 'sgv': 1, 'date': 1}
+TREATMENT_PROJECTION = {'_id': 0, 'created_at': 1, 'insulin': 1, 'carbs': 1}
+ENTRY_SORT = [('date', pymongo.DESCENDING)]
+TREATMENT_SORT = [('created_at', pymongo.DESCENDING)]
+
+
+# 최근에 생성되었고, 인슐린이나 탄수화물 값이 존재하는 treatments 문서의 조회 조건
+# ($gt: 0은 필드가 없는 문서와 일치하지 않으므로 $exists를 따로 쓰지 않습니다. $exists가 있으면 색인만으로 응답할 수 없습니다.)
+def treatments_filter(since: datetime) -> dict:
+    return {
         'created_at': {
-            '$gte': five_hours_ago.isoformat()
+            '$gte': since.isoformat()
         },
         '$or': [
             {
                 'insulin': {
-                    '$exists': True,
                     '$gt': 0
                 }
             },
             {
                 'carbs': {
-                    '$exists': True,
                     '$gt': 0
                 }
             }
         ]
-    },
-        sort=[('created_at', pymongo.DESCENDING)]
+    }
+
+
+# 최근 몇 시간의 주사/식사 기록을 사용하는지
+TREATMENT_WINDOW = timedelta(hours=5)
+
+
+# 1. get_health_data() 생성
+# Nightscout에서 최근 혈당과 최근 5시간의 주사/식사 기록을 가져옵니다.
+# 기록의 시각은 "몇 분 전"이 아닌 utc datetime으로 두어, 가져온 뒤 시간이 지나도 다시 계산할 수 있게 합니다. (health.py)
+def fetch_health_records(db=None) -> dict:
+    db = get_db() if db is None else db
+
+    # 1. 최근 혈당 데이터 가져오기
+    # 2. 최근 5시간 사이의 모든 주사 기록 가져오기
+    return {
+        "latest_blood_sugar": fetch_latest_blood_sugar(db),
+        "treatments": fetch_treatments(db),
+    }
+
+
+def fetch_latest_blood_sugar(db=None):
+    db = get_db() if db is None else db
+    latest_entry = db['entries'].find_one(projection=ENTRY_PROJECTION, sort=ENTRY_SORT)
+    return latest_entry.get('sgv') if latest_entry else None
+
+
+# 최근 CGM 기록 limit개를 새 기록부터 가져옵니다. (forecast.py의 추세 계산에 사용)
+# date는 Nightscout의 epoch milliseconds이며, 없으면 timestamp는 None입니다.
+# after(utc timestamp, 초)를 주면 그보다 뒤에 측정된 기록만 가져옵니다. (health.py의 증분 조회)
+def fetch_recent_entries(limit: int, db=None, after: float = None) -> list:
+    db = get_db() if db is None else db
+    query = {} if after is None else {'date': {'$gt': int(after * 1000)}}
+    cursor = db['entries'].find(query, projection=ENTRY_HISTORY_PROJECTION, sort=ENTRY_SORT, limit=limit)
+    return [
+        {"sgv": entry.get('sgv'), "timestamp": entry['date'] / 1000 if entry.get('date') else None}
+        for entry in cursor
+    ]
+
+
+def fetch_treatments(db=None, since: datetime = None) -> list:
+    db = get_db() if db is None else db
+
+    # 5시간 전 시간 계산
+    five_hours_ago = datetime.now(timezone.utc) - TREATMENT_WINDOW
+
+    # 최근 5시간 내에 생성되었고, 인슐린이나 탄수화물 값이 존재하는 모든 문서 조회
+    # since를 주면 그 시각 이후에 생성된 기록만 조회합니다. (health.py의 증분 조회)
+    cursor = db['treatments'].find(
+        treatments_filter(max(five_hours_ago, since) if since else five_hours_ago),
+        projection=TREATMENT_PROJECTION,
+        sort=TREATMENT_SORT,
     )
+    return [parse_treatment(bolus) for bolus in cursor]
+
+
+def parse_treatment(bolus: dict) -> dict:
+    # DB에서 가져온 created_at 문자열을 datetime으로 변환해야 함.
+    # Z(Zulu)를 처리하기 위해 00:00으로 바꿔줘야 함.
+    created_at = datetime.fromisoformat(bolus.get('created_at').replace('Z', '+00:00'))
+    return {"created_at": created_at, "insulin": bolus.get('insulin'), "carbs": bolus.get('carbs')}
+
+
+# fetch_health_records()의 결과를 now_utc 기준으로 LLM이 이해하기 쉽게 포장합니다.
+def health_data_at(records: dict, now_utc: datetime = None) -> dict:
+    # 현재 시간 설정(utc 기준)
+    now_utc = now_utc or datetime.now(timezone.utc)
+    # 현재 시간 설정(한국 기준)
+    now_korea = now_utc.astimezone(timezone(timedelta(hours=9))).isoformat()
 
     # 3. 최근 인슐린 주사 기록을 리스트로 저장합니다.
     recent_boluses_list = []
     # 4. 최근 탄수화물 섭취 기록을 리스트로 저장합니다.
     recent_carbs_list = []
 
-    for bolus in cursor:
-        # DB에서 가져온 created_at 문자열을
-        treatment_time_str = bolus.get('created_at')
-
-        # 이를 datetime으로 변환해야 함.
-        # Z(Zulu)를 처리하기 위해 00:00으로 바꿔줘야 함.
-        treatment_time_utc = datetime.fromisoformat(treatment_time_str.replace('Z', '+00:00'))
-
-        # 시간 차이 계산
-        time_difference = now_utc - treatment_time_utc
+    for treatment in records["treatments"]:
+        # 시간 차이 계산 (기록을 가져온 뒤 5시간 밖으로 밀려난 기록은 제외)
+        time_difference = now_utc - treatment["created_at"]
+        if time_difference > TREATMENT_WINDOW:
+            continue
 
         # 시간 차이를 초로 바꿨다가 다시 분으로 변환
         minutes_ago = int(time_difference.total_seconds() / 60)
 
         # 인슐린 값이 None이 아닌 경우에만 리스트에 추가
-        insulin = bolus.get('insulin')
-        if insulin is not None:
-            temp_dict = {"recent_bolus": insulin,
-                        "minutes_ago": minutes_ago}
-            recent_boluses_list.append(temp_dict)
+        if treatment["insulin"] is not None:
+            recent_boluses_list.append({"recent_bolus": treatment["insulin"], "minutes_ago": minutes_ago})
 
         # 탄수화물 값이 None이 아닌 경우에만 리스트에 추가
-        carbs = bolus.get('carbs')
-        if carbs is not None:
-            temp_dict_2 = {"recent_carb": carbs,
-                          "minutes_ago": minutes_ago}
-            recent_carbs_list.append(temp_dict_2)
+        if treatment["carbs"] is not None:
+            recent_carbs_list.append({"recent_carb": treatment["carbs"], "minutes_ago": minutes_ago})
 
     # 5. 결과를 LLM이 이해하기 쉽게 포장.
-    result = {
-        "latest_blood_sugar": latest_entry.get('sgv') if latest_entry else None,
+    return {
+        "latest_blood_sugar": records["latest_blood_sugar"],
         "time": now_korea,
         "recent_boluses": recent_boluses_list,
         "recent_carbs": recent_carbs_list,
     }
 
-    return result
+
+def get_health_data() -> dict:
+    """
+    데이터베이스에서 사용자의 혈당 및 인슐린 정보를 가져옵니다.
+    이 도구는 별도의 입력 없이 항상 최신 정보를 반환합니다.
+    """
+    return health_data_at(fetch_health_records())
 
 
 # 2. IOB(체내 잔존 인슐린) 계산 함수
-def IOB_calculator(boluses:list) -> float:
+def IOB_calculator(boluses:list, curve:str = INSULIN_CURVE, **params) -> float:
     """
     최근 주사 기록을 입력 받아 체내 잔존 인슐린(IOB)를 계산한다.
+    curve는 curves.INSULIN_CURVES의 이름입니다. (linear, exponential, biexponential)
     """
 
-    total_IOB = 0
+    if not boluses:
+        return 0
 
-    if boluses:
-        for bolus in boluses:
-            minutes_ago = int(bolus.get('minutes_ago'))
-            dose = int(bolus.get('recent_bolus'))
+    minutes_ago = np.array([float(bolus.get('minutes_ago')) for bolus in boluses])
+    doses = np.array([float(bolus.get('recent_bolus')) for bolus in boluses])
 
-            # IOB = dose * (0.5 ** (minutes_ago / 120.0))
-            IOB = dose * max(0, 1 - (minutes_ago / 265.0))
-            total_IOB += IOB
+    # 현재 시각을 0으로 두고, 주사 시각은 minutes_ago 분 전입니다.
+    total_IOB = curves.iob(-60 * minutes_ago, doses, [0.0], curve, **params)[0]
 
     # 계산된 총 IOB를 소수점 두 자리까지 반올림하여 반환합니다.
-    return round(total_IOB, 2)
+    return round(float(total_IOB), 2)
 
 
 # 3. 체내 잔존 탄수화물(COB) 계산 함수
-def COB_calculator(carbs:list, digest_speed:int = 20) -> float:
+def COB_calculator(carbs:list, curve:str = CARB_CURVE, **params) -> float:
     """
     최근 탄수화물 섭취 기록을 입력 받아 위장 내 잔존 탄수화물(COB)을 계산한다.
+    curve는 curves.CARB_CURVES의 이름입니다. (linear, triangle)
     """
 
-    total_cob = 0
+    if not carbs:
+        return 0
 
-    if carbs:
-        for carb in carbs:
-            minutes_ago = int(carb.get('minutes_ago'))
-            eaten_carb = int(carb.get('recent_carb'))
+    minutes_ago = np.array([float(carb.get('minutes_ago')) for carb in carbs])
+    eaten_carbs = np.array([float(carb.get('recent_carb')) for carb in carbs])
 
-            cob = max(0, eaten_carb - (digest_speed / 60) * minutes_ago)
-            total_cob += cob
+    total_cob = curves.cob(-60 * minutes_ago, eaten_carbs, [0.0], curve, **params)[0]
 
     # 계산된 총 COB를 소수점 두 자리까지 반올림하여 반환합니다.
-    return round(total_cob, 2)
+    return round(float(total_cob), 2)
 
 
 # 4. LLM에게 제공하기 위해 데이터를 정제하고 텍스트로 변환.
 def prepare_context_data():
     """
     에이전트 호출 전 필요한 혈당과 IOB를 계산하여 입력해주는 함수
+    (factor_node는 DB 대신 health.py의 snapshot에서 같은 값을 만듭니다.)
     """
     health_data = get_health_data()
 
-    time = health_data['time'][11:13] + "시 " + health_data['time'][14:16] + "분"
-
     iob = IOB_calculator(health_data['recent_boluses'])
 
     cob = COB_calculator(health_data['recent_carbs'])
 
+    return context_data(health_data['time'], health_data.get('latest_blood_sugar'), iob, cob)
+
+
+def context_data(time_iso: str, blood_sugar, iob: float, cob: float) -> dict:
+    time = time_iso[11:13] + "시 " + time_iso[14:16] + "분"
+
     return {
         'time': time,
-        "blood_sugar": (health_data.get('latest_blood_sugar')),
+        "blood_sugar": (blood_sugar),
         'iob': (iob),
         'cob': (cob),
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,52 @@
+import os
+
+## gunicorn worker 준비(warmup) hook
+# * agent 모듈은 import만으로는 아무 연결도 만들지 않습니다. (lazy.py 참고)
+# * gunicorn.conf.py에서 아래 두 함수를 호출합니다.
+#   1. preload(): master에서 fork 전에 실행. 읽기 전용 데이터와 라이브러리 코드를 올려 두면
+#      모든 worker가 copy-on-write로 같은 메모리 페이지를 공유합니다.
+#   2. warmup(): 각 worker에서 fork 직후 실행. (AGENT_WARMUP=1 일 때만)
+#      네트워크 client 생성과 그래프 컴파일을 첫 요청 전에 끝내 둡니다.
+
+
+def preload() -> None:
+    """master 프로세스에서 읽기 전용 상태를 미리 로드합니다. 네트워크 연결은 만들지 않습니다."""
+
+    # 무거운 라이브러리의 import 비용을 master에서 한 번만 지불합니다.
+    import langchain_google_genai  # noqa: F401
+    import langchain_upstage  # noqa: F401
+    import langchain_chroma  # noqa: F401
+
+    from . import workflow  # noqa: F401
+    from .nodes.triage import get_model
+    from .retrieval.hybrid import get_lexical_index, get_name_index, get_fuzzy_index
+    from .retrieval.nutrition_table import get_nutrition_table
+
+    get_model()
+    get_lexical_index()
+    get_name_index()
+    get_fuzzy_index()
+    get_nutrition_table()
+
+
+def warmup(health_check: bool = None) -> None:
+    """worker 프로세스에서 client를 만들고 그래프를 컴파일합니다."""
+    from .nodes.nodes import get_llm
+    from .tools import get_vector_store, health_check as rag_health_check
+    from .health import get_health_cache
+    from .utils import get_db
+    from .workflow import get_app
+
+    get_llm()
+    get_vector_store()
+    get_db()
+    get_app()
+    # 혈당/주사 기록 snapshot의 백그라운드 갱신을 첫 요청 전에 시작합니다.
+    get_health_cache().start()
+
+    if health_check is None:
+        health_check = os.environ.get("AGENT_HEALTH_CHECK") == "1"
+
+    # RAG health_Check (실제 임베딩 요청이 발생합니다.)
+    if health_check:
+        print(rag_health_check())
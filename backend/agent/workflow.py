@@ -1,5 +1,5 @@
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
 
 ## 4. Workflow(그래프 구조) 생성
 
@@ -14,22 +14,28 @@ from langgraph.checkpoint.memory import MemorySaver
 #   6. `END`와 연결하며 workflow 마무리
 
 from .nodes.nodes import (
-    AgentState, set_mode, entry_point_routing, continue_information_gathering,
+    AgentState, set_mode, entry_point_routing, continue_information_gathering, factors_ready,
     call_triage_agent, call_information_agent, call_factor_agent, call_answering_agent,
-    call_nutirion_agent, call_insulin_agent, call_cleanup_node, call_cleanup_node,)
+    call_nutirion_agent, call_insulin_agent, call_cleanup_node, call_cleanup_node,
+    acall_triage_agent, acall_information_agent, acall_factor_agent, acall_answering_agent,
+    acall_nutirion_agent, acall_insulin_agent, acall_cleanup_node,)
+from .checkpointer import build_checkpointer
+from .lazy import lazy
 
 
 # workflow 클래스 생성
 workflow = StateGraph(AgentState)
 
 # 노드 생성 및 추가
-workflow.add_node("triage_node", call_triage_agent)
-workflow.add_node("information_node", call_information_agent)
-workflow.add_node("factor_node", call_factor_agent)
-workflow.add_node("nutrition_node", call_nutirion_agent)
-workflow.add_node("insulin_node", call_insulin_agent)
-workflow.add_node("answer_node", call_answering_agent)
-workflow.add_node("cleanup_node", call_cleanup_node)
+# 모든 노드는 동기/비동기 버전을 함께 등록합니다.
+# app.invoke/stream은 동기 함수를, app.ainvoke/astream은 비동기 함수를 실행합니다.
+workflow.add_node("triage_node", RunnableLambda(call_triage_agent, afunc=acall_triage_agent))
+workflow.add_node("information_node", RunnableLambda(call_information_agent, afunc=acall_information_agent))
+workflow.add_node("factor_node", RunnableLambda(call_factor_agent, afunc=acall_factor_agent))
+workflow.add_node("nutrition_node", RunnableLambda(call_nutirion_agent, afunc=acall_nutirion_agent))
+workflow.add_node("insulin_node", RunnableLambda(call_insulin_agent, afunc=acall_insulin_agent))
+workflow.add_node("answer_node", RunnableLambda(call_answering_agent, afunc=acall_answering_agent))
+workflow.add_node("cleanup_node", RunnableLambda(call_cleanup_node, afunc=acall_cleanup_node))
 
 # 엣지 생성(workflow 흐름 설계)
 workflow.set_conditional_entry_point(
@@ -59,13 +65,31 @@ workflow.add_conditional_edges(
     }
 )
 workflow.add_edge("nutrition_node", "information_node")
-workflow.add_edge("factor_node", "insulin_node")
+workflow.add_conditional_edges(
+    "factor_node",
+    factors_ready,
+    {
+        "complete": "insulin_node",
+        "ask": END
+    }
+)
 workflow.add_edge("insulin_node", "answer_node")
 workflow.add_edge("answer_node", "cleanup_node")
 workflow.add_edge("cleanup_node", END)
 
-# 메모리는 MemorySaver에 저장합니다. state를 저장한다는 의미입니다.
-memory = MemorySaver()
-app = workflow.compile(checkpointer=memory)
+# state는 모든 worker가 공유하는 checkpointer(Postgres, 개발 환경은 SQLite)에 저장합니다.
+# DB connection은 fork 이후 재사용할 수 없으므로, 컴파일은 프로세스마다 처음 사용할 때 한 번 합니다.
+@lazy
+def get_app():
+    memory = build_checkpointer()
+    app = workflow.compile(checkpointer=memory)
+
+    print("WorkFlow 생성 완료!! ^^; b")
+    return app
+
 
-print("WorkFlow 생성 완료!! ^^; b")
\ No newline at end of file
+# 기존 코드 호환용: `from agent.workflow import app`은 처음 접근할 때 컴파일된 app을 반환합니다.
+def __getattr__(name):
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
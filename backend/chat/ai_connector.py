@@ -1,29 +1,113 @@
-from langchain_core.messages import HumanMessage, AIMessage
-from agent.workflow import app
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk
+from agent.workflow import get_app
+from agent.metrics import TurnMetrics
 
-def get_ai_response(user_message:str, thread_id:str) -> str:
+def get_ai_response(user_message:str, thread_id:str, turn:TurnMetrics = None) -> str:
     """
     사용자의 메세지를 받아 ai의 응답을 가져오는 함수.
 
     Args:
         user_message: 사용자가 입력한 메세지
         id: 대화를 식별하기 위한 고유 id
+        turn: 단계별 소요 시간을 기록할 객체 (없으면 Prometheus 지표에만 기록)
 
     Returns:
         final_response: ai의 답변
     """
 
-    config = {"configurable": {"thread_id": thread_id}}
+    turn = turn or TurnMetrics()
+    config = {"configurable": {"thread_id": thread_id}, "callbacks": [turn.handler]}
 
     inputs = {"messages": [HumanMessage(content=user_message)]}
 
 
     final_response = ""
-    for chunk in app.stream(inputs, config=config):
-        for state_update in chunk.values():
-            if "messages" in state_update:
-                last_message = state_update['messages'][-1]
-                if isinstance(last_message, AIMessage) and last_message.content:
-                    final_response += last_message.content
+    with turn.activate():
+        for chunk in get_app().stream(inputs, config=config):
+            for state_update in chunk.values():
+                if "messages" in state_update:
+                    last_message = state_update['messages'][-1]
+                    if isinstance(last_message, AIMessage) and last_message.content:
+                        final_response += last_message.content
     
-    return final_response if final_response else "죄송합니다. 오류가 발생하여 응답을 생성하지 못했습니다."
\ No newline at end of file
+    return final_response if final_response else "죄송합니다. 오류가 발생하여 응답을 생성하지 못했습니다."
+
+
+async def aget_ai_response(user_message:str, thread_id:str, turn:TurnMetrics = None) -> str:
+    """
+    get_ai_response의 비동기 버전. 그래프를 app.astream으로 실행하여
+    LLM 응답을 기다리는 동안 이벤트 루프가 다른 요청을 처리할 수 있게 합니다.
+
+    Args:
+        user_message: 사용자가 입력한 메세지
+        thread_id: 대화를 식별하기 위한 고유 id
+        turn: 단계별 소요 시간을 기록할 객체
+
+    Returns:
+        final_response: ai의 답변
+    """
+
+    turn = turn or TurnMetrics()
+    config = {"configurable": {"thread_id": thread_id}, "callbacks": [turn.handler]}
+
+    inputs = {"messages": [HumanMessage(content=user_message)]}
+
+
+    final_response = ""
+    with turn.activate():
+        async for chunk in get_app().astream(inputs, config=config):
+            for state_update in chunk.values():
+                if "messages" in state_update:
+                    last_message = state_update['messages'][-1]
+                    if isinstance(last_message, AIMessage) and last_message.content:
+                        final_response += last_message.content
+    
+    return final_response if final_response else "죄송합니다. 오류가 발생하여 응답을 생성하지 못했습니다."
+
+
+async def astream_ai_response(user_message:str, thread_id:str, turn:TurnMetrics = None):
+    """
+    그래프 실행 과정을 이벤트로 흘려보내는 비동기 제너레이터.
+
+    Args:
+        user_message: 사용자가 입력한 메세지
+        thread_id: 대화를 식별하기 위한 고유 id
+        turn: 단계별 소요 시간을 기록할 객체
+
+    Yields:
+        (event, data) 튜플
+        - ("progress", {"node": 노드 이름}): 노드 하나의 실행이 끝났을 때
+        - ("token", {"text": 텍스트 조각}): answer_node가 생성하는 토큰, 또는 다른 노드의 AI 메시지 전체
+    """
+
+    turn = turn or TurnMetrics()
+    config = {"configurable": {"thread_id": thread_id}, "callbacks": [turn.handler]}
+
+    inputs = {"messages": [HumanMessage(content=user_message)]}
+
+    # answer_node의 토큰을 이미 흘려보냈는지 여부 (중복 전송 방지)
+    answer_streamed = False
+
+    with turn.activate():
+        async for mode, chunk in get_app().astream(inputs, config=config, stream_mode=["updates", "messages"]):
+            if mode == "messages":
+                message_chunk, metadata = chunk
+                if (
+                    metadata.get("langgraph_node") == "answer_node"
+                    and isinstance(message_chunk, AIMessageChunk)
+                    and message_chunk.content
+                ):
+                    answer_streamed = True
+                    yield "token", {"text": message_chunk.content}
+                continue
+
+            for node, state_update in chunk.items():
+                yield "progress", {"node": node}
+
+                if state_update and "messages" in state_update:
+                    last_message = state_update['messages'][-1]
+                    if not (isinstance(last_message, AIMessage) and last_message.content):
+                        continue
+                    if node == "answer_node" and answer_streamed:
+                        continue
+                    yield "token", {"text": last_message.content}
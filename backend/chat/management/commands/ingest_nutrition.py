@@ -0,0 +1,97 @@
+import math
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agent.retrieval.ingest import ingest
+from agent.retrieval.mmap_store import compile_collection
+from agent.retrieval.nutrition_table import NutritionTable
+from agent.settings import (
+    COLLECTION_NAME, DOCUMENT_EMBEDDING_MODEL_NAME, FOOD_DATA_PATH, PERSIST_DIRECTORY, VECTOR_STORE_PATH,
+    INGEST_BATCH_SIZE, INGEST_CONCURRENCY, INGEST_RETRIES,
+)
+
+
+class Command(BaseCommand):
+    """
+    음식 영양 성분 JSONL을 벡터DB(chroma_db)에 적재합니다.
+    - 처음 실행하면 전체를, 이후에는 내용이 바뀐 행만 임베딩하여 upsert합니다.
+    - 원본에서 사라진 행은 collection에서 삭제합니다.
+    - 이 명령 이전에 만든 collection이면 처음 한 번은 전체를 다시 임베딩하고 이전 문서를 삭제합니다.
+      (agent/retrieval/ingest.py 참고, --dry-run으로 비용을 먼저 확인할 수 있습니다.)
+    - 영양 성분 숫자 표(nutrition_table.npz)와 worker가 공유하는 mmap vector store 파일도 다시 만듭니다.
+    - --compile-only: 임베딩 없이 이미 적재된 collection을 mmap 파일로만 컴파일합니다. (entrypoint.sh에서 실행)
+      mmap 파일이 chroma_db보다 최신이면 건너뜁니다.
+    """
+    help = "음식 영양 성분 데이터를 임베딩하여 chroma_db에 적재합니다. (바뀐 행만)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=FOOD_DATA_PATH, help='원본 JSONL 경로')
+        parser.add_argument('--persist-directory', default=PERSIST_DIRECTORY)
+        parser.add_argument('--vector-store-path', default=VECTOR_STORE_PATH, help='컴파일할 mmap vector store 파일 경로')
+        parser.add_argument('--batch-size', type=int, default=INGEST_BATCH_SIZE, help='임베딩 요청 1회에 보낼 문서 수')
+        parser.add_argument('--concurrency', type=int, default=INGEST_CONCURRENCY, help='동시에 보낼 임베딩 요청 수')
+        parser.add_argument('--retries', type=int, default=INGEST_RETRIES)
+        parser.add_argument('--dry-run', action='store_true', help='임베딩 없이 바뀐 행 수만 확인합니다.')
+        parser.add_argument(
+            '--compile-only', action='store_true', help='임베딩 없이 chroma_db를 mmap vector store 파일로만 컴파일합니다.',
+        )
+
+    def handle(self, *args, **options):
+        if options['compile_only']:
+            return self.compile_only(options['persist_directory'], options['vector_store_path'])
+
+        import chromadb
+        from langchain_upstage import UpstageEmbeddings
+
+        collection = chromadb.PersistentClient(path=options['persist_directory']).get_or_create_collection(COLLECTION_NAME)
+        report = ingest(
+            collection,
+            UpstageEmbeddings(model=DOCUMENT_EMBEDDING_MODEL_NAME),
+            path=options['path'],
+            batch_size=options['batch_size'],
+            concurrency=options['concurrency'],
+            retries=options['retries'],
+            dry_run=options['dry_run'],
+        )
+
+        if report.legacy:
+            requests = math.ceil(report.embedded / options['batch_size']) if report.embedded else 0
+            self.stdout.write(self.style.WARNING(
+                f"이전 방식으로 적재된 {report.legacy}행은 content hash id가 아니므로 삭제하고, "
+                f"{report.embedded}행을 다시 임베딩합니다. (임베딩 요청 {requests}회)"
+            ))
+        self.stdout.write(
+            f"전체 {report.total}행: 유지 {report.unchanged}, 임베딩 {report.embedded}, "
+            f"실패 {report.failed}, 삭제 {report.deleted} "
+            f"({report.seconds:.1f}s, {report.docs_per_s:.1f} docs/s)"
+        )
+        if report.failed:
+            raise CommandError(f'{report.failed}행을 임베딩하지 못했습니다. 다시 실행하면 남은 행만 처리합니다.')
+        self.stdout.write(self.style.SUCCESS('chroma_db 적재 완료'))
+
+        if not options['dry_run']:
+            NutritionTable.build(options['path']).save()
+            self.stdout.write(self.style.SUCCESS('영양 성분 표 저장 완료'))
+
+            count = compile_collection(collection, options['vector_store_path'])
+            self.stdout.write(self.style.SUCCESS(f'mmap vector store 컴파일 완료 ({count}개 문서)'))
+
+    def compile_only(self, persist_directory: str, vector_store_path: str) -> None:
+        # chroma_db가 없으면(적재 전) 만들지 않고 넘어갑니다. worker는 mmap 파일이 없으면 Chroma를 사용합니다.
+        database = os.path.join(persist_directory, 'chroma.sqlite3')
+        if not os.path.exists(database):
+            self.stdout.write(self.style.WARNING(f'{persist_directory}에 chroma_db가 없어 컴파일을 건너뜁니다.'))
+            return
+        if os.path.exists(vector_store_path) and os.path.getmtime(vector_store_path) >= os.path.getmtime(database):
+            self.stdout.write('mmap vector store가 최신입니다.')
+            return
+
+        import chromadb
+
+        collection = chromadb.PersistentClient(path=persist_directory).get_or_create_collection(COLLECTION_NAME)
+        if not collection.count():
+            self.stdout.write(self.style.WARNING(f'{COLLECTION_NAME} collection이 비어 있어 컴파일을 건너뜁니다.'))
+            return
+        count = compile_collection(collection, vector_store_path)
+        self.stdout.write(self.style.SUCCESS(f'mmap vector store 컴파일 완료 ({count}개 문서)'))
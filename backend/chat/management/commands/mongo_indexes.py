@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from agent.mongo_indexes import ensure_indexes, explain_queries, verify_indexes
+
+
+class Command(BaseCommand):
+    """
+    Nightscout DB(entries, treatments)에 get_health_data()가 사용하는 색인을 관리합니다.
+    - 기본 동작: 없는 색인을 만든 뒤 실행 계획을 확인합니다. (entrypoint.sh 등에서 실행)
+    - --check: 색인을 만들지 않고 실행 계획만 확인합니다.
+    실행 계획이 COLLSCAN이면 실패합니다.
+    """
+    help = "Nightscout 조회용 색인을 만들고, 조회가 색인을 사용하는지 확인합니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='색인을 만들지 않고 실행 계획만 확인합니다.')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            for collection, names in ensure_indexes().items():
+                if names:
+                    self.stdout.write(self.style.SUCCESS(f"{collection}: 색인 생성 {', '.join(names)}"))
+
+        for collection, stages in explain_queries().items():
+            self.stdout.write(f"{collection}: {' -> '.join(stages)}")
+
+        collscans = verify_indexes()
+        if collscans:
+            raise CommandError(f"COLLSCAN으로 조회하는 collection: {', '.join(collscans)}")
+        self.stdout.write(self.style.SUCCESS('색인 확인 완료'))
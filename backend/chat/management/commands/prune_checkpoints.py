@@ -0,0 +1,84 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from agent.checkpointer import build_checkpointer
+from agent.settings import CHECKPOINT_TTL_HOURS, CHECKPOINT_PRUNE_INTERVAL
+from chat.models import Thread
+
+# Thread 조회 시 IN 절 하나에 넣을 최대 id 수
+ID_CHUNK_SIZE = 1000
+
+
+class Command(BaseCommand):
+    """
+    LangGraph checkpointer 저장소를 관리합니다.
+    - --setup: checkpointer 테이블 생성/마이그레이션 (entrypoint.sh에서 실행)
+    - 기본 동작: 삭제되었거나 TTL 동안 새 메시지가 없는 대화의 state를 삭제하고,
+      남은 대화는 최근 CHECKPOINT_KEEP_LAST개의 checkpoint만 남기도록 압축
+    - --every: 기본 동작을 주기적으로 반복합니다. (docker-compose.yml의 checkpoint-pruner 서비스)
+    """
+    help = "삭제되었거나 오래된 대화의 LangGraph state를 정리합니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--setup', action='store_true', help='checkpointer 테이블만 생성합니다.')
+        parser.add_argument('--ttl-hours', type=int, default=CHECKPOINT_TTL_HOURS)
+        parser.add_argument(
+            '--every', type=int, nargs='?', const=CHECKPOINT_PRUNE_INTERVAL, default=None, metavar='SECONDS',
+            help=f'종료하지 않고 SECONDS(기본 {CHECKPOINT_PRUNE_INTERVAL})초마다 정리합니다.',
+        )
+
+    def handle(self, *args, **options):
+        checkpointer = build_checkpointer()
+
+        if options['setup']:
+            checkpointer.setup()
+            self.stdout.write(self.style.SUCCESS('checkpointer 테이블 준비 완료'))
+            return
+
+        while True:
+            self.prune(checkpointer, options['ttl_hours'])
+            if not options['every']:
+                return
+            time.sleep(options['every'])
+
+    def prune(self, checkpointer, ttl_hours: int) -> None:
+        # 오래 실행되는 프로세스이므로 끊어진 DB 연결은 매번 정리합니다.
+        close_old_connections()
+        # 이미 state를 삭제한 대화를 매번 다시 처리하지 않도록, checkpoint가 남아 있는 대화만 확인합니다.
+        stale = stale_thread_ids(checkpointer.stored_thread_ids(), ttl_hours)
+        count = checkpointer.evict_threads(stale)
+        compacted = checkpointer.compact_all()
+        self.stdout.write(self.style.SUCCESS(f'{count}개 대화의 state를 삭제하고 {compacted}개 대화를 압축했습니다.'))
+
+
+def stale_thread_ids(stored_thread_ids, ttl_hours: int) -> list:
+    """
+    checkpoint가 남아 있는 thread_id 중 state를 삭제할 대화를 반환합니다.
+    삭제되었거나, TTL 동안 새 메시지가 없거나, Thread가 없는 대화가 대상입니다.
+    UUID가 아닌 thread_id(CLI, benchmark 등)는 chat 앱의 대화가 아니므로 건드리지 않습니다.
+    """
+    ids = {}
+    for thread_id in stored_thread_ids:
+        try:
+            ids[uuid.UUID(str(thread_id))] = thread_id
+        except ValueError:
+            continue
+
+    cutoff = timezone.now() - timedelta(hours=ttl_hours)
+    keys = list(ids)
+    active = set()
+    for start in range(0, len(keys), ID_CHUNK_SIZE):
+        active.update(
+            Thread.objects
+            .filter(pk__in=keys[start:start + ID_CHUNK_SIZE], is_deleted=False)
+            .annotate(last_message_at=Max('messages__timestamp'))
+            .filter(Q(last_message_at__gte=cutoff) | Q(last_message_at__isnull=True, updated_at__gte=cutoff))
+            .values_list('id', flat=True)
+        )
+    return [thread_id for key, thread_id in ids.items() if key not in active]
@@ -53,6 +53,9 @@ class ChatMessage(models.Model):
     is_deleted = models.BooleanField(default=False)
     duration = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
 
+    # AI 응답의 단계별 소요 시간과 token 수 (일부 턴만 샘플링하여 저장, agent/metrics.py 참고)
+    metrics = models.JSONField(null=True, blank=True)
+
     def __str__(self):
         return f"[{self.timestamp.strftime('%Y-%m-%d %H-%M')}] {self.sender}: {self.message[:30]}"
     
@@ -1,3 +1,166 @@
-from django.test import TestCase
+import os
+import tempfile
+import unittest
+import uuid
+from datetime import datetime, timezone, timedelta
+from io import StringIO
 
-# Create your tests here.
+import pymongo
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from agent.mongo_indexes import INDEXES, _stages, ensure_indexes, explain_queries
+from agent.retrieval.mmap_store import MmapVectorStore
+from agent.settings import COLLECTION_NAME
+from chat.management.commands.prune_checkpoints import stale_thread_ids
+from chat.models import ChatMessage, Thread
+
+# 색인 실행 계획 검사용 MongoDB. 운영(Nightscout) DB가 아닌 테스트용 서버를 지정합니다.
+# 테스트마다 임시 database를 만들고 끝나면 지웁니다.
+MONGODB_TEST_URI = os.environ.get('MONGODB_TEST_URI')
+
+
+class FakeIndexCollection:
+
+    def __init__(self, indexes: dict):
+        self.indexes = indexes
+        self.created = []
+
+    def index_information(self) -> dict:
+        return self.indexes
+
+    def create_indexes(self, models: list) -> list:
+        self.created.extend(models)
+        return [model.document["name"] for model in models]
+
+
+class EnsureIndexesTests(SimpleTestCase):
+    """ensure_indexes()가 같은 색인이 있으면 만들지 않고, 없으면 만드는지 확인합니다. (DB 없이 실행)"""
+
+    def test_reuses_equivalent_index(self):
+        treatments = INDEXES["treatments"][0].document
+        db = {
+            # 방향이 모두 반대인 색인은 같은 조회에 쓸 수 있습니다.
+            "entries": FakeIndexCollection({"date_1": {"key": [("date", pymongo.ASCENDING)]}}),
+            "treatments": FakeIndexCollection({"_id_": {"key": [("_id", 1)]}}),
+        }
+        created = ensure_indexes(db)
+
+        self.assertEqual(created, {"entries": [], "treatments": [treatments["name"]]})
+        self.assertEqual(db["entries"].created, [])
+
+    def test_partial_filter_must_match(self):
+        treatments = INDEXES["treatments"][0].document
+        db = {
+            "entries": FakeIndexCollection({}),
+            "treatments": FakeIndexCollection({"other": {"key": list(treatments["key"].items())}}),
+        }
+        self.assertEqual(ensure_indexes(db)["treatments"], [treatments["name"]])
+
+    def test_stages_follow_plan(self):
+        plan = {"stage": "PROJECTION_COVERED", "inputStage": {"stage": "OR", "inputStages": [
+            {"stage": "IXSCAN"}, {"stage": "IXSCAN"},
+        ]}}
+        self.assertEqual(_stages(plan), ["PROJECTION_COVERED", "OR", "IXSCAN", "IXSCAN"])
+
+
+@unittest.skipUnless(MONGODB_TEST_URI, 'MONGODB_TEST_URI가 없으면 실행 계획 검사를 건너뜁니다.')
+class NightscoutIndexTests(SimpleTestCase):
+    """get_health_data()의 조회가 색인을 사용하는지(COLLSCAN이 아닌지) 임시 database에서 확인합니다."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.client = pymongo.MongoClient(MONGODB_TEST_URI)
+        cls.db = cls.client[f"simon_test_{uuid.uuid4().hex[:8]}"]
+
+        now = datetime.now(timezone.utc)
+        cls.db["entries"].insert_many([
+            {"sgv": 120 + i, "date": int((now - timedelta(minutes=5 * i)).timestamp() * 1000)} for i in range(50)
+        ])
+        cls.db["treatments"].insert_many([
+            {"created_at": (now - timedelta(minutes=30 * i)).isoformat(), "insulin": 2.0 if i % 2 else 0, "carbs": 30}
+            for i in range(50)
+        ] + [{"eventType": "Site Change"}])
+        ensure_indexes(cls.db)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.drop_database(cls.db.name)
+        cls.client.close()
+        super().tearDownClass()
+
+    def test_queries_do_not_collscan(self):
+        for collection, stages in explain_queries(self.db).items():
+            with self.subTest(collection=collection):
+                self.assertNotIn('COLLSCAN', stages)
+                self.assertIn('IXSCAN', stages)
+
+
+class CompileVectorStoreTests(SimpleTestCase):
+    """ingest_nutrition --compile-only가 임베딩 없이 chroma_db를 mmap 파일로 컴파일하는지 확인합니다."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.persist_directory = os.path.join(self.tmp.name, 'chroma_db')
+        self.path = os.path.join(self.tmp.name, 'nutrition_vectors.bin')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def compile(self) -> str:
+        out = StringIO()
+        call_command(
+            'ingest_nutrition', compile_only=True, persist_directory=self.persist_directory,
+            vector_store_path=self.path, stdout=out,
+        )
+        return out.getvalue()
+
+    def test_skips_without_chroma_db(self):
+        self.assertIn('건너뜁니다', self.compile())
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.persist_directory))
+
+    def test_compiles_existing_collection_once(self):
+        import chromadb
+
+        collection = chromadb.PersistentClient(path=self.persist_directory).get_or_create_collection(COLLECTION_NAME)
+        collection.add(
+            ids=['0', '1'], documents=['사과_생것', '우유'],
+            metadatas=[{'식품명': '사과_생것'}, {'식품명': '우유'}], embeddings=[[1.0, 0.0], [0.0, 1.0]],
+        )
+
+        self.assertIn('2개 문서', self.compile())
+        self.assertIn('최신', self.compile())
+        documents = MmapVectorStore(self.path).search_many([[0.9, 0.1]], k=1)[0]
+        self.assertEqual(documents[0].page_content, '사과_생것')
+
+
+class StaleThreadTests(TestCase):
+    """prune_checkpoints가 checkpoint가 남아 있는 대화 중 삭제할 대화만 고르는지 확인합니다."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='prune@example.com', password='x')
+
+    def thread(self, is_deleted: bool = False, message_hours_ago: float = None) -> str:
+        thread = Thread.objects.create(user=self.user, title='t', is_deleted=is_deleted)
+        if message_hours_ago is not None:
+            message = ChatMessage.objects.create(user=self.user, thread=thread, sender='user', message='m')
+            ChatMessage.objects.filter(pk=message.pk).update(
+                timestamp=timezone.now() - timedelta(hours=message_hours_ago)
+            )
+        return str(thread.id)
+
+    def test_selects_only_stored_stale_threads(self):
+        active = self.thread(message_hours_ago=1)
+        new = self.thread()
+        idle = self.thread(message_hours_ago=48)
+        deleted = self.thread(is_deleted=True, message_hours_ago=1)
+        already_evicted = self.thread(is_deleted=True)
+        orphan = str(uuid.uuid4())
+
+        stored = {active, new, idle, deleted, orphan, 'bench-0'}
+        self.assertEqual(sorted(stale_thread_ids(stored, ttl_hours=24)), sorted([idle, deleted, orphan]))
+        self.assertNotIn(already_evicted, stale_thread_ids(stored, ttl_hours=24))
@@ -1,9 +1,12 @@
 from django.urls import path
-from .views import ChatAgentView, ChatHistoryView, ThreadListView, ThreadDetailView
+from .views import ChatAgentView, ChatStreamView, ChatHistoryView, ThreadListView, ThreadDetailView, NutritionLookupView, ForecastView
 
 urlpatterns = [
     path('ask/', ChatAgentView.as_view(), name='chat_with_agent'),
+    path('ask/stream/', ChatStreamView.as_view(), name='chat_with_agent_stream'),
     path('history/<uuid:thread_id>/', ChatHistoryView.as_view(), name='get_chat_history'),
     path('threads/', ThreadListView.as_view(), name='thread_list'),
     path('thread/<uuid:thread_id>/', ThreadDetailView.as_view(), name='thread_detail'),
+    path('nutrition/', NutritionLookupView.as_view(), name='nutrition_lookup'),
+    path('forecast/', ForecastView.as_view(), name='glucose_forecast'),
 ]
\ No newline at end of file
@@ -1,18 +1,55 @@
 from rest_framework.views import APIView
+from adrf.views import APIView as AsyncAPIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from .ai_connector import get_ai_response
+import json
+from prometheus_client import CONTENT_TYPE_LATEST
+from agent.metrics import TurnMetrics, generate_metrics
+from agent.settings import METRICS_TOKEN, NUTRITION_BATCH_MAX_FOODS
+from agent.tools import asearch_nutrition, compact_nutrition
+from agent.forecast import acurrent_forecast
+from .ai_connector import aget_ai_response, astream_ai_response
 from .models import ChatMessage, Thread
 
 
-class ChatAgentView(APIView):
-    """사용자의 채팅 메시지를 받아 AI의 응답을 반환합니다."""
+async def aopen_thread(user, user_message: str, thread_id=None):
+    """
+    대화(thread)를 가져오거나 새로 만들고 사용자 메시지를 저장합니다.
+    다른 사용자의 대화라면 None을 반환합니다.
+    """
+    if thread_id:
+        thread, created = await Thread.objects.aget_or_create(
+            id=thread_id,
+            defaults={'user': user, 'title': user_message[:20]}
+        )
+        if not created and thread.user_id != user.id:
+            return None
+    else:
+        # 새 대화: 첫 메시지의 일부를 제목으로 사용
+        title = user_message[:20] 
+        thread = await Thread.objects.acreate(user=user, title=title)
+
+    await ChatMessage.objects.acreate(
+        user=user,
+        thread=thread,
+        sender='user',
+        message=user_message,
+    )
+    return thread
+
+
+class ChatAgentView(AsyncAPIView):
+    """
+    사용자의 채팅 메시지를 받아 AI의 응답을 반환합니다.
+    ASGI(uvicorn worker)에서 비동기로 실행되어, LLM 응답을 기다리는 동안 worker를 점유하지 않습니다.
+    """
     permission_classes = [IsAuthenticated]
 
-    def post(self, request, *args, **kwargs) -> Response:
+    async def post(self, request, *args, **kwargs) -> Response:
         user_message = request.data.get('message')
         thread_id = request.data.get('thread_id')
 
@@ -23,36 +60,23 @@ class ChatAgentView(APIView):
             )
 
         try:
-            if thread_id:
-                thread, created = Thread.objects.get_or_create(
-                    id=thread_id,
-                    defaults={'user': request.user, 'title': user_message[:20]}
-                )
-                if not created and thread.user != request.user:
-                    return Response({'error': '권한이 없습니다.'}, status=status.HTTP_403_FORBIDDEN)
-            else:
-                # 새 대화: 첫 메시지의 일부를 제목으로 사용
-                title = user_message[:20] 
-                thread = Thread.objects.create(user=request.user, title=title)
-
-            ChatMessage.objects.create(
-                user=request.user,
-                thread=thread,
-                sender='user',
-                message=user_message,
-            )
+            thread = await aopen_thread(request.user, user_message, thread_id)
+            if thread is None:
+                return Response({'error': '권한이 없습니다.'}, status=status.HTTP_403_FORBIDDEN)
 
             start_time = timezone.now()
-            ai_response = get_ai_response(user_message, str(thread.id))
+            turn = TurnMetrics()
+            ai_response = await aget_ai_response(user_message, str(thread.id), turn)
             end_time = timezone.now()
             response_duration = (end_time - start_time).total_seconds()
 
-            ChatMessage.objects.create(
+            await ChatMessage.objects.acreate(
                 user=request.user,
                 thread=thread,
                 sender='ai',
                 message=ai_response,
-                duration=response_duration
+                duration=response_duration,
+                metrics=turn.sampled()
             )
 
             return Response({
@@ -67,6 +91,79 @@ class ChatAgentView(APIView):
             )
 
 
+class ChatStreamView(AsyncAPIView):
+    """
+    /api/chat/ask/의 스트리밍 버전. 응답을 Server-Sent Events로 전송합니다.
+    - event: progress  data: {"node": "triage_node"} (노드 실행 완료)
+    - event: token     data: {"text": "..."} (답변 토큰)
+    - event: done      data: {"thread_id": "...", "duration": 1.23}
+    - event: error     data: {"error": "..."}
+    스트림이 끝나면 조립된 답변과 소요 시간을 ChatMessage에 저장합니다.
+    """
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request, *args, **kwargs):
+        user_message = request.data.get('message')
+        thread_id = request.data.get('thread_id')
+
+        if not user_message:
+            return Response(
+                {'error': '사용자 메세지가 누락되었습니다.'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            thread = await aopen_thread(request.user, user_message, thread_id)
+            if thread is None:
+                return Response({'error': '권한이 없습니다.'}, status=status.HTTP_403_FORBIDDEN)
+        except Exception as e:
+            return Response(
+                {'error': f'서버 내부 오류: {str(e)}'}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        response = StreamingHttpResponse(
+            self.event_stream(request.user, thread, user_message),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # nginx가 응답을 버퍼링하지 않고 바로 전달하도록 합니다.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def event_stream(self, user, thread, user_message: str):
+        start_time = timezone.now()
+        turn = TurnMetrics()
+        texts = []
+
+        try:
+            async for event, data in astream_ai_response(user_message, str(thread.id), turn):
+                if event == 'token':
+                    texts.append(data['text'])
+                yield self.format_event(event, data)
+
+            ai_response = "".join(texts) or "죄송합니다. 오류가 발생하여 응답을 생성하지 못했습니다."
+            response_duration = (timezone.now() - start_time).total_seconds()
+
+            await ChatMessage.objects.acreate(
+                user=user,
+                thread=thread,
+                sender='ai',
+                message=ai_response,
+                duration=response_duration,
+                metrics=turn.sampled()
+            )
+
+            yield self.format_event('done', {'thread_id': str(thread.id), 'duration': response_duration})
+
+        except Exception as e:
+            yield self.format_event('error', {'error': f'서버 내부 오류: {str(e)}'})
+
+    @staticmethod
+    def format_event(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 class ChatHistoryView(APIView):
     """특정 대화(thread)의 전체 대화 기록을 반환합니다."""
     permission_classes = [IsAuthenticated]
@@ -138,3 +235,64 @@ class ThreadDetailView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class NutritionLookupView(AsyncAPIView):
+    """
+    여러 음식의 영양 정보를 한 번에 검색하여, 음식 당 하나의 요약(1인분 탄수화물 등)을 반환합니다.
+    임베딩 요청과 벡터DB 검색은 음식 수와 관계없이 한 번입니다.
+    """
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request, *args, **kwargs) -> Response:
+        foods = request.data.get('foods')
+
+        if not isinstance(foods, list) or not foods or not all(isinstance(food, str) and food.strip() for food in foods):
+            return Response(
+                {'error': '음식 이름 목록(foods)이 누락되었습니다.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(foods) > NUTRITION_BATCH_MAX_FOODS:
+            return Response(
+                {'error': f'음식은 한 번에 {NUTRITION_BATCH_MAX_FOODS}개까지 검색할 수 있습니다.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            queries = [food.strip() for food in foods]
+            results = await asearch_nutrition(queries)
+            return Response({'results': compact_nutrition(queries, results)}, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response(
+                {'error': f'서버 내부 오류: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+
+class ForecastView(AsyncAPIView):
+    """
+    앞으로 몇 시간의 혈당 예측(5분 간격의 혈당, IOB, COB)을 반환합니다. (agent/forecast.py)
+    새 혈당/주사 기록이 들어오기 전까지는 저장된 예측을 그대로 반환합니다.
+    """
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request, *args, **kwargs) -> Response:
+        try:
+            forecast = await acurrent_forecast()
+            return Response({'forecast': forecast.to_dict(), 'summary': forecast.summary()}, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response(
+                {'error': f'서버 내부 오류: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+def metrics_view(request):
+    """
+    Prometheus가 수집하는 에이전트 지표(agent/metrics.py)를 반환합니다.
+    METRICS_TOKEN이 설정되어 있으면 Authorization: Bearer <토큰> 헤더가 필요합니다.
+    """
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    return HttpResponse(generate_metrics(), content_type=CONTENT_TYPE_LATEST)
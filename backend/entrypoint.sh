@@ -1,5 +1,8 @@
 #!/bin/sh
 
 python manage.py migrate
+python manage.py prune_checkpoints --setup
+python manage.py mongo_indexes
+python manage.py ingest_nutrition --compile-only
 
 exec "$@"
\ No newline at end of file
@@ -0,0 +1,35 @@
+# Simon/backend/gunicorn.conf.py
+# gunicorn은 실행 디렉토리의 이 파일을 자동으로 읽습니다. (실행 옵션은 docker-compose.yml 참고)
+import os
+
+# master에서 앱을 한 번 로드한 뒤 fork하여, 읽기 전용 메모리를 worker 간에 공유합니다.
+preload_app = True
+
+
+def on_starting(server):
+    """master 시작 시 실행됩니다. 이전 실행에서 남은 Prometheus multiprocess 파일을 지웁니다."""
+    multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        os.makedirs(multiproc_dir, exist_ok=True)
+        for name in os.listdir(multiproc_dir):
+            os.remove(os.path.join(multiproc_dir, name))
+
+
+def when_ready(server):
+    """fork 전 master에서 실행됩니다."""
+    from agent.warmup import preload
+    preload()
+
+
+def post_fork(server, worker):
+    """fork 직후 각 worker에서 실행됩니다. AGENT_WARMUP=1일 때만 client를 미리 만듭니다."""
+    if os.environ.get("AGENT_WARMUP") == "1":
+        from agent.warmup import warmup
+        warmup()
+
+
+def child_exit(server, worker):
+    """worker가 종료되면 해당 worker의 gauge 지표 파일을 정리합니다."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)